@@ -2,22 +2,48 @@ from typing import Any, Text, Dict, List  # Importing necessary typing tools for
 from rasa_sdk import Action, Tracker  # Base classes for custom actions and tracking user interactions
 from rasa_sdk.executor import CollectingDispatcher  # For sending responses back to the user
 from rasa_sdk.events import SlotSet  # For setting slots in the conversation state
-from utils.lms_utils import LMSManager  # Custom LMS utility for managing courses (assumed external module)
+from utils.lms_utils import catalog_key  # Content address of canonical catalog courses
+from utils.async_lms import get_async_lms  # Non-blocking facade over LMSManager for async actions
+from utils.matcher import TOPIC_INTERESTS  # Interest names of the shared keyword topics
+from utils.chat import cached_query_signature  # Message signature shared with the Streamlit app
+from utils.response_cache import get_response_cache  # Learner-independent reply parts, per phrasing
+from utils.catalog import get_catalog, thaw  # Course catalog loaded once per process and hot-reloaded on change
+from utils.recommender import get_recommender, enrollment_history  # TF-IDF ranking over the course catalog
+from utils.fragments import get_fragments  # Course response text rendered once per catalog version
+from utils.tracing import span, traced  # Per-turn latency spans, no-ops unless LMS_TRACE_FILE is set
 
 # Action to provide learning recommendations based on user input
 class ActionProvideLearningRecommendations(Action):
     def __init__(self):
-        # Initialize LMSManager instance for handling course-related operations
+        # Async LMS facade: disk I/O runs on a thread pool, off the event loop
         super().__init__()
-        self.lms = LMSManager()
+        self.lms = get_async_lms()
+        self.cache = get_response_cache("actions")
 
     def name(self) -> Text:
         # Unique name for the action used in Rasa stories
         return "action_provide_learning_recommendations"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def course_reply(self, catalog, topic, experience, interest):
+        # Course fields, materials and welcome text for a topic and level,
+        # rendered once per catalog version and shared by every learner
+        course_name = f"{interest.title()} for {experience.title()}s"
+        description = f"A curated learning path for {experience}s in {interest}"
+
+        # Retrieve materials for the interest area from the shared course catalog
+        catalog_course = catalog.find(topic, experience)
+        materials = thaw(catalog_course['materials']) if catalog_course else []
+
+        welcome = f"🎉 Welcome to {course_name}!\n\nHere are your learning materials:\n\n"
+        if catalog_course:
+            welcome += get_fragments(catalog).get(catalog_course['id']).materials_text
+        return (catalog_key(interest, experience), course_name, description, materials,
+                catalog_course['id'] if catalog_course else None, welcome)
+
+    @traced("action.provide_learning_recommendations")
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         """
         Main method to handle the user request:
         - Analyze user input
@@ -28,75 +54,62 @@ class ActionProvideLearningRecommendations(Action):
         latest_message = tracker.latest_message['text'].lower()
         user_id = tracker.sender_id
 
+        # Feedback, experience and topic of the message, resolved once per
+        # phrasing; topics without a keyword (e.g. "python") come from the
+        # recommendation engine
+        catalog = get_catalog()
+        recommender = get_recommender(catalog)
+        self.cache.bind(catalog)
+        with span("action.query_signature"):
+            signature = cached_query_signature(self.cache, latest_message, recommender)
+
         # Handle positive feedback
-        if any(word in latest_message for word in ['helpful', 'thanks', 'good', 'great']):
+        if signature.feedback in ('thanks', 'good'):
             response = "I'm glad you found it helpful! You can type 'show my courses' to see your enrolled courses."
             dispatcher.utter_message(text=response)
             return []  # No slots to update
 
-        # Initialize experience level and interest area
-        experience = None
-        interest = None
-
-        # Determine experience level based on keywords
-        if 'beginner' in latest_message:
-            experience = 'beginner'
-        elif 'intermediate' in latest_message:
-            experience = 'intermediate'
-
-        # Determine interest area based on keywords
-        if 'data' in latest_message or 'science' in latest_message:
-            interest = 'data science'
-        elif 'web' in latest_message:
-            interest = 'web development'
-        elif 'mobile' in latest_message or 'app' in latest_message:
-            interest = 'mobile apps'
-        elif 'ai' in latest_message or 'artificial' in latest_message:
-            interest = 'artificial intelligence'
+        # Determine experience level based on keywords (courses here are
+        # offered for beginners and intermediates only)
+        experience = signature.experience
+        if experience not in ('beginner', 'intermediate'):
+            experience = None
+
+        # Determine interest area; an inferred topic only counts together
+        # with a supported experience level
+        history = enrollment_history(await self.lms.get_user_courses(user_id)) if experience else []
+        topic = signature.topic if experience or not signature.inferred else None
+        interest = TOPIC_INTERESTS.get(topic)
 
         # If both experience and interest are provided, create a course recommendation
         if experience and interest:
             try:
-                # Construct course name and description
-                course_name = f"{interest.title()} for {experience.title()}s"
-                description = f"A curated learning path for {experience}s in {interest}"
-
-                # Define learning materials based on interest
-                materials_dict = {
-                    'data science': [
-                        {"name": "Coursera Python for Everybody", "url": "https://www.coursera.org/specializations/python"},
-                        {"name": "DataCamp Introduction to Python", "url": "https://www.datacamp.com/courses/intro-to-python-for-data-science"}
-                    ],
-                    'web development': [
-                        {"name": "freeCodeCamp Web Development", "url": "https://www.freecodecamp.org/learn/responsive-web-design/"},
-                        {"name": "MDN Web Docs", "url": "https://developer.mozilla.org/en-US/docs/Learn"},
-                        {"name": "The Odin Project", "url": "https://www.theodinproject.com/"}
-                    ],
-                    'mobile apps': [
-                        {"name": "Android Developer Fundamentals", "url": "https://developer.android.com/courses"},
-                        {"name": "iOS App Development with Swift", "url": "https://developer.apple.com/tutorials/swiftui"},
-                        {"name": "React Native Tutorial", "url": "https://reactnative.dev/docs/tutorial"}
-                    ],
-                    'artificial intelligence': [
-                        {"name": "Fast.ai - Practical Deep Learning", "url": "https://www.fast.ai/"},
-                        {"name": "Coursera Machine Learning Specialization", "url": "https://www.coursera.org/specializations/machine-learning-introduction"},
-                        {"name": "DeepLearning.AI", "url": "https://www.deeplearning.ai/"},
-                        {"name": "Google AI Education", "url": "https://ai.google/education/"}
-                    ]
-                }
-
-                # Retrieve materials for the interest area
-                materials = materials_dict.get(interest.lower(), [])
-
-                # Create the course and enroll the user
-                course_id = self.lms.create_course(course_name, description, materials)
+                # Name, description, materials and welcome text are the same
+                # for every learner asking for this topic and level
+                key, course_name, description, materials, catalog_course_id, welcome = self.cache.get_or_compute(
+                    ('reply', topic, experience),
+                    lambda: self.course_reply(catalog, topic, experience, interest)
+                )
+
+                # Reuse the canonical course for this interest and level, then enroll the user
+                course_id = await self.lms.get_or_create_course(key, course_name, description, materials)
 
                 if course_id:
-                    self.lms.enroll_user(user_id, course_id)
-                    response = f"🎉 Welcome to {course_name}!\n\nHere are your learning materials:\n\n"
-                    for material in materials:
-                        response += f"📚 {material['name']}\n{material['url']}\n\n"
-                    response += "Type 'show my courses' anytime to see your enrolled courses!"
+                    await self.lms.enroll_user(user_id, course_id)
+                    parts = [welcome]
+
+                    # Other catalog courses ranked against the message and the user's past enrollments
+                    with span("recommender.recommend"):
+                        suggestions = recommender.recommend(
+                            latest_message, history, k=2,
+                            exclude_ids=[catalog_course_id] if catalog_course_id else ()
+                        )
+                    if suggestions:
+                        parts.append("You might also like:\n")
+                        parts.extend(f"✨ {course['name']}\n" for course, _ in suggestions)
+                        parts.append("\n")
+                    parts.append("Type 'show my courses' anytime to see your enrolled courses!")
+                    response = "".join(parts)
                 else:
                     response = "I'm having trouble setting up your course. Please try again."
             except Exception as e:
@@ -112,23 +125,24 @@ class ActionProvideLearningRecommendations(Action):
 # Action to show user's enrolled courses
 class ActionShowEnrollments(Action):
     def __init__(self):
-        # Initialize LMSManager instance for retrieving course information
+        # Async LMS facade shared with the recommendation action
         super().__init__()
-        self.lms = LMSManager()
+        self.lms = get_async_lms()
 
     def name(self) -> Text:
         # Unique name for the action used in Rasa stories
         return "action_show_enrollments"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @traced("action.show_enrollments")
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         """
         Main method to retrieve and display user's enrolled courses.
         """
         try:
             user_id = tracker.sender_id
-            courses = self.lms.get_user_courses(user_id)
+            courses = await self.lms.get_user_courses(user_id)
 
             if courses:
                 response = "Here are your enrolled courses:\n\n"
@@ -1,7 +1,21 @@
 import streamlit as st
 import requests
 import json
-from datetime import datetime
+import os
+import re
+import secrets
+from collections import deque
+from itertools import islice
+
+from utils.catalog import CatalogLoader, thaw
+from utils.chat import (NO_COURSES_MESSAGE, cached_query_signature, check_input_requirements,
+                        get_feedback_response, lms_course_fields)
+from utils.fragments import get_fragments
+from utils.lms_utils import LMSManager
+from utils.matcher import TOPIC_INTERESTS
+from utils.recommender import enrollment_history, get_recommender
+from utils.response_cache import get_response_cache
+from utils.tracing import span, traced
 
 # Add custom CSS styles for a professional design
 st.markdown("""
@@ -107,182 +121,188 @@ st.markdown("""
     <div class="subheader">🚀Exploring the universe of education</div>
 """, unsafe_allow_html=True)
 
-# Initialize chat history and enrolled courses
+# Number of recent messages rendered on each rerun (and added per click on
+# "Load earlier messages"), and the most messages a session keeps at all
+# (older ones fall off the ring buffer)
+HISTORY_WINDOW = max(1, int(os.environ.get("CHAT_HISTORY_WINDOW", "20")))
+HISTORY_LIMIT = max(HISTORY_WINDOW, int(os.environ.get("CHAT_HISTORY_LIMIT", "200")))
+
+# Enrollments are stored in the LMS under a stable user id carried in the
+# page URL (?uid=...), so a reconnect, a reload or a second tab on the same
+# link gets the learner's courses back
+USER_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+lms = LMSManager()
+
+# Initialize chat history, user id and the enrollment cache
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=HISTORY_LIMIT)
+    st.session_state.history_window = HISTORY_WINDOW
+if "user_id" not in st.session_state:
+    user_id = st.query_params.get("uid")
+    if not user_id or not USER_ID_RE.match(user_id):
+        user_id = secrets.token_hex(16)
+        st.query_params["uid"] = user_id
+    st.session_state.user_id = user_id
 if "enrolled_courses" not in st.session_state:
-    st.session_state.enrolled_courses = []
-
-# Define materials for all topics
-COURSE_MATERIALS = {
-    "web": {
-        "name": "Web Development for Beginners",
-        "materials": [
-            {"name": "freeCodeCamp Web Development", "url": "https://www.freecodecamp.org/learn/responsive-web-design/"},
-            {"name": "MDN Web Docs", "url": "https://developer.mozilla.org/en-US/docs/Learn"},
-            {"name": "The Odin Project", "url": "https://www.theodinproject.com/"}
-        ],
-        "description": "A curated learning path for beginners in web development",
-        "learning_path": [
-            "Start with HTML & CSS basics",
-            "Move on to JavaScript",
-            "Choose a framework (React, Vue, or Angular)"
-        ]
-    },
-    "data": {
-        "name": "Data Science for Beginners",
-        "materials": [
-            {"name": "Coursera Python for Everybody", "url": "https://www.coursera.org/specializations/python"},
-            {"name": "DataCamp Introduction to Python", "url": "https://www.datacamp.com/courses/intro-to-python-for-data-science"},
-            {"name": "Kaggle Learn", "url": "https://www.kaggle.com/learn"}
-        ],
-        "description": "A comprehensive introduction to data science and analysis",
-        "learning_path": [
-            "Learn Python basics",
-            "Master data analysis libraries",
-            "Practice with real datasets"
-        ]
-    },
-    "mobile": {
-        "name": "Mobile App Development for Beginners",
-        "materials": [
-            {"name": "Android Developer Fundamentals", "url": "https://developer.android.com/courses"},
-            {"name": "iOS App Development with Swift", "url": "https://developer.apple.com/tutorials/swiftui"},
-            {"name": "React Native Tutorial", "url": "https://reactnative.dev/docs/tutorial"}
-        ],
-        "description": "Learn to build mobile apps for iOS and Android",
-        "learning_path": [
-            "Choose your platform (iOS/Android)",
-            "Learn platform basics",
-            "Build your first app"
-        ]
-    },
-    "ai": {
-        "name": "Artificial Intelligence for Beginners",
-        "materials": [
-            {"name": "Fast.ai - Practical Deep Learning", "url": "https://www.fast.ai/"},
-            {"name": "Coursera Machine Learning Specialization", "url": "https://www.coursera.org/specializations/machine-learning-introduction"},
-            {"name": "Google AI Education", "url": "https://ai.google/education/"}
-        ],
-        "description": "Introduction to AI and machine learning concepts",
-        "learning_path": [
-            "Learn Python and mathematics basics",
-            "Understand ML fundamentals",
-            "Practice with AI frameworks"
-        ]
-    }
-}
-
-# Add feedback responses
-FEEDBACK_RESPONSES = {
-    "thanks": [
-        "You're always welcome! 😊 Feel free to reach out anytime if you need help!",
-        "Glad I could assist! 🌟 Keep exploring and learning more courses!",
-        "You're welcome! 🎉 Don't hesitate to ask if you need anything else!"
-    ],
-    "good": [
-        "Thank you for the kind words! 🌟 Anything else you'd like to explore?",
-        "I'm glad to hear that! 🎉 Let me know if there's more you'd like to learn!",
-        "It's great to hear that! 😊 Feel free to ask about more topics anytime!"
-    ],
-    "bye": [
-        "Goodbye for now! 👋 Come back anytime to continue your learning journey!",
-        "See you soon! 🌟 Your enrolled courses will be waiting when you return!",
-        "Have a fantastic day! 😊 Keep up with your newfound knowledge!"
-    ],
-    "hello": [
-        "Hello! 👋 Ready to dive into new learning adventures?",
-        "Welcome! 🌟 What would you like to learn today? I'm here to help!",
-        "Hi there! 😊 Let me know how I can help you find the perfect course!"
-    ]
-}
-
-def get_feedback_response(prompt):
-    import random
-    if any(word in prompt for word in ["thanks", "thank you", "thx"]):
-        return random.choice(FEEDBACK_RESPONSES["thanks"])
-    elif any(word in prompt for word in ["good", "great", "awesome", "amazing"]):
-        return random.choice(FEEDBACK_RESPONSES["good"])
-    elif any(word in prompt for word in ["bye", "goodbye", "see you"]):
-        return random.choice(FEEDBACK_RESPONSES["bye"])
-    elif any(word in prompt for word in ["hi", "hello", "hey"]):
-        return random.choice(FEEDBACK_RESPONSES["hello"])
-    return None
-
-def display_course_response(topic):
-    course = COURSE_MATERIALS[topic]
-    response_text = f"🎉 Welcome to {course['name']}!"
-
-    # For AI-related topics, add a robotic emoji 🤖 to the response
-    if topic == "ai":
-        response_text = "🤖 " + response_text
-
-    st.markdown(response_text)
-    st.write("📚 **Learning Materials:**")
-    for material in course['materials']:
-        st.markdown(f"• [{material['name']}]({material['url']})")
-
-    st.write("\n📝 **Course Description:**")
-    st.write(course['description'])
-
-    st.info("💡 **Learning Path:**\n" +
-            "\n".join(f"{i+1}. {step}" for i, step in enumerate(course['learning_path'])) +
-            "\n\nType 'show my courses' anytime to see your enrolled courses!")
-
-    # Add course to enrolled courses
-    course_entry = {
-        "name": course['name'],
-        "enrolled_at": datetime.now().strftime("%Y-%m-%d"),
-        "status": "In Progress",
-        "materials": course['materials']
+    # Read-through cache of lms.get_user_courses(), filled on first use
+    st.session_state.enrolled_courses = None
+    st.session_state.enrolled_ids = set()
+
+# Course catalog parsed once per process and re-parsed only when
+# course_catalog.json changes on disk
+@st.cache_resource
+def get_catalog_loader():
+    return CatalogLoader()
+
+catalog = get_catalog_loader().get()
+recommender = get_recommender(catalog)
+# Query signatures and course replies shared by every session, emptied
+# when the catalog is reloaded
+response_cache = get_response_cache("app")
+response_cache.bind(catalog)
+
+def enrolled_courses():
+    # The learner's enrollments, read from the LMS once per session and again
+    # only after this session enrolls in something new
+    if st.session_state.enrolled_courses is None:
+        courses = lms.get_user_courses(st.session_state.user_id)
+        st.session_state.enrolled_courses = courses
+        st.session_state.enrolled_ids = {course['course_id'] for course in courses}
+    return st.session_state.enrolled_courses
+
+def enroll(course, experience):
+    # Enrolls the learner in the canonical LMS course shared with the Rasa
+    # action; courses already enrolled in are skipped with a set lookup
+    key, course_name, description = lms_course_fields(course, experience)
+    course_id = lms.get_or_create_course(key, course_name, description, thaw(course['materials']))
+    enrolled_courses()
+    if course_id and course_id not in st.session_state.enrolled_ids:
+        if lms.enroll_user(st.session_state.user_id, course_id):
+            st.session_state.enrolled_courses = None
+
+# Enrollment aggregates for the sidebar, shared by every session and
+# refreshed at most every ANALYTICS_TTL seconds; reading them never scans users
+ANALYTICS_TTL = int(os.environ.get("ANALYTICS_TTL", "30"))
+
+@st.cache_data(ttl=ANALYTICS_TTL)
+def analytics_summary():
+    aggregates = lms.get_analytics()
+    completion = []
+    for course_id, counts in aggregates['courses'].items():
+        if counts.get('enrollments'):
+            completion.append((counts.get('completed', 0) / counts['enrollments'], counts['enrollments'], course_id))
+    top_courses = []
+    for rate, enrollments, course_id in sorted(completion, reverse=True)[:3]:
+        course = lms.get_course(course_id)
+        top_courses.append((course['name'] if course else course_id, rate, enrollments))
+    return {
+        'totals': aggregates['totals'],
+        'users_per_topic': aggregates['users_per_topic'],
+        'recent_days': sorted(aggregates['enrollments_per_day'].items())[-7:],
+        'top_courses': top_courses,
     }
-    if course_entry not in st.session_state.enrolled_courses:
-        st.session_state.enrolled_courses.append(course_entry)
 
-    return response_text, course['materials']
+def show_analytics():
+    summary = analytics_summary()
+    totals = summary['totals']
+    learners, enrollments = st.columns(2)
+    learners.metric("Learners", totals['users'])
+    enrollments.metric("Enrollments", totals['enrollments'])
+    for topic, count in sorted(summary['users_per_topic'].items(), key=lambda item: -item[1]):
+        st.write(f"- {TOPIC_INTERESTS.get(topic, topic).title()}: {count} learners")
+    if summary['recent_days']:
+        st.caption("Enrollments per day")
+        st.bar_chart(dict(summary['recent_days']))
+    for name, rate, count in summary['top_courses']:
+        st.write(f"✅ {name}: {rate:.0%} completed ({count} enrolled)")
+
+def session_history():
+    # Enrolled course names personalize the recommendation ranking
+    return enrollment_history(enrolled_courses())
+
+def course_reply(topic, experience):
+    # Catalog course and its fragments (header, materials and description
+    # rendered once for this catalog version) for a topic and level
+    def render():
+        course = catalog.find(topic, experience)
+        # Headed with the LMS course the learner is enrolled in, which keeps
+        # the requested level when the catalog falls back to another one
+        _, course_name, _ = lms_course_fields(course, experience)
+        return course, get_fragments(catalog).get(course['id'], course_name)
+    return response_cache.get_or_compute(('reply', topic, experience), render)
+
+@traced("app.display_course_response")
+def display_course_response(topic, prompt, experience):
+    course, fragments = course_reply(topic, experience)
+    # Each part goes out as a single element
+    st.markdown(fragments.body_markdown)
+    st.info(fragments.learning_path_markdown)
+
+    # Other catalog courses ranked against the prompt and this session's enrollments
+    with span("recommender.recommend"):
+        suggestions = recommender.recommend(prompt, session_history(), k=2, exclude_ids=[course['id']])
+    if suggestions:
+        st.markdown("✨ **You might also like:** " + ", ".join(suggested['name'] for suggested, _ in suggestions))
+
+    with span("app.enroll"):
+        enroll(course, experience)
+
+    return fragments.header, course['id']
 
 def show_enrolled_courses():
-    if st.session_state.enrolled_courses:
+    courses = enrolled_courses()
+    if courses:
         response_text = "Here are your enrolled courses:\n\n"
-        for course in st.session_state.enrolled_courses:
+        for course in courses:
             response_text += f"📚 {course['name']}\n"
-            response_text += f"Status: {course['status']}\n"
-            response_text += f"Enrolled: {course['enrolled_at']}\n\n"
+            response_text += f"Status: {course['status'].replace('_', ' ').title()}\n"
+            response_text += f"Enrolled: {(course['enrolled_at'] or '')[:10]}\n\n"
 
         st.markdown(response_text)
 
-        # Show materials for each course
-        for course in st.session_state.enrolled_courses:
-            st.write(f"\n**Materials for {course['name']}:**")
-            for material in course['materials']:
-                st.markdown(f"• [{material['name']}]({material['url']})")
+        # Show materials for each course, stored once on the LMS course record
+        for course in courses:
+            lms_course = lms.get_course(course['course_id'])
+            materials = lms_course['materials'] if lms_course else []
+            st.markdown(f"**Materials for {course['name']}:**\n\n" +
+                        "  \n".join(f"• [{material['name']}]({material['url']})" for material in materials))
     else:
-        st.markdown("You're not enrolled in any courses yet. Would you like some recommendations?")
-
-def check_input_requirements(prompt):
-    has_experience = any(word in prompt for word in ["beginner", "intermediate", "advanced"])
-    has_topic = any(word in prompt for word in ["web", "data", "science", "mobile", "app", "ai", "artificial"])
-
-    if not has_experience and not has_topic:
-        return "Could you please mention both your experience level (beginner, intermediate, or advanced) and your area of interest? For example: 'I'm a beginner interested in web development.'"
-    elif not has_experience:
-        return "Please let me know your experience level (beginner, intermediate, or advanced). For example: 'I'm a beginner.'"
-    elif not has_topic:
-        return "Can you specify what you'd like to learn (web development, data science, mobile apps, or artificial intelligence)?"
-    return None
-
-# Display chat messages from history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-        if "materials" in message:
-            st.write("📚 **Learning Materials:**")
-            for material in message["materials"]:
-                st.markdown(f"• [{material['name']}]({material['url']})")
+        st.markdown(NO_COURSES_MESSAGE)
 
-# Accept user input
-if prompt := st.chat_input("What would you like to learn?"):
+def show_earlier_messages():
+    st.session_state.history_window += HISTORY_WINDOW
+
+# Display chat messages from history: only the last history_window messages
+# are sent to the browser; earlier ones stay in the ring buffer until the
+# learner asks for them, so a rerun costs the same however long the session
+def render_history():
+    history = st.session_state.messages
+    hidden = max(0, len(history) - st.session_state.history_window)
+    if hidden:
+        st.button(f"Load earlier messages ({hidden})", on_click=show_earlier_messages)
+
+    for message in islice(history, hidden, None):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            # Materials are looked up by course reference rather than stored per message
+            fragments = get_fragments(catalog).get(message.get("course"))
+            if fragments:
+                st.markdown(fragments.materials_markdown)
+
+with span("app.render_history", messages=len(st.session_state.messages)):
+    render_history()
+
+# Handle one user message; traced as a whole turn when LMS_TRACE_FILE is set
+@traced("app.turn")
+def handle_prompt(prompt):
     prompt = prompt.lower()
+    # Back to the default window once the conversation moves on
+    st.session_state.history_window = HISTORY_WINDOW
+    # Greetings, feedback, commands, experience and topic of the prompt,
+    # resolved once per phrasing
+    with span("app.query_signature"):
+        signature = cached_query_signature(response_cache, prompt, recommender)
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
 
@@ -293,7 +313,7 @@ if prompt := st.chat_input("What would you like to learn?"):
     # Display assistant response in chat message container
     with st.chat_message("assistant"):
         # First check for feedback/greetings
-        feedback_response = get_feedback_response(prompt)
+        feedback_response = get_feedback_response(signature.feedback)
         if feedback_response:
             st.markdown(feedback_response)
             st.session_state.messages.append({
@@ -301,15 +321,18 @@ if prompt := st.chat_input("What would you like to learn?"):
                 "content": feedback_response
             })
         # Then check for course-related queries
-        elif "show my courses" in prompt:
+        elif signature.command == "show_courses":
             show_enrolled_courses()
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": "Showing your enrolled courses"
             })
         else:
+            # Topic keyword, or the recommendation engine's best guess
+            topic = signature.topic
+
             # Check if input meets requirements
-            requirement_message = check_input_requirements(prompt)
+            requirement_message = check_input_requirements(signature.experience, topic)
             if requirement_message:
                 st.markdown(requirement_message)
                 st.session_state.messages.append({
@@ -317,25 +340,18 @@ if prompt := st.chat_input("What would you like to learn?"):
                     "content": requirement_message
                 })
             else:
-                # Check for topic matches
-                topic = None
-                if "web" in prompt:
-                    topic = "web"
-                elif "data" in prompt or "science" in prompt:
-                    topic = "data"
-                elif "mobile" in prompt or "app" in prompt:
-                    topic = "mobile"
-                elif "ai" in prompt or "artificial" in prompt:
-                    topic = "ai"
-
                 if topic:
-                    response_text, materials = display_course_response(topic)
+                    response_text, course_id = display_course_response(topic, prompt, signature.experience)
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": response_text,
-                        "materials": materials
+                        "course": course_id
                     })
 
+# Accept user input
+if prompt := st.chat_input("What would you like to learn?"):
+    handle_prompt(prompt)
+
 # Add sidebar with additional information
 with st.sidebar:
     st.header("🌍 Welcome to EduVerse: Your Gateway to the Universe of Learning! 🚀")
@@ -347,3 +363,5 @@ with st.sidebar:
     st.write("- 📱 Mobile App Development (Create your own apps for Android & iOS! 📲)")
     st.write("- 🤖 Artificial Intelligence (Explore the world of smart machines and AI! 🧠)")
     st.write("Feel free to ask me about any of these topics and let's get started on your learning journey! 🚀")
+    with st.expander("📈 Learning analytics"):
+        show_analytics()
@@ -0,0 +1,163 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from utils.catalog import get_catalog, thaw
+from utils.lms_utils import catalog_key
+from utils.storage import empty_data
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process; None where unsupported
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def measure(operation, func, ops, budget_seconds, batch=1):
+    # Calls func() up to `ops` times, stopping early once `budget_seconds`
+    # have elapsed (at least one call always runs). Each call performs
+    # `batch` operations; throughput counts operations, latency is per call.
+    samples = []
+    started = time.perf_counter()
+    for index in range(ops):
+        call_started = time.perf_counter()
+        func(index)
+        samples.append(time.perf_counter() - call_started)
+        if time.perf_counter() - started > budget_seconds:
+            break
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        'operation': operation,
+        'ops': len(samples) * batch,
+        'throughput_per_s': len(samples) * batch / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def synthetic_data(users, seed=0, extra_courses=20):
+    # lms_data.json layout with the catalog courses at every level plus some
+    # one-off courses, and `users` learners enrolled in 1-3 courses each
+    rng = random.Random(seed)
+    data = empty_data()
+    course_id = 0
+    for course in get_catalog().courses:
+        for level in ('beginner', 'intermediate'):
+            course_id += 1
+            data['courses'][str(course_id)] = {
+                'name': f"{course['interest'].title()} for {level.title()}s",
+                'description': f"A curated learning path for {level}s in {course['interest']}",
+                'materials': thaw(course['materials']),
+                'created_at': "2024-12-18T21:57:59.828363",
+                'catalog_key': catalog_key(course['interest'], level)
+            }
+    for _ in range(extra_courses):
+        course_id += 1
+        data['courses'][str(course_id)] = {
+            'name': f"Synthetic Course {course_id}",
+            'description': "Generated for benchmarking",
+            'materials': [{'name': f"Material {n}", 'url': f"https://example.com/{course_id}/{n}"}
+                          for n in range(3)],
+            'created_at': "2024-12-18T21:57:59.828363"
+        }
+    data['meta']['next_course_id'] = course_id + 1
+    course_ids = list(data['courses'])
+    for index in range(users):
+        enrolled = rng.sample(course_ids, rng.randint(1, 3))
+        data['users'][synthetic_user_id(index)] = {
+            'enrolled_courses': enrolled,
+            'progress': {
+                enrolled_id: {
+                    'status': 'enrolled',
+                    'completed_materials': [],
+                    'enrolled_at': "2024-12-18T22:00:55.766992"
+                }
+                for enrolled_id in enrolled
+            }
+        }
+    return data
+
+
+def synthetic_user_id(index):
+    return f"{index:032x}"
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results, args, output=None):
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': args,
+        },
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return output
+
+
+def _result_key(result):
+    return (result['suite'], result['backend'], result['users'], result['operation'])
+
+
+def compare(baseline_path, candidate_path):
+    # Prints the relative change of every metric present in both reports
+    with open(baseline_path) as f:
+        baseline = {_result_key(result): result for result in json.load(f)['results']}
+    with open(candidate_path) as f:
+        candidate = json.load(f)['results']
+    print(f"{'suite':<8} {'backend':<8} {'users':>8} {'operation':<20} "
+          f"{'p50':>9} {'p95':>9} {'p99':>9} {'ops/s':>9}")
+    for result in candidate:
+        before = baseline.get(_result_key(result))
+        # Memory reports (benchmarks.memory) have no latency metrics
+        if before is None or 'p50_ms' not in result:
+            continue
+        changes = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s'):
+            old, new = before[metric], result[metric]
+            changes.append(f"{(new - old) / old * 100:+8.1f}%" if old else f"{'n/a':>9}")
+        print(f"{result['suite']:<8} {result['backend']:<8} {result['users']:>8} "
+              f"{result['operation']:<20} " + " ".join(changes))
@@ -0,0 +1,87 @@
+"""Memory footprint of the users section: nested dicts vs the compact model.
+
+    python -m benchmarks.memory --users 10000 100000 1000000
+
+Each population is measured in a fresh process with tracemalloc: the
+memory retained by the users as json.load leaves them, and by the same
+users converted to utils.compact_model.CompactUsers (plus the peak during
+the conversion). Results are written as JSON like benchmarks.run.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import tracemalloc
+
+from benchmarks.harness import save_results, synthetic_data
+
+
+def _retained(build):
+    # Bytes still allocated once build() returns, and the peak while it ran
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, current, peak
+
+
+def measure_case(users, seed):
+    from utils.compact_model import CompactUsers
+
+    data = synthetic_data(users, seed)
+    users_text = json.dumps(data['users'])
+    courses = data['courses']
+    del data
+
+    dict_users, dict_bytes, _ = _retained(lambda: json.loads(users_text))
+    del dict_users
+    compact_users, compact_bytes, compact_peak = _retained(
+        lambda: CompactUsers.from_data(json.loads(users_text), courses))
+    assert len(compact_users) == users
+    del compact_users
+
+    results = []
+    for layout, retained, peak in (('dict', dict_bytes, dict_bytes),
+                                   ('compact', compact_bytes, compact_peak)):
+        results.append({
+            'suite': 'memory',
+            'backend': layout,
+            'users': users,
+            'operation': 'users_section',
+            'retained_mb': retained / (1024 * 1024),
+            'peak_mb': peak / (1024 * 1024),
+            'bytes_per_user': retained / users if users else 0.0,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', nargs='+', type=int, default=[10000, 100000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="results file (default: benchmarks/results/)")
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    print(f"{'layout':<8} {'users':>9} {'retained MB':>12} {'peak MB':>9} {'bytes/user':>11}")
+    for users in args.users:
+        with context.Pool(1) as pool:
+            case_results = pool.apply(measure_case, (users, args.seed))
+        for result in case_results:
+            print(f"{result['backend']:<8} {result['users']:>9} {result['retained_mb']:>12.1f} "
+                  f"{result['peak_mb']:>9.1f} {result['bytes_per_user']:>11.0f}")
+        dict_result, compact_result = case_results
+        if compact_result['retained_mb']:
+            print(f"{'':<8} {'':>9} compact uses {compact_result['retained_mb'] / dict_result['retained_mb']:.0%}"
+                  " of the dict layout")
+        results.extend(case_results)
+    print(f"Results written to {save_results(results, vars(args), args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Per-message NLU latency with and without the keyword fast path.
+
+    python -m benchmarks.nlu
+    python -m benchmarks.nlu --model models/fast-path.tar.gz --baseline-model models/default.tar.gz
+
+The messages are the training examples in data/nlu.yml plus the phrasings
+of benchmarks.run. Without models only utils.nlu_fast_path is measured: its
+hit rate and its cost per message. With Rasa installed, --model (trained
+with config.yml) and --baseline-model (trained with the default pipeline,
+`pipeline: null`) are loaded and every message is parsed through each, so
+the two latency distributions can be compared directly; the fast-path
+model is also reported separately for messages it short-circuits and for
+those it passes on. Results are written as JSON like benchmarks.run.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from benchmarks.harness import measure, save_results
+from benchmarks.run import MESSAGES
+from utils.nlu_fast_path import fast_parse
+
+NLU_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "nlu.yml")
+
+
+def nlu_examples(path=NLU_FILE):
+    # The "- example" lines of the intent blocks; enough of the YAML for
+    # this file's layout
+    examples = []
+    with open(path, 'r') as f:
+        for line in f:
+            stripped = line.strip()
+            if line.startswith("    - ") and stripped[2:]:
+                examples.append(stripped[2:])
+    return examples
+
+
+def result(backend, operation, measured):
+    return dict(measured, suite='nlu', backend=backend, users=0, operation=operation)
+
+
+def measure_model(name, model_path, messages, rounds, budget):
+    from rasa.core.agent import Agent
+
+    loop = asyncio.new_event_loop()
+    try:
+        agent = Agent.load(model_path)
+        # The first parse builds lazily initialized parts of the graph
+        loop.run_until_complete(agent.parse_message(messages[0]))
+        results = [result(name, 'parse', measure(
+            'parse', lambda index: loop.run_until_complete(agent.parse_message(messages[index % len(messages)])),
+            rounds * len(messages), budget))]
+        for operation, subset in (('parse_hits', [text for text in messages if fast_parse(text)]),
+                                  ('parse_misses', [text for text in messages if not fast_parse(text)])):
+            if subset:
+                results.append(result(name, operation, measure(
+                    operation, lambda index: loop.run_until_complete(agent.parse_message(subset[index % len(subset)])),
+                    rounds * len(subset), budget)))
+        return results
+    finally:
+        loop.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', help="model trained with config.yml (fast path enabled)")
+    parser.add_argument('--baseline-model', help="model trained with the default pipeline")
+    parser.add_argument('--rounds', type=int, default=20, help="passes over the message set")
+    parser.add_argument('--budget', type=float, default=30.0,
+                        help="seconds after which a measurement stops early")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/)")
+    args = parser.parse_args(argv)
+
+    messages = nlu_examples() + MESSAGES
+    hits = sum(1 for text in messages if fast_parse(text))
+    print(f"{len(messages)} messages, fast path hit rate {hits / len(messages):.0%}")
+
+    results = [result('fast_path', 'fast_parse', measure(
+        'fast_parse', lambda index: fast_parse(messages[index % len(messages)]),
+        args.rounds * len(messages), args.budget))]
+    results[0]['hit_rate'] = hits / len(messages)
+
+    models = [(name, path) for name, path in (('fast_path_model', args.model),
+                                             ('baseline_model', args.baseline_model)) if path]
+    if models:
+        try:
+            import rasa  # noqa: F401
+        except ImportError:
+            print("rasa is not installed; measuring the fast path only", file=sys.stderr)
+            models = []
+    for name, path in models:
+        results.extend(measure_model(name, path, messages, args.rounds, args.budget))
+
+    for measured in results:
+        print(f"{measured['backend']:<16} {measured['operation']:<13} {measured['ops']:>7} msgs  "
+              f"p50 {measured['p50_ms']:8.3f} ms  p95 {measured['p95_ms']:8.3f} ms  "
+              f"p99 {measured['p99_ms']:8.3f} ms")
+    print(f"Results written to {save_results(results, vars(args), args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Offline benchmarks for the LMS store and the Rasa actions.
+
+    python -m benchmarks.run --users 1000 10000 --backends json sqlite
+    python -m benchmarks.run --suites actions --users 100000 --ops 500
+    python -m benchmarks.run --compare benchmarks/results/old.json benchmarks/results/new.json
+
+Each (suite, backend, population) case runs in a fresh process against a
+synthetic lms_data.json in a temporary directory, so peak RSS is per case.
+Results are written as JSON for comparison between commits.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from benchmarks.harness import (compare, measure, peak_rss_mb, save_results,
+                                synthetic_data, synthetic_user_id)
+
+SUITES = ('lms', 'actions')
+BACKENDS = ('json', 'journal', 'sqlite', 'sharded')
+
+# Phrasings sent to the recommendation action, a mix of hits and misses
+MESSAGES = [
+    "I'm a beginner interested in web development",
+    "intermediate data science please",
+    "beginner who wants to learn python",
+    "I am an intermediate mobile app developer",
+    "beginner in artificial intelligence",
+    "recommend something",
+    "thanks, that was helpful",
+]
+
+
+class StubTracker:
+    # Just the parts of rasa_sdk.Tracker the actions read
+    def __init__(self, sender_id, text):
+        self.sender_id = sender_id
+        self.latest_message = {'text': text, 'intent': {}, 'entities': []}
+
+
+def _reset_lms():
+    # LMSManager and the async facade are process-wide singletons
+    from utils import async_lms
+    from utils.lms_utils import LMSManager
+    if LMSManager._instance is not None:
+        LMSManager._instance.close()
+    LMSManager._instance = None
+    async_lms._async_lms = None
+
+
+def _prepare_store(workdir, backend, users, seed):
+    from utils.lms_utils import DEFAULT_DATA_FILES, LMSManager
+    data = synthetic_data(users, seed)
+    with open(os.path.join(workdir, "lms_data.json"), 'w') as f:
+        json.dump(data, f)
+    os.environ['LMS_STORAGE_BACKEND'] = backend
+    os.environ['LMS_DATA_FILE'] = os.path.join(workdir, DEFAULT_DATA_FILES[backend])
+    # Non-JSON stores migrate from lms_data.json on first start; keep that
+    # out of the measured load time
+    LMSManager()
+    _reset_lms()
+    return list(data['courses'])
+
+
+def _lms_suite(backend, users, ops, budget, rng, course_ids):
+    from utils.lms_utils import LMSManager
+
+    def load(_):
+        _reset_lms()
+        LMSManager()
+
+    results = [measure('load', load, min(ops, 5), budget)]
+    lms = LMSManager()
+    materials = [{'name': "Bench Material", 'url': "https://example.com/bench"}]
+    results.append(measure(
+        'create', lambda index: lms.create_course(f"Bench Course {index}", "Benchmark", materials),
+        ops, budget))
+    results.append(measure(
+        'enroll', lambda _: lms.enroll_user(synthetic_user_id(rng.randrange(users + ops)),
+                                            rng.choice(course_ids)),
+        ops, budget))
+    results.append(measure(
+        'get', lambda _: lms.get_user_courses(synthetic_user_id(rng.randrange(users))),
+        ops, budget))
+    results.append(measure('save', lambda _: lms.save_data(), min(ops, 20), budget))
+    return results
+
+
+def _actions_suite(backend, users, ops, budget, rng, course_ids):
+    from rasa_sdk.executor import CollectingDispatcher
+    from actions.actions import ActionProvideLearningRecommendations, ActionShowEnrollments
+
+    recommend = ActionProvideLearningRecommendations()
+    show = ActionShowEnrollments()
+    loop = asyncio.new_event_loop()
+
+    def run_action(action, text):
+        tracker = StubTracker(synthetic_user_id(rng.randrange(users)), text)
+        return action.run(CollectingDispatcher(), tracker, {})
+
+    async def run_concurrently(count):
+        await asyncio.gather(*(run_action(recommend, rng.choice(MESSAGES)) for _ in range(count)))
+
+    concurrency = 50
+    results = [
+        measure('recommend',
+                lambda _: loop.run_until_complete(run_action(recommend, rng.choice(MESSAGES))),
+                ops, budget),
+        measure('show_enrollments',
+                lambda _: loop.run_until_complete(run_action(show, "show my courses")),
+                ops, budget),
+        measure('recommend_concurrent',
+                lambda _: loop.run_until_complete(run_concurrently(concurrency)),
+                max(1, ops // concurrency), budget, batch=concurrency),
+    ]
+    loop.close()
+    return results
+
+
+def run_case(suite, backend, users, ops, budget, seed):
+    workdir = tempfile.mkdtemp(prefix="lms-bench-")
+    rng = random.Random(seed)
+    try:
+        course_ids = _prepare_store(workdir, backend, users, seed)
+        run_suite = _lms_suite if suite == 'lms' else _actions_suite
+        results = run_suite(backend, users, ops, budget, rng, course_ids)
+        _reset_lms()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    rss = peak_rss_mb()
+    for result in results:
+        result.update(suite=suite, backend=backend, users=users, peak_rss_mb=rss)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['json', 'sqlite'])
+    parser.add_argument('--users', nargs='+', type=int, default=[1000, 10000],
+                        help="synthetic population sizes, e.g. 1000 100000 1000000")
+    parser.add_argument('--ops', type=int, default=200, help="operations per measurement")
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help="seconds after which a measurement stops early")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="results file (default: benchmarks/results/)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help="print the change between two results files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if 'actions' in args.suites:
+        try:
+            import rasa_sdk  # noqa: F401
+        except ImportError:
+            print("rasa_sdk is not installed; skipping the actions suite", file=sys.stderr)
+            args.suites = [suite for suite in args.suites if suite != 'actions']
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for suite in args.suites:
+        for backend in args.backends:
+            for users in args.users:
+                with context.Pool(1) as pool:
+                    case_results = pool.apply(run_case, (suite, backend, users, args.ops,
+                                                         args.budget, args.seed))
+                for result in case_results:
+                    print(f"{suite:<8} {backend:<8} {users:>8} {result['operation']:<20} "
+                          f"{result['throughput_per_s']:>10.1f} ops/s  "
+                          f"p50 {result['p50_ms']:8.3f} ms  p95 {result['p95_ms']:8.3f} ms  "
+                          f"p99 {result['p99_ms']:8.3f} ms  rss {result['peak_rss_mb'] or 0:.0f} MB")
+                results.extend(case_results)
+    print(f"Results written to {save_results(results, vars(args), args.output)}")
+
+
+if __name__ == '__main__':
+    main()
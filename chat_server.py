@@ -0,0 +1,314 @@
+"""Asyncio HTTP backend for templates/index.html.
+
+    python chat_server.py --port 8000
+
+Serves the page at / and answers POST /chat {"message": ...} with
+{"response": ..., "html": ..., "course": ...}. One event loop handles every
+connection (HTTP/1.1 keep-alive), conversation state lives in a bounded LRU
+keyed by a session cookie, and enrollments persist through LMSManager with
+the session id as the user id. Unlike the Streamlit app nothing is re-run
+per message: a repeated phrasing is answered from the response cache, and
+a turn that chooses a course adds two LMS writes on the async facade's
+thread pool.
+"""
+import argparse
+import asyncio
+import html
+import json
+import mimetypes
+import os
+import re
+import secrets
+from collections import OrderedDict, deque
+from http import HTTPStatus
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import urlsplit
+
+from utils.async_lms import get_async_lms
+from utils.catalog import CatalogLoader, thaw
+from utils.chat import (SHOW_COURSES_HINT, cached_query_signature, check_input_requirements,
+                        format_enrollments, get_feedback_response, lms_course_fields)
+from utils.fragments import get_fragments
+from utils.metrics import get_logger, metrics
+from utils.recommender import enrollment_history, get_recommender
+from utils.response_cache import get_response_cache
+from utils.tracing import span
+
+logger = get_logger("chat_server")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_COOKIE = "session_id"
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+URL_RE = re.compile(r"https?://[^\s<]+")
+
+# Most sessions kept in memory; the least recently active are evicted first.
+# An evicted learner keeps their enrollments (they live in the LMS) and only
+# loses the in-memory message history.
+MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", "10000"))
+# Messages kept per session, as in the Streamlit app's ring buffer
+HISTORY_LIMIT = int(os.environ.get("CHAT_HISTORY_LIMIT", "200"))
+# Seconds an idle keep-alive connection is held open
+KEEP_ALIVE_TIMEOUT = float(os.environ.get("CHAT_KEEP_ALIVE_TIMEOUT", "15"))
+MAX_MESSAGE_CHARS = 2000
+# Caps on the request head and body; larger requests are rejected
+MAX_HEAD_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ChatSession:
+    __slots__ = ('session_id', 'messages')
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.messages = deque(maxlen=HISTORY_LIMIT)
+
+
+class SessionStore:
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def get(self, session_id):
+        # Returns (session, created); unknown or malformed ids start a new
+        # session, an evicted id is recreated under the same id
+        if session_id is None or not SESSION_ID_RE.match(session_id):
+            session_id = secrets.token_hex(16)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session, False
+        session = self._sessions[session_id] = ChatSession(session_id)
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session, True
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def to_html(text):
+    # The page inserts the reply with innerHTML: escape it, link URLs and
+    # keep line breaks
+    escaped = html.escape(text)
+    linked = URL_RE.sub(lambda match: f'<a href="{match.group(0)}" target="_blank">{match.group(0)}</a>', escaped)
+    return linked.replace("\n", "<br>")
+
+
+class ChatService:
+    def __init__(self, lms=None, catalog_loader=None, cache=None):
+        self.lms = lms or get_async_lms()
+        self.catalog_loader = catalog_loader or CatalogLoader()
+        self.cache = cache if cache is not None else get_response_cache("chat_server")
+
+    async def reply(self, session, prompt):
+        # One turn of the Streamlit app's conversation flow; returns the
+        # reply text and the id of the catalog course offered, if any
+        prompt = prompt.lower()
+        catalog = self.catalog_loader.get()
+        self.cache.bind(catalog)
+        signature = cached_query_signature(self.cache, prompt, get_recommender(catalog))
+        feedback_response = get_feedback_response(signature.feedback)
+        if feedback_response:
+            return feedback_response, None
+        if signature.command == "show_courses":
+            return format_enrollments(await self.lms.get_user_courses(session.session_id)), None
+
+        requirement_message = check_input_requirements(signature.experience, signature.topic)
+        if requirement_message:
+            return requirement_message, None
+        experience = signature.experience
+        course = self.cache.get_or_compute(('course', signature.topic, experience),
+                                           lambda: catalog.find(signature.topic, experience))
+        if course is None:
+            return "Sorry, I couldn't find a course for that yet. Please try another topic.", None
+        return await self.enroll(session, prompt, course, experience, catalog), course['id']
+
+    async def enroll(self, session, prompt, course, experience, catalog):
+        # Enrolls the learner in the canonical LMS course for the catalog
+        # course and renders the welcome message
+        history = enrollment_history(await self.lms.get_user_courses(session.session_id))
+        key, course_name, description, materials = self.cache.get_or_compute(
+            ('lms_course', course['id'], experience),
+            lambda: (*lms_course_fields(course, experience), thaw(course['materials'])))
+        course_id = await self.lms.get_or_create_course(key, course_name, description, materials)
+        if not course_id or not await self.lms.enroll_user(session.session_id, course_id):
+            return "I'm having trouble setting up your course. Please try again."
+
+        # Course text is pre-rendered per catalog version and headed with the
+        # LMS course name; only the suggestions are per learner
+        parts = [get_fragments(catalog).get(course['id'], course_name).body_text]
+        # Other catalog courses ranked against the prompt and past enrollments
+        suggestions = get_recommender(catalog).recommend(prompt, history, k=2, exclude_ids=[course['id']])
+        if suggestions:
+            parts.append("✨ You might also like: " + ", ".join(suggested['name'] for suggested, _ in suggestions))
+        parts.append(SHOW_COURSES_HINT)
+        return "\n\n".join(parts)
+
+
+def _json_response(status, payload, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    return status, [('Content-Type', "application/json; charset=utf-8"), *headers], body
+
+
+def _error(status, message):
+    return _json_response(status, {'error': message})
+
+
+# Minimal HTTP/1.1 server on asyncio streams: persistent connections,
+# Content-Length bodies only, no pipelining beyond in-order handling
+class ChatServer:
+    def __init__(self, service=None, sessions=None, keep_alive_timeout=KEEP_ALIVE_TIMEOUT):
+        self.service = service or ChatService()
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.keep_alive_timeout = keep_alive_timeout
+        self.static_files = self._load_static_files()
+
+    @staticmethod
+    def _load_static_files():
+        # The page and its assets are small and fixed: read once and serve
+        # from memory, which also rules out path traversal
+        files = {}
+        with open(os.path.join(BASE_DIR, "templates", "index.html"), 'rb') as f:
+            files['/'] = ("text/html; charset=utf-8", f.read())
+        static_dir = os.path.join(BASE_DIR, "static")
+        for name in os.listdir(static_dir):
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            with open(os.path.join(static_dir, name), 'rb') as f:
+                files[f"/static/{name}"] = (content_type, f.read())
+        return files
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, *_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                                     "Request headers too large"), keep_alive=False)
+                    break
+
+                try:
+                    request_line, *header_lines = head.decode('latin-1').rstrip("\r\n").split("\r\n")
+                    method, target, version = request_line.split(" ", 2)
+                    headers = {}
+                    for line in header_lines:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', "0"))
+                except ValueError:
+                    await self._send(writer, *_error(HTTPStatus.BAD_REQUEST, "Malformed request"), keep_alive=False)
+                    break
+                if 'transfer-encoding' in headers:
+                    await self._send(writer, *_error(HTTPStatus.LENGTH_REQUIRED, "Content-Length required"),
+                                     keep_alive=False)
+                    break
+                if length < 0 or length > MAX_BODY_BYTES:
+                    await self._send(writer, *_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large"),
+                                     keep_alive=False)
+                    break
+                try:
+                    body = await reader.readexactly(length) if length else b""
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                connection = headers.get('connection', "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                try:
+                    status, response_headers, payload = await self.dispatch(method, target, headers, body)
+                except Exception as e:
+                    metrics.record_error('http')
+                    logger.error("Error handling %s %s: %s", method, target, e)
+                    status, response_headers, payload = _error(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal error")
+                await self._send(writer, status, response_headers, payload, keep_alive,
+                                 head_only=method == "HEAD")
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, headers, body, keep_alive, head_only=False):
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}",
+                 f"Content-Length: {len(body)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if keep_alive:
+            lines.append("Connection: keep-alive")
+            lines.append(f"Keep-Alive: timeout={int(self.keep_alive_timeout)}")
+        else:
+            lines.append("Connection: close")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        # Head and body in one write
+        writer.write(head if head_only else head + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        path = urlsplit(target).path
+        if path == "/chat":
+            if method != "POST":
+                return _error(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+            return await self.chat(headers, body)
+        if path == "/health" and method in ("GET", "HEAD"):
+            return _json_response(HTTPStatus.OK, {'status': "ok", 'sessions': len(self.sessions),
+                                                  'response_cache': self.service.cache.stats()})
+        static = self.static_files.get(path)
+        if static is not None and method in ("GET", "HEAD"):
+            content_type, content = static
+            return HTTPStatus.OK, [('Content-Type', content_type)], content
+        return _error(HTTPStatus.NOT_FOUND, "Not found")
+
+    async def chat(self, headers, body):
+        try:
+            message = json.loads(body or b"{}").get('message')
+        except (ValueError, AttributeError):
+            return _error(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        if not isinstance(message, str) or not message.strip():
+            return _error(HTTPStatus.BAD_REQUEST, "'message' must be a non-empty string")
+        message = message[:MAX_MESSAGE_CHARS]
+
+        session_id = None
+        if 'cookie' in headers:
+            try:
+                morsel = SimpleCookie(headers['cookie']).get(SESSION_COOKIE)
+                session_id = morsel.value if morsel else None
+            except CookieError:
+                pass
+        session, created = self.sessions.get(session_id)
+
+        with span("http.chat", new_session=created):
+            response, course_id = await self.service.reply(session, message)
+        session.messages.append({"role": "user", "content": message.lower()})
+        session.messages.append({"role": "assistant", "content": response, "course": course_id})
+
+        cookie_headers = ()
+        if session.session_id != session_id:
+            cookie_headers = [('Set-Cookie', f"{SESSION_COOKIE}={session.session_id}; Path=/; "
+                                             "HttpOnly; SameSite=Lax; Max-Age=31536000")]
+        return _json_response(HTTPStatus.OK, {'response': response, 'html': to_html(response),
+                                              'course': course_id}, cookie_headers)
+
+
+async def serve(host, port):
+    chat_server = ChatServer()
+    server = await asyncio.start_server(chat_server.handle_connection, host, port,
+                                        limit=MAX_HEAD_BYTES, backlog=1024)
+    logger.warning("Chat server listening on http://%s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get("CHAT_HOST", "127.0.0.1"))
+    parser.add_argument('--port', type=int, default=int(os.environ.get("CHAT_PORT", "8000")))
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
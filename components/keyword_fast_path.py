@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Text
+
+from rasa.engine.graph import ExecutionContext, GraphComponent
+from rasa.engine.recipes.default_recipe import DefaultV1Recipe
+from rasa.engine.storage.resource import Resource
+from rasa.engine.storage.storage import ModelStorage
+from rasa.nlu.classifiers.diet_classifier import DIETClassifier
+from rasa.nlu.featurizers.sparse_featurizer.count_vectors_featurizer import CountVectorsFeaturizer
+from rasa.nlu.featurizers.sparse_featurizer.lexical_syntactic_featurizer import LexicalSyntacticFeaturizer
+from rasa.nlu.featurizers.sparse_featurizer.regex_featurizer import RegexFeaturizer
+from rasa.shared.nlu.constants import ENTITIES, INTENT, INTENT_RANKING_KEY, TEXT
+from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
+
+from utils.nlu_fast_path import fast_parse
+from utils.tracing import span
+
+# Message attribute set on messages the fast path has classified; the
+# FastPath* components below skip them at inference time
+FAST_PATH = "fast_path"
+
+
+# Classifies messages the shared keyword table explains completely ("hi",
+# "show my courses", "beginner in web development") with confidence 1.0 and
+# extracts experience_level / coding_interest entities. Everything else is
+# left untouched for the featurizers and DIET.
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER, DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR],
+    is_trainable=False,
+)
+class KeywordFastPathClassifier(GraphComponent):
+    @staticmethod
+    def get_default_config() -> Dict[Text, Any]:
+        return {"enabled": True}
+
+    @classmethod
+    def create(
+        cls,
+        config: Dict[Text, Any],
+        model_storage: ModelStorage,
+        resource: Resource,
+        execution_context: ExecutionContext,
+    ) -> "KeywordFastPathClassifier":
+        return cls(config)
+
+    def __init__(self, config: Dict[Text, Any]) -> None:
+        self.enabled = config.get("enabled", True)
+
+    def process_training_data(self, training_data: TrainingData) -> TrainingData:
+        # Training data always goes through the full pipeline
+        return training_data
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        if not self.enabled:
+            return messages
+        for message in messages:
+            text = message.get(TEXT)
+            if not text:
+                continue
+            with span("nlu.fast_path"):
+                parsed = fast_parse(text)
+            if parsed is None:
+                continue
+            intent = {"name": parsed['intent'], "confidence": 1.0}
+            message.set(INTENT, intent, add_to_output=True)
+            message.set(INTENT_RANKING_KEY, [intent], add_to_output=True)
+            entities = [dict(entity, extractor=self.__class__.__name__) for entity in parsed['entities']]
+            message.set(ENTITIES, message.get(ENTITIES, []) + entities, add_to_output=True)
+            message.set(FAST_PATH, True)
+        return messages
+
+
+class _SkipFastPath:
+    # Runs the wrapped component's inference only on messages the fast path
+    # left unclassified; training is unchanged
+    def process(self, messages: List[Message], *args: Any, **kwargs: Any) -> List[Message]:
+        remaining = [message for message in messages if not message.get(FAST_PATH)]
+        if remaining:
+            super().process(remaining, *args, **kwargs)
+        return messages
+
+
+# Drop-in replacements for the default pipeline's featurizers and classifier
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class FastPathRegexFeaturizer(_SkipFastPath, RegexFeaturizer):
+    pass
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class FastPathLexicalSyntacticFeaturizer(_SkipFastPath, LexicalSyntacticFeaturizer):
+    pass
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class FastPathCountVectorsFeaturizer(_SkipFastPath, CountVectorsFeaturizer):
+    pass
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER, DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR],
+    is_trainable=True,
+)
+class FastPathDIETClassifier(_SkipFastPath, DIETClassifier):
+    pass
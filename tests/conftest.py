@@ -0,0 +1,36 @@
+import pytest
+
+from utils import async_lms
+from utils.lms_utils import DEFAULT_DATA_FILES, LMSManager
+
+# Settings read by LMSManager from the environment; cleared so a developer's
+# shell cannot change what the tests exercise
+LMS_ENVIRONMENT = ("LMS_STORAGE_BACKEND", "LMS_DATA_FILE", "LMS_MULTIPROCESS", "LMS_WRITE_BEHIND",
+                   "LMS_FLUSH_INTERVAL_MS", "LMS_FLUSH_MAX_PENDING", "LMS_COMPACT_MEMORY")
+
+
+def reset_lms():
+    # LMSManager and the async facade are process-wide singletons
+    if LMSManager._instance is not None:
+        LMSManager._instance.close()
+    LMSManager._instance = None
+    async_lms._async_lms = None
+
+
+@pytest.fixture
+def make_lms(tmp_path, monkeypatch):
+    # make_lms(backend, **environment) builds a fresh LMSManager over a store
+    # in tmp_path; every manager is closed after the test
+    for name in LMS_ENVIRONMENT:
+        monkeypatch.delenv(name, raising=False)
+
+    def make(backend='json', **environment):
+        reset_lms()
+        monkeypatch.setenv("LMS_STORAGE_BACKEND", backend)
+        monkeypatch.setenv("LMS_DATA_FILE", str(tmp_path / DEFAULT_DATA_FILES[backend]))
+        for name, value in environment.items():
+            monkeypatch.setenv(name, value)
+        return LMSManager()
+
+    yield make
+    reset_lms()
@@ -0,0 +1,65 @@
+import threading
+
+from utils.analytics import Analytics, aggregate_data, analytics_path
+
+WEB_COURSE = {'name': "Web Development for Beginners", 'description': "", 'materials': []}
+DATA_COURSE = {'name': "Data Science for Beginners", 'description': "", 'materials': []}
+MATERIALS = [{'name': "Intro", 'url': "https://example.com/intro"},
+             {'name': "Project", 'url': "https://example.com/project"}]
+
+
+def test_instances_sharing_a_file_do_not_lose_counts(tmp_path):
+    path = str(tmp_path / "lms_data.json.analytics.json")
+    # Each worker learns about the other's course through the shared store
+    courses = {"1": WEB_COURSE, "2": DATA_COURSE}
+    workers = [Analytics(path, course_lookup=courses.get, save_interval=0) for _ in range(2)]
+    for worker in workers:
+        worker.load()
+    workers[0].record_course("1", WEB_COURSE)
+    workers[1].record_course("2", DATA_COURSE)
+
+    def enroll(worker):
+        for index in range(100):
+            worker.record_enrollment("1" if index % 2 else "2", "2024-05-01T10:00:00", (), True)
+            if index % 10 == 0:
+                worker.save()
+        worker.record_status("1", 'in_progress', 'completed')
+        worker.save()
+    threads = [threading.Thread(target=enroll, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = Analytics(path)
+    assert merged.load()
+    assert merged.totals() == {'courses': 2, 'users': 200, 'enrollments': 200, 'completed': 2}
+    assert merged.enrollments_on("2024-05-01") == 200
+    assert merged.users_in_topic("web") == 100 and merged.users_in_topic("data") == 100
+    assert merged.completion_rate("1") == 2 / 100
+    # Whichever worker saved last also sees the other's counts
+    assert merged.totals() in (workers[0].totals(), workers[1].totals())
+
+
+def test_rebuild_matches_incremental_counts(make_lms):
+    lms = make_lms('json')
+    web = lms.get_or_create_course("web:beginner", "Web Development for Beginners", "", MATERIALS)
+    data = lms.get_or_create_course("data:beginner", "Data Science for Beginners", "", MATERIALS)
+    lms.create_courses([{'name': "Android Apps", 'description': "", 'materials': MATERIALS}])
+    for index in range(6):
+        lms.enroll_user(f"u{index}", web)
+    lms.enroll_many([(f"u{index}", data) for index in range(3, 9)])
+    lms.complete_material("u0", web, MATERIALS[0]['url'])
+    lms.complete_material("u0", web, MATERIALS[1]['url'])
+    lms.complete_material("u4", data, MATERIALS[0]['url'])
+    lms.complete_material("u4", data, MATERIALS[1]['url'])
+    lms.flush()
+
+    incremental = lms.analytics.snapshot()
+    assert incremental['totals'] == {'courses': 3, 'users': 9, 'enrollments': 12, 'completed': 2}
+    assert incremental == aggregate_data(lms.backend.export_data())
+
+    # And what was saved is what a restart loads
+    reloaded = Analytics(analytics_path(lms.data_file))
+    assert reloaded.load()
+    assert reloaded.snapshot() == incremental
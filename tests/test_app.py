@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+testing = pytest.importorskip("streamlit.testing.v1")
+
+from utils.catalog import get_catalog  # noqa: E402
+from utils.chat import lms_course_fields  # noqa: E402
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def run_app(uid=None):
+    app = testing.AppTest.from_file(APP_FILE, default_timeout=30)
+    if uid is not None:
+        app.query_params["uid"] = uid
+    return app.run()
+
+
+def say(app, prompt):
+    app.chat_input[0].set_value(prompt)
+    return app.run()
+
+
+def markdown(app):
+    return "\n".join(element.value for element in app.markdown)
+
+
+def test_enrollment_is_persisted_and_shown_after_a_reconnect(make_lms):
+    lms = make_lms('json')
+    app = say(run_app(), "I am a beginner in web development")
+    assert not app.exception
+    uid = app.session_state.user_id
+    assert app.query_params["uid"] == uid
+
+    # Stored in the LMS under the course created for the catalog course
+    course = get_catalog().find("web", "beginner")
+    key, name, _ = lms_course_fields(course, "beginner")
+    [enrollment] = lms.get_user_courses(uid)
+    assert enrollment['course_id'] == lms.backend.find_course(key)
+    assert enrollment['name'] == name
+    assert app.session_state.messages[-1]['course'] == course['id']
+
+    # A new session on the same link reads the enrollment back from the LMS
+    lms.flush()
+    reconnected = say(run_app(uid), "show my courses")
+    assert not reconnected.exception
+    shown = markdown(reconnected)
+    assert f"📚 {name}" in shown
+    # Materials come from the LMS course record, looked up by course id
+    for material in lms.get_course(enrollment['course_id'])['materials']:
+        assert material['url'] in shown
+
+    # Asking for the same course again does not add a second enrollment
+    say(reconnected, "I am a beginner in web development")
+    assert len(lms.get_user_courses(uid)) == 1
+
+
+def test_only_the_history_window_is_rendered(make_lms):
+    make_lms('json')
+    app = run_app()
+    for _ in range(15):
+        app = say(app, "hello")
+    assert len(app.session_state.messages) == 30
+    # The turn just answered was rendered on top of the window; a plain
+    # rerun shows the window alone
+    assert len(app.chat_message) == 22
+    app = app.run()
+    assert len(app.chat_message) == 20
+    [button] = app.button
+    assert button.label == "Load earlier messages (10)"
+
+    app = button.click().run()
+    assert len(app.chat_message) == 30
+    assert not app.button
+    # The next turn goes back to the default window
+    app = say(app, "hello").run()
+    assert len(app.chat_message) == 20
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from utils.async_lms import AsyncLMSManager, get_async_lms
+
+MATERIALS = [{'name': "Intro", 'url': "https://example.com/intro"}]
+
+
+def test_concurrent_enrollments_do_not_block_the_event_loop(make_lms, monkeypatch):
+    lms = make_lms('json')
+    course_id = lms.create_course("Python Basics", "", MATERIALS)
+    add_enrollment = lms.backend.add_enrollment
+
+    def slow_add_enrollment(*args):
+        time.sleep(0.02)  # a slow disk
+        return add_enrollment(*args)
+    monkeypatch.setattr(lms.backend, 'add_enrollment', slow_add_enrollment)
+
+    async def main():
+        facade = get_async_lms()
+        assert get_async_lms() is facade
+        gaps = []
+        done = asyncio.Event()
+
+        async def ticker():
+            last = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        ticks = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(facade.enroll_user(f"u{index}", course_id)
+                                         for index in range(20)))
+        done.set()
+        await ticks
+        return facade, results, gaps
+
+    facade, results, gaps = asyncio.run(main())
+    facade.shutdown()
+    assert results == [True] * 20
+    assert lms.get_course_roster(course_id) == sorted(f"u{index}" for index in range(20))
+    # Twenty serialized 20ms writes took 400ms+, yet the loop kept ticking
+    assert len(gaps) >= 20
+    assert max(gaps) < 0.1
+
+
+def test_reads_run_alongside_queued_writes(make_lms):
+    lms = make_lms('json')
+    course_id = lms.create_course("Python Basics", "", MATERIALS)
+    facade = AsyncLMSManager(lms, max_workers=2)
+
+    async def main():
+        await facade.enroll_user("u1", course_id)
+        return await asyncio.gather(facade.get_user_courses("u1"), facade.get_course_roster(course_id),
+                                    facade.complete_material("u1", course_id, MATERIALS[0]['url']))
+
+    try:
+        courses, roster, completed = asyncio.run(main())
+    finally:
+        facade.shutdown()
+    assert [course['course_id'] for course in courses] == [course_id]
+    assert roster == ["u1"]
+    assert completed
+    assert lms.get_completion_percentage("u1", course_id) == 100.0
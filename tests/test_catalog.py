@@ -0,0 +1,56 @@
+import json
+import os
+
+from utils.catalog import CatalogLoader
+
+
+def course(course_id, topic="web", level="beginner"):
+    return {'id': course_id, 'name': course_id.title(), 'topic': topic, 'level': level,
+            'description': "", 'materials': [{'name': "Docs", 'url': f"https://example.com/{course_id}"}]}
+
+
+def write_catalog(path, text, mtime_ns):
+    path.write_text(text)
+    # Explicit mtimes, so each write is seen as a change however fast the test runs
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_catalog_is_reloaded_when_the_file_changes(tmp_path):
+    path = tmp_path / "course_catalog.json"
+    write_catalog(path, json.dumps({'courses': [course("web-basics")]}), 1_000_000_000)
+    loader = CatalogLoader(str(path), check_interval=0)
+    first = loader.get()
+    assert [entry['id'] for entry in first.courses] == ["web-basics"]
+    assert loader.get() is first
+
+    write_catalog(path, json.dumps({'courses': [course("web-basics"), course("data-basics", "data")]}),
+                  2_000_000_000)
+    second = loader.get()
+    assert second is not first
+    assert second.version != first.version
+    assert second.find("data")['id'] == "data-basics"
+
+
+def test_malformed_catalog_keeps_the_last_good_one(tmp_path):
+    path = tmp_path / "course_catalog.json"
+    write_catalog(path, json.dumps({'courses': [course("web-basics")]}), 1_000_000_000)
+    loader = CatalogLoader(str(path), check_interval=0)
+    good = loader.get()
+
+    write_catalog(path, '{"courses": [', 2_000_000_000)
+    assert loader.get() is good
+    write_catalog(path, json.dumps({'items': []}), 3_000_000_000)
+    assert loader.get() is good
+
+    # Fixing the file is picked up on the next check
+    write_catalog(path, json.dumps({'courses': [course("ai-basics", "ai")]}), 4_000_000_000)
+    assert loader.get().find("ai")['id'] == "ai-basics"
+
+
+def test_file_is_checked_at_most_once_per_interval(tmp_path):
+    path = tmp_path / "course_catalog.json"
+    write_catalog(path, json.dumps({'courses': [course("web-basics")]}), 1_000_000_000)
+    loader = CatalogLoader(str(path), check_interval=3600)
+    first = loader.get()
+    write_catalog(path, json.dumps({'courses': [course("data-basics", "data")]}), 2_000_000_000)
+    assert loader.get() is first
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from chat_server import ChatServer, ChatService, SessionStore, to_html  # noqa: E402
+from utils.async_lms import get_async_lms  # noqa: E402
+from utils.response_cache import ResponseCache  # noqa: E402
+
+
+class Client:
+    # One keep-alive connection to a ChatServer on an ephemeral port
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.cookie = None
+
+    async def request(self, method, path, body=b"", headers=()):
+        lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}", *headers]
+        if self.cookie:
+            lines.append(f"Cookie: {self.cookie}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await self.writer.drain()
+        status_line, *header_lines = (await self.reader.readuntil(b"\r\n\r\n")).decode(
+            'latin-1').rstrip("\r\n").split("\r\n")
+        response_headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        payload = await self.reader.readexactly(int(response_headers['content-length']))
+        if 'set-cookie' in response_headers:
+            self.cookie = response_headers['set-cookie'].split(";")[0]
+        return int(status_line.split()[1]), response_headers, payload
+
+    async def chat(self, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        status, headers, payload = await self.request("POST", "/chat", body,
+                                                      ["Content-Type: application/json"])
+        return status, json.loads(payload)
+
+
+@pytest.fixture
+def run_server(make_lms):
+    make_lms('json')
+
+    def run(scenario):
+        async def main():
+            service = ChatService(lms=get_async_lms(), cache=ResponseCache())
+            chat_server = ChatServer(service, SessionStore(), keep_alive_timeout=5)
+            server = await asyncio.start_server(chat_server.handle_connection, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                try:
+                    return await scenario(Client(reader, writer), chat_server)
+                finally:
+                    writer.close()
+            finally:
+                server.close()
+                await server.wait_closed()
+                service.lms.shutdown()
+        return asyncio.run(main())
+    return run
+
+
+def test_chat_reply_contract(run_server):
+    async def scenario(client, chat_server):
+        status, first = await client.chat({'message': "I am a beginner in web development"})
+        assert client.cookie is not None
+        status_again, courses = await client.chat({'message': "show my courses"})
+        return status, first, status_again, courses, chat_server
+
+    status, first, status_again, courses, chat_server = run_server(scenario)
+    assert status == 200 and status_again == 200
+    assert set(first) == {'response', 'html', 'course'}
+    assert first['course'] is not None
+    # The page inserts 'html' with innerHTML: escaped, with links and line breaks
+    assert "<br>" in first['html'] and "\n" not in first['html']
+    assert '<a href="https://' in first['html']
+    assert courses['course'] is None
+    assert "Web Development" in courses['response']
+    # One session, reused through the cookie, holding both turns
+    [session] = chat_server.sessions._sessions.values()
+    assert [message['role'] for message in session.messages] == ["user", "assistant"] * 2
+    assert get_async_lms().lms.get_user_courses(session.session_id)[0]['name'] in courses['response']
+
+
+def test_reply_text_is_escaped_in_html():
+    assert to_html("<b>hi</b> & see https://example.com/a?b=1\nbye") == (
+        '&lt;b&gt;hi&lt;/b&gt; &amp; see <a href="https://example.com/a?b=1" target="_blank">'
+        'https://example.com/a?b=1</a><br>bye')
+
+
+@pytest.mark.parametrize('body', [b"not json", b"[1, 2]", b'"text"', b"{}", b'{"message": ""}',
+                                  b'{"message": "   "}', b'{"message": 42}'])
+def test_malformed_chat_bodies_are_rejected(run_server, body):
+    async def scenario(client, chat_server):
+        status, payload = await client.chat(body)
+        # The connection stays usable after a client error
+        follow_up = await client.chat({'message': "thanks"})
+        return status, payload, follow_up, len(chat_server.sessions)
+
+    status, payload, (follow_up_status, follow_up), sessions = run_server(scenario)
+    assert status == 400
+    assert set(payload) == {'error'}
+    assert follow_up_status == 200 and follow_up['response']
+    assert sessions == 1
+
+
+def test_other_methods_and_paths(run_server):
+    async def scenario(client, chat_server):
+        chat_get = await client.request("GET", "/chat")
+        missing = await client.request("GET", "/missing")
+        page = await client.request("GET", "/")
+        too_large = await client.request("POST", "/chat", b"x" * (64 * 1024 + 1))
+        return chat_get, missing, page, too_large
+
+    chat_get, missing, page, too_large = run_server(scenario)
+    assert chat_get[0] == 405
+    assert missing[0] == 404
+    assert page[0] == 200 and page[1]['content-type'].startswith("text/html")
+    assert too_large[0] == 413 and too_large[1]['connection'] == "close"
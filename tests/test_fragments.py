@@ -0,0 +1,44 @@
+import json
+import os
+
+from utils.catalog import Catalog, CatalogLoader
+from utils.fragments import get_fragments
+
+
+def course(description, topic="web"):
+    return {'id': "web-basics", 'name': "Web Basics", 'topic': topic, 'level': "beginner",
+            'description': description, 'learning_path': ["HTML", "CSS"],
+            'materials': [{'name': "Docs", 'url': "https://example.com/docs"}]}
+
+
+def write_catalog(path, courses, mtime_ns):
+    path.write_text(json.dumps({'courses': courses}))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_fragments_are_rerendered_when_the_catalog_changes(tmp_path):
+    path = tmp_path / "course_catalog.json"
+    write_catalog(path, [course("Build pages")], 1_000_000_000)
+    loader = CatalogLoader(str(path), check_interval=0)
+
+    fragments = get_fragments(loader.get())
+    assert "Build pages" in fragments.get("web-basics").body_text
+    assert get_fragments(loader.get()) is fragments
+
+    write_catalog(path, [course("Build responsive pages")], 2_000_000_000)
+    reloaded = get_fragments(loader.get())
+    assert reloaded is not fragments
+    assert "Build responsive pages" in reloaded.get("web-basics").body_text
+    assert "Build responsive pages" in reloaded.get("web-basics", "Web Basics for Beginners").body_markdown
+
+
+def test_fragments_headed_with_the_lms_course_name():
+    fragments = get_fragments(Catalog([course("Build pages", topic="ai")]))
+    plain = fragments.get("web-basics")
+    named = fragments.get("web-basics", "Web Basics for Beginners")
+    assert plain.header == "🤖 🎉 Welcome to Web Basics!"
+    assert named.header == "🤖 🎉 Welcome to Web Basics for Beginners!"
+    assert fragments.get("web-basics", "Web Basics for Beginners") is named
+    assert fragments.get("web-basics", "Web Basics") is plain
+    assert "• Docs: https://example.com/docs" in named.body_text
+    assert fragments.get("missing") is None
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from utils.lms_convert import export_monolithic, import_monolithic, iter_lms_json
+from utils.storage import ShardedJSONBackend
+
+
+def sample_data():
+    # Escapes, non-ASCII text and numbers long enough to straddle small chunks
+    users = {
+        f"user-{index}-é中": {
+            'enrolled_courses': ["1", "2"],
+            'progress': {
+                "1": {'status': "in_progress", 'completed_materials': ["https://example.com/a?b=\"c\""],
+                      'enrolled_at': "2024-01-01T00:00:00"},
+                "2": {'status': "enrolled", 'completed_materials': [], 'score': 1234567.891011},
+            },
+        }
+        for index in range(50)
+    }
+    courses = {
+        "1": {'name': "Python \\ Basics", 'description': "Tabs\tand\nnewlines", 'materials': []},
+        "2": {'name': "Café \U0001f600", 'description': None, 'materials': [
+            {'name': "Intro", 'url': "https://example.com/intro"}]},
+    }
+    return {'users': users, 'courses': courses, 'enrollments': {},
+            'meta': {'generation': 7, 'next_course_id': 3}}
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 1 << 16])
+def test_streaming_round_trip(tmp_path, chunk_size):
+    data = sample_data()
+    source = tmp_path / "lms_data.json"
+    source.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    assert sorted((section, key) for section, key, _ in iter_lms_json(source, chunk_size)) == sorted(
+        [('users', user_id) for user_id in data['users']] +
+        [('courses', course_id) for course_id in data['courses']] +
+        [('enrollments', None), ('meta', None)])
+
+    backend = ShardedJSONBackend(str(tmp_path / "lms_data"))
+    backend.load()
+    assert import_monolithic(str(source), backend, chunk_size=chunk_size) == len(data['users'])
+    assert backend.get_user("user-3-é中") == data['users']["user-3-é中"]
+
+    target = tmp_path / "exported.json"
+    assert export_monolithic(backend, str(target)) == len(data['users'])
+    exported = json.loads(target.read_text(encoding='utf-8'))
+    assert exported['users'] == data['users']
+    assert exported['courses'] == data['courses']
+    assert exported['meta']['next_course_id'] == 3
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    source = tmp_path / "lms_data.json"
+    source.write_text(json.dumps(sample_data())[:-40], encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_lms_json(source, 64))
@@ -0,0 +1,253 @@
+"""LMSManager behaviour on each storage backend.
+
+    python -m pytest tests
+"""
+import errno
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from utils import storage
+from utils.analytics import aggregate_data
+from utils.catalog import get_catalog, thaw
+from utils.chat import lms_course_fields
+from utils.lms_utils import DEFAULT_DATA_FILES, LMSManager
+
+MATERIALS = [{'name': "Intro", 'url': "https://example.com/intro"},
+             {'name': "Project", 'url': "https://example.com/project"}]
+
+
+def test_sqlite_round_trip(make_lms):
+    lms = make_lms('sqlite')
+    course_id = lms.create_course("Python Basics", "Learn Python", MATERIALS)
+    assert lms.enroll_user("u1", course_id)
+
+    lms = make_lms('sqlite')
+    course = lms.get_course(course_id)
+    assert (course['name'], course['description'], course['materials']) == (
+        "Python Basics", "Learn Python", MATERIALS)
+    [enrollment] = lms.get_user_courses("u1")
+    assert (enrollment['course_id'], enrollment['name'], enrollment['status']) == (
+        course_id, "Python Basics", 'enrolled')
+    # Enrolling again is accepted but does not add a second enrollment
+    assert lms.enroll_user("u1", course_id)
+    assert len(lms.get_user_courses("u1")) == 1
+
+
+def test_sqlite_catalog_courses_are_created_once(make_lms):
+    lms = make_lms('sqlite')
+    first = lms.get_or_create_course("web:beginner", "Web Development for Beginners", "", MATERIALS)
+    assert lms.get_or_create_course("web:beginner", "Web Development for Beginners", "", MATERIALS) == first
+    assert lms.get_or_create_course("web:intermediate", "Web Development for Intermediates", "",
+                                    MATERIALS) != first
+
+    lms = make_lms('sqlite')
+    assert lms.get_or_create_course("web:beginner", "Web Development for Beginners", "", MATERIALS) == first
+
+
+def test_failed_initialization_is_not_cached(make_lms, tmp_path):
+    (tmp_path / "lms_data.db").write_bytes(b"not a database" * 100)
+    with pytest.raises(Exception):
+        make_lms('sqlite')
+    assert LMSManager._instance is None
+
+    (tmp_path / "lms_data.db").unlink()
+    lms = LMSManager()
+    assert lms.backend is not None
+    course_id = lms.create_course("Python Basics", "", MATERIALS)
+    assert lms.enroll_user("u1", course_id)
+    assert [course['course_id'] for course in lms.get_user_courses("u1")] == [course_id]
+
+
+@pytest.mark.parametrize('backend', sorted(DEFAULT_DATA_FILES))
+def test_same_recommendation_reuses_the_catalog_course(make_lms, backend):
+    # The LMS record for a catalog course, created the way the chat front
+    # ends and the Rasa action create it
+    course = get_catalog().find("web", "beginner")
+    key, name, description = lms_course_fields(course, "beginner")
+    materials = thaw(course['materials'])
+
+    lms = make_lms(backend)
+    first = lms.get_or_create_course(key, name, description, materials)
+    assert lms.get_or_create_course(key, name, description, materials) == first
+    lms.flush()
+    lms = make_lms(backend)
+    assert lms.get_or_create_course(key, name, description, materials) == first
+    assert list(lms.backend.export_data()['courses']) == [first]
+
+
+@pytest.mark.parametrize('backend', sorted(DEFAULT_DATA_FILES))
+def test_write_behind_setting_on_each_backend(make_lms, backend):
+    if backend != 'json':
+        with pytest.raises(ValueError, match="(?i)write-behind"):
+            make_lms(backend, LMS_WRITE_BEHIND="1")
+        assert LMSManager._instance is None
+        return
+    lms = make_lms(backend, LMS_WRITE_BEHIND="1", LMS_FLUSH_INTERVAL_MS="3600000")
+    assert lms.backend.write_behind
+    course_id = lms.create_course("Python Basics", "", MATERIALS)
+    lms.enroll_user("u1", course_id)
+    # Buffered until flushed, then visible to a new manager
+    lms.flush()
+    lms = make_lms(backend)
+    assert [course['course_id'] for course in lms.get_user_courses("u1")] == [course_id]
+
+
+@pytest.mark.parametrize('backend', sorted(DEFAULT_DATA_FILES))
+def test_roster_and_status_indexes_follow_progress(make_lms, backend):
+    lms = make_lms(backend)
+    course_id = lms.create_course("Python Basics", "", MATERIALS)
+    other_id = lms.create_course("Web Basics", "", MATERIALS)
+    lms.enroll_user("u1", course_id)
+    lms.enroll_user("u2", course_id)
+    lms.enroll_user("u2", other_id)
+
+    def indexes(lms):
+        return {
+            'roster': lms.get_course_roster(course_id),
+            'other_roster': lms.get_course_roster(other_id),
+            'enrolled': lms.get_users_by_status('enrolled'),
+            'in_progress': lms.get_users_by_status('in_progress', course_id),
+            'completed': lms.get_users_by_status('completed'),
+        }
+
+    assert indexes(lms) == {'roster': ["u1", "u2"], 'other_roster': ["u2"],
+                            'enrolled': ["u1", "u2"], 'in_progress': [], 'completed': []}
+
+    assert lms.complete_material("u1", course_id, MATERIALS[0]['url'])
+    assert indexes(lms) == {'roster': ["u1", "u2"], 'other_roster': ["u2"],
+                            'enrolled': ["u2"], 'in_progress': ["u1"], 'completed': []}
+    assert lms.get_completion_percentage("u1", course_id) == 50.0
+
+    assert lms.complete_material("u1", course_id, MATERIALS[1]['url'])
+    assert lms.complete_material("u2", other_id, MATERIALS[0]['url'])
+    expected = {'roster': ["u1", "u2"], 'other_roster': ["u2"],
+                'enrolled': ["u2"], 'in_progress': [], 'completed': ["u1"]}
+    assert indexes(lms) == expected
+    assert lms.get_users_by_status('in_progress') == ["u2"]
+    assert lms.get_users_by_status('enrolled', other_id) == []
+
+    # Rebuilt from the stored data on reload
+    lms.flush()
+    lms = make_lms(backend)
+    assert indexes(lms) == expected
+    assert lms.get_users_by_status('in_progress') == ["u2"]
+    assert lms.get_completion_percentage("u1", course_id) == 100.0
+
+
+def test_close_is_idempotent_and_the_store_can_be_reopened(make_lms):
+    lms = make_lms('json', LMS_WRITE_BEHIND="1", LMS_FLUSH_INTERVAL_MS="3600000")
+    course_id = lms.create_course("Python Basics", "", MATERIALS)
+    lms.enroll_user("u1", course_id)
+    lms.close()
+    lms.close()
+    assert lms.backend._flusher is None
+
+    reopened = LMSManager()
+    assert reopened is not lms
+    assert LMSManager() is reopened
+    # Buffered writes were flushed by the first close
+    assert [course['course_id'] for course in reopened.get_user_courses("u1")] == [course_id]
+    assert reopened.enroll_user("u2", course_id)
+    assert reopened.get_course_roster(course_id) == ["u1", "u2"]
+
+
+class FailingConnection:
+    # SQLite connection whose nth enrollment insert fails, mid-transaction
+    def __init__(self, conn, fail_at=2):
+        self.conn = conn
+        self.inserts = 0
+        self.fail_at = fail_at
+
+    def execute(self, sql, *args):
+        if sql.startswith("INSERT OR IGNORE INTO enrollments") or sql.startswith("INSERT OR IGNORE INTO courses"):
+            self.inserts += 1
+            if self.inserts == self.fail_at:
+                raise sqlite3.OperationalError("disk I/O error")
+        return self.conn.execute(sql, *args)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+
+class FailingJournal:
+    # Journal file whose next append fails half-way
+    def __init__(self, journal):
+        self.journal = journal
+        self.failed = False
+
+    def write(self, text):
+        if self.failed:
+            return self.journal.write(text)
+        self.failed = True
+        self.journal.write(text[:len(text) // 2])
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self.journal, name)
+
+
+@contextmanager
+def failing_writes(lms, backend, monkeypatch, succeeding_files=0):
+    # The next persistence step of the backend fails part-way. File-based
+    # engines fail one write, after succeeding_files files were written: a
+    # sharded batch writes one file per shard it touches.
+    with monkeypatch.context() as patch:
+        if backend == 'sqlite':
+            patch.setattr(lms.backend, 'conn', FailingConnection(lms.backend.conn))
+        elif backend == 'journal':
+            # Not restored on exit: the backend replaces a failed journal handle
+            lms.backend._journal = FailingJournal(lms.backend._journal)
+        else:
+            write_text_atomic = storage.write_text_atomic
+            writes = []
+
+            def failing_write(path, text):
+                writes.append(path)
+                if len(writes) == succeeding_files + 1:
+                    raise OSError(errno.ENOSPC, "No space left on device")
+                write_text_atomic(path, text)
+            patch.setattr(storage, 'write_text_atomic', failing_write)
+        yield
+
+
+def stored_state(lms):
+    data = lms.backend.export_data()
+    return ({course_id: course['name'] for course_id, course in data['courses'].items()},
+            {user_id: list(user['enrolled_courses']) for user_id, user in data['users'].items()})
+
+
+@pytest.mark.parametrize('backend', sorted(DEFAULT_DATA_FILES))
+def test_failed_batches_leave_nothing_behind(make_lms, monkeypatch, backend):
+    lms = make_lms(backend)
+    [first] = lms.create_courses([{'name': "Python Basics", 'materials': MATERIALS}])
+    lms.enroll_user("u0", first)
+    before = stored_state(lms)
+
+    new_courses = [{'name': "Web Basics", 'materials': MATERIALS},
+                   {'name': "Data Basics", 'materials': MATERIALS, 'catalog_key': "data:beginner"}]
+    with failing_writes(lms, backend, monkeypatch):
+        assert lms.create_courses(new_courses) is None
+    assert stored_state(lms) == before
+
+    second, third = lms.create_courses(new_courses)
+    assert int(third) == int(second) + 1 == int(first) + 2
+    pairs = [(f"u{index}", first) for index in range(6)] + [("u1", second), ("u9", "missing")]
+    with failing_writes(lms, backend, monkeypatch, succeeding_files=1 if backend == 'sharded' else 0):
+        assert lms.enroll_many(pairs) is None
+    assert stored_state(lms)[1] == before[1]
+    assert lms.get_course_roster(first) == ["u0"]
+
+    # Retried in full, with the unknown course skipped
+    assert lms.enroll_many(pairs) == {'enrolled': 6, 'existing': 1, 'skipped': 1}
+    lms.flush()
+    expected = stored_state(lms)
+    lms = make_lms(backend)
+    assert stored_state(lms) == expected
+    assert lms.get_course_roster(first) == [f"u{index}" for index in range(6)]
+    assert lms.get_users_by_status('enrolled', second) == ["u1"]
+    assert lms.analytics.snapshot() == aggregate_data(lms.backend.export_data())
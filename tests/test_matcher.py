@@ -0,0 +1,37 @@
+import pytest
+
+from utils.matcher import match_keywords
+
+
+@pytest.mark.parametrize('text, experience, topic', [
+    ("courses for beginners in web development", 'beginner', 'web'),
+    ("beginner in websites", 'beginner', 'web'),
+    ("I build webpages, intermediate level", 'intermediate', 'web'),
+    ("Intermediates in data science", 'intermediate', 'data'),
+    ("aspiring data scientists, advanced", 'advanced', 'data'),
+    ("Advanced mobile apps", 'advanced', 'mobile'),
+    ("beginner in Artificial Intelligence", 'beginner', 'ai'),
+])
+def test_inflected_forms_match(text, experience, topic):
+    matched = match_keywords(text)
+    assert matched.first('experience') == experience
+    assert matched.first('topic') == topic
+
+
+@pytest.mark.parametrize('text', [
+    "he said this again",
+    "his email is on the way",
+    "I am happy to apply",
+])
+def test_keywords_inside_other_words_do_not_match(text):
+    # Substring matching saw "ai" in "said", "hi" in "this" and "his", and
+    # "app" in "happy" and "apply"
+    matched = match_keywords(text)
+    assert not matched.has('feedback')
+    assert not matched.has('topic')
+
+
+def test_phrases_and_priorities():
+    assert match_keywords("Show my courses").first('command') == 'show_courses'
+    assert match_keywords("thanks, see you").labels('feedback') == ['thanks', 'bye']
+    assert match_keywords("a web app").labels('topic') == ['web', 'mobile']
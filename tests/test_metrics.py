@@ -0,0 +1,54 @@
+import pytest
+
+from utils.metrics import LATENCY_BUCKETS, LatencyHistogram, Metrics, timed
+
+
+def test_empty_histogram():
+    snapshot = LatencyHistogram().snapshot()
+    assert snapshot == {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0,
+                        'p99_ms': 0.0, 'max_ms': 0.0}
+
+
+def test_single_sample_percentiles_equal_the_sample():
+    histogram = LatencyHistogram()
+    histogram.observe(0.00058)
+    snapshot = histogram.snapshot()
+    for key in ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+        assert snapshot[key] == pytest.approx(0.58)
+
+
+def test_percentiles_are_bucket_bounds_capped_at_the_maximum():
+    histogram = LatencyHistogram()
+    for _ in range(90):
+        histogram.observe(0.00004)  # first bucket, <= 50us
+    for _ in range(10):
+        histogram.observe(0.003)  # bucket bounded by 3.2ms
+    assert histogram.percentile(0.50) == LATENCY_BUCKETS[0]
+    assert histogram.percentile(0.90) == LATENCY_BUCKETS[0]
+    assert histogram.percentile(0.95) == pytest.approx(0.003)
+    snapshot = histogram.snapshot()
+    assert snapshot['p50_ms'] <= snapshot['p95_ms'] <= snapshot['p99_ms'] <= snapshot['max_ms']
+
+
+def test_samples_beyond_the_last_bucket_report_the_maximum():
+    histogram = LatencyHistogram()
+    histogram.observe(LATENCY_BUCKETS[-1] * 3)
+    assert histogram.percentile(0.99) == LATENCY_BUCKETS[-1] * 3
+
+
+def test_timed_records_latency_and_errors():
+    registry = Metrics()
+
+    @timed('op', registry)
+    def operation(fail):
+        if fail:
+            raise RuntimeError("boom")
+        return "ok"
+
+    assert operation(False) == "ok"
+    with pytest.raises(RuntimeError):
+        operation(True)
+    registry.record_error('op')
+    snapshot = registry.snapshot()['op']
+    assert snapshot['count'] == 2
+    assert snapshot['errors'] == 2
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+import yaml
+
+from utils.nlu_fast_path import COURSE_REQUEST_INTENT, fast_parse
+
+NLU_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "nlu.yml")
+
+
+def spans(text, parsed):
+    return [(entity['entity'], entity['value'], text[entity['start']:entity['end']])
+            for entity in parsed['entities']]
+
+
+@pytest.mark.parametrize('text, intent', [
+    ("hi", 'greet'),
+    ("Hello there", 'greet'),
+    ("bye", 'goodbye'),
+    ("show my courses", 'show_enrollments'),
+])
+def test_feedback_and_commands(text, intent):
+    assert fast_parse(text) == {'intent': intent, 'entities': []}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("I'm a beginner in web development", [('experience_level', 'beginner', "beginner"),
+                                           ('coding_interest', 'web development', "web development")]),
+    ("advanced Data Science please", [('experience_level', 'advanced', "advanced"),
+                                      ('coding_interest', 'data science', "Data Science")]),
+    ("I want to learn about AI", [('coding_interest', 'artificial intelligence', "AI")]),
+    ("beginners websites", [('experience_level', 'beginner', "beginners"),
+                            ('coding_interest', 'web development', "websites")]),
+])
+def test_course_requests_and_entity_spans(text, expected):
+    parsed = fast_parse(text)
+    assert parsed['intent'] == COURSE_REQUEST_INTENT
+    assert spans(text, parsed) == expected
+
+
+@pytest.mark.parametrize('text', [
+    # A level without a topic is left to the model
+    "beginner", "I am an intermediate",
+    # Known words the matched keywords do not explain
+    "hi development", "show my courses please science",
+    # Ambiguous, unknown or too long
+    "web app", "hi thanks", "python programming courses", "",
+    "I would like to learn web development and I am a beginner in it please",
+])
+def test_messages_left_to_the_model(text):
+    assert fast_parse(text) is None
+
+
+def test_agrees_with_the_training_data():
+    with open(NLU_FILE) as f:
+        nlu = yaml.safe_load(f)['nlu']
+    taken = 0
+    for block in nlu:
+        for line in block['examples'].splitlines():
+            example = line.strip()[2:]
+            parsed = fast_parse(example) if example else None
+            if parsed is not None:
+                assert parsed['intent'] == block['intent'], example
+                taken += 1
+    assert taken >= 10
+
+
+def test_component_classifies_only_explained_messages():
+    pytest.importorskip("rasa")
+    from rasa.shared.nlu.constants import ENTITIES, INTENT, TEXT
+    from rasa.shared.nlu.training_data.message import Message
+
+    from components.keyword_fast_path import FAST_PATH, KeywordFastPathClassifier
+
+    classifier = KeywordFastPathClassifier({"enabled": True})
+    request = Message(data={TEXT: "beginner in web development"})
+    bare_level = Message(data={TEXT: "beginner"})
+    classifier.process([request, bare_level])
+
+    assert request.get(INTENT) == {'name': COURSE_REQUEST_INTENT, 'confidence': 1.0}
+    assert request.get(FAST_PATH)
+    assert [(entity['entity'], entity['start'], entity['end'], entity['extractor'])
+            for entity in request.get(ENTITIES)] == [
+        ('experience_level', 0, 8, "KeywordFastPathClassifier"),
+        ('coding_interest', 12, 27, "KeywordFastPathClassifier")]
+    assert bare_level.get(INTENT) is None
+    assert not bare_level.get(FAST_PATH)
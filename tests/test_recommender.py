@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.catalog import Catalog  # noqa: E402
+from utils.recommender import Recommender, get_recommender  # noqa: E402
+
+
+def course(course_id, topic, description, materials):
+    return {'id': course_id, 'name': f"{topic.title()} Course", 'topic': topic, 'level': "beginner",
+            'description': description,
+            'materials': [{'name': name, 'url': f"https://example.com/{course_id}/{index}"}
+                          for index, name in enumerate(materials)]}
+
+
+@pytest.fixture
+def catalog():
+    return Catalog([
+        course("web", "web", "Build pages with HTML and CSS", ["HTML basics", "CSS layout"]),
+        course("data", "data", "Analyse data with Python and pandas", ["Pandas tutorial", "Statistics"]),
+        course("mobile", "mobile", "Build Android and iOS apps", ["Kotlin", "Swift"]),
+    ])
+
+
+def ranked_ids(recommender, query, history=()):
+    return [entry['id'] for entry, _ in recommender.recommend(query, history, k=3)]
+
+
+def test_query_terms_decide_the_ranking(catalog):
+    recommender = Recommender(catalog)
+    assert ranked_ids(recommender, "I want to learn pandas")[0] == "data"
+    assert recommender.infer_topic("android please") == "mobile"
+
+
+def test_enrollment_history_changes_the_ranking(catalog):
+    recommender = Recommender(catalog)
+    # "build" appears in the web and mobile courses alike
+    query = "build something"
+    assert set(ranked_ids(recommender, query)[:2]) == {"web", "mobile"}
+    assert ranked_ids(recommender, query, ["Swift and Kotlin for Android"])[0] == "mobile"
+    assert ranked_ids(recommender, query, ["HTML and CSS pages"])[0] == "web"
+
+
+def test_excluded_courses_are_not_recommended(catalog):
+    recommender = Recommender(catalog)
+    ranked = recommender.recommend("pandas", k=3, exclude_ids=["data"])
+    assert "data" not in [entry['id'] for entry, _ in ranked]
+
+
+def test_empty_query_and_empty_catalog(catalog):
+    recommender = Recommender(catalog)
+    # Nothing scores above zero without a known term
+    assert recommender.recommend("") == []
+    assert recommender.recommend("zzz qqq") == []
+    assert recommender.infer_topic("") is None
+
+    empty = Recommender(Catalog([]))
+    assert empty.recommend("pandas", ["HTML"]) == []
+    assert empty.infer_topic("pandas") is None
+
+
+def test_recommender_is_rebuilt_per_catalog(catalog):
+    first = get_recommender(catalog)
+    assert get_recommender(catalog) is first
+    assert get_recommender(Catalog(catalog.courses)) is not first
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from utils.chat import cached_query_signature
+from utils.response_cache import ResponseCache
+
+
+class CountingRecommender:
+    # Topic inference as done by utils.recommender, counted
+    def __init__(self):
+        self.calls = 0
+
+    def infer_topic(self, prompt):
+        self.calls += 1
+        return 'data' if "python" in prompt.lower() else None
+
+
+def test_reordered_and_recased_phrasings_share_a_signature():
+    cache = ResponseCache()
+    recommender = CountingRecommender()
+    first = cached_query_signature(cache, "beginner python", recommender)
+    assert (first.experience, first.topic, first.inferred) == ('beginner', 'data', True)
+    for phrasing in ("Python, BEGINNER!", "  python   beginner  ", "Beginner Python?"):
+        assert cached_query_signature(cache, phrasing, recommender) is first
+    assert recommender.calls == 1
+    assert cache.stats()['hits'] == 3 and len(cache) == 1
+
+
+def test_word_order_inside_a_keyword_phrase_still_matters():
+    cache = ResponseCache()
+    recommender = CountingRecommender()
+    assert cached_query_signature(cache, "show my courses", recommender).command == 'show_courses'
+    assert cached_query_signature(cache, "courses my show", recommender).command is None
+    assert cached_query_signature(cache, "Show my courses", recommender).command == 'show_courses'
+    assert len(cache) == 2
+
+
+def test_entries_expire_are_evicted_and_follow_the_catalog():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.bind("catalog v1")
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)  # evicts 'b', the least recently used
+    assert cache.get('b') is None and cache.get('c') == 3
+    now[0] = 11
+    assert cache.get('a') is None
+    cache.put('d', 4)
+    cache.bind("catalog v2")
+    assert cache.get('d') is None
+    stats = cache.stats()
+    assert (stats['evictions'], stats['expirations'], stats['invalidations']) == (1, 1, 1)
+
+
+def test_learner_specific_replies_are_never_cached(make_lms):
+    pytest.importorskip("numpy")
+    from chat_server import ChatService, ChatSession
+    from utils.async_lms import get_async_lms
+
+    make_lms('json')
+    cache = ResponseCache()
+    service = ChatService(lms=get_async_lms(), cache=cache)
+    learners = [ChatSession("a" * 32), ChatSession("b" * 32)]
+
+    async def main():
+        await service.reply(learners[0], "I am an advanced learner in data science")
+        replies = []
+        for session in learners:
+            replies.append([await service.reply(session, prompt) for prompt in (
+                "I am a beginner in web development", "show my courses")])
+        return replies
+
+    try:
+        replies = asyncio.run(main())
+    finally:
+        service.lms.shutdown()
+
+    # The same course is offered to both learners...
+    assert replies[0][0][1] == replies[1][0][1]
+    # ...but each enrollment list is the learner's own
+    first, second = replies[0][1][0], replies[1][1][0]
+    assert "Data Science" in first and "Data Science" not in second
+    # Each learner was enrolled, not served a cached reply
+    assert len(service.lms.lms.get_user_courses("a" * 32)) == 2
+    assert len(service.lms.lms.get_user_courses("b" * 32)) == 1
+    # Only learner-independent parts are cached
+    assert {key[0] for key in cache._entries} <= {'query', 'course', 'lms_course'}
+    assert not any(session.session_id in repr(entry) for session in learners
+                   for entry in cache._entries.items())
@@ -0,0 +1,68 @@
+import pytest
+
+from utils.catalog import get_catalog
+from utils.chat import lms_course_fields
+from utils.lms_utils import DEFAULT_DATA_FILES
+from utils.roster_import import RosterError, import_roster, main, read_rows, roster_records
+
+ROSTER = """Spring cohort,,,
+Exported 2024-03-01,,,
+Student ID,Email,Interest,Level
+1001,a@example.com,web development,beginner
+1002,b@example.com,Data Science,Beginners
+1003,c@example.com,web development,beginner
+1001,a@example.com,web development,beginner
+1004,d@example.com,underwater basket weaving,beginner
+,e@example.com,web development,beginner
+1005,f@example.com,,
+"""
+
+
+@pytest.fixture
+def roster(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text(ROSTER, encoding='utf-8')
+    return str(path)
+
+
+def catalog_course_id(lms, topic, level):
+    key, _, _ = lms_course_fields(get_catalog().find(topic, level), level)
+    return lms.backend.find_course(key)
+
+
+@pytest.mark.parametrize('backend', sorted(DEFAULT_DATA_FILES))
+def test_roster_import_on_each_backend(make_lms, roster, backend):
+    lms = make_lms(backend)
+    records = roster_records(read_rows(roster))
+    totals = import_roster(lms, records, chunk_size=2)
+    # Rows without a user id, or with no catalog course, are skipped
+    assert totals == {'rows': 7, 'enrolled': 3, 'existing': 1, 'skipped': 3}
+
+    lms = make_lms(backend)
+    web = catalog_course_id(lms, "web", "beginner")
+    data = catalog_course_id(lms, "data", "beginner")
+    assert lms.get_course_roster(web) == ["1001", "1003"]
+    assert lms.get_course_roster(data) == ["1002"]
+    assert lms.get_analytics()['totals']['enrollments'] == 3
+
+    # Importing again changes nothing
+    totals = import_roster(lms, roster_records(read_rows(roster)), chunk_size=100)
+    assert (totals['enrolled'], totals['existing']) == (0, 4)
+
+
+def test_roster_import_into_a_given_course(make_lms, roster):
+    lms = make_lms('sqlite')
+    course_id = lms.create_course("Orientation", "", [])
+    totals = import_roster(lms, roster_records(read_rows(roster)), course_id=course_id)
+    assert totals == {'rows': 7, 'enrolled': 5, 'existing': 1, 'skipped': 1}
+    assert lms.get_course_roster(course_id) == ["1001", "1002", "1003", "1004", "1005"]
+
+
+def test_roster_without_a_user_column_is_rejected(tmp_path, make_lms):
+    path = tmp_path / "roster.csv"
+    path.write_text("name,level\nAda,beginner\n", encoding='utf-8')
+    with pytest.raises(RosterError):
+        list(roster_records(read_rows(str(path))))
+    make_lms('json')
+    with pytest.raises(SystemExit):
+        main([str(path), "--interest", "web development", "--experience", "beginner"])
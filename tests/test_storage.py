@@ -0,0 +1,361 @@
+"""Crash recovery and maintenance of the LMS storage backends.
+
+    python -m pytest tests
+
+Each test works on copies in a temporary directory, so the shipped
+lms_data.json is never modified.
+"""
+import copy
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from utils import storage
+from utils.compact_model import CompactUsers
+from utils.lms_utils import DEFAULT_DATA_FILES
+from utils.storage import JSONFileBackend, JournaledJSONBackend, create_backend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHIPPED_DATA = os.path.join(ROOT, "lms_data.json")
+
+
+def progress(enrolled_at="2024-01-01T00:00:00"):
+    return {'status': 'enrolled', 'completed_materials': [], 'enrolled_at': enrolled_at}
+
+
+def open_journal(path):
+    # No compactor thread, so the tests decide when compaction happens
+    backend = JournaledJSONBackend(str(path), compact_interval=0)
+    backend.load()
+    return backend
+
+
+def crash(backend):
+    # Drops the backend the way a killed process would: the journal stays
+    # as written and no final compaction runs
+    backend._journal.close()
+    backend._journal = None
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return tmp_path / "lms_data.json"
+
+
+def test_journal_replays_mutations_after_crash(journal_path):
+    backend = open_journal(journal_path)
+    course_id = backend.add_course({'name': "Python Basics", 'materials': []})
+    backend.add_enrollment("u1", course_id, progress())
+    crash(backend)
+
+    backend = open_journal(journal_path)
+    assert backend.get_course(course_id)['name'] == "Python Basics"
+    assert backend.get_user("u1")['enrolled_courses'] == [course_id]
+    backend.close()
+
+
+def test_journal_drops_torn_final_line(journal_path):
+    backend = open_journal(journal_path)
+    course_id = backend.add_course({'name': "Python Basics", 'materials': []})
+    backend.add_enrollment("u1", course_id, progress())
+    crash(backend)
+    with open(f"{journal_path}.journal", 'a') as f:
+        f.write('{"op": "enroll", "user_id": "u2", "cour')
+
+    backend = open_journal(journal_path)
+    assert backend.get_user("u1") is not None
+    assert backend.get_user("u2") is None
+    # New entries start on a fresh line instead of after the fragment
+    backend.add_enrollment("u3", course_id, progress())
+    crash(backend)
+
+    backend = open_journal(journal_path)
+    assert backend.get_user("u3")['enrolled_courses'] == [course_id]
+    backend.close()
+
+
+def test_interrupted_compaction_is_recovered(journal_path):
+    # A crash between rotating the journal and writing the snapshot leaves
+    # the rotated journal behind; its entries precede the current journal's
+    backend = open_journal(journal_path)
+    course_id = backend.add_course({'name': "Python Basics", 'materials': []})
+    backend.add_enrollment("u1", course_id, progress())
+    crash(backend)
+    os.replace(f"{journal_path}.journal", f"{journal_path}.journal.old")
+    with open(f"{journal_path}.journal", 'w') as f:
+        f.write(json.dumps({'op': 'enroll', 'user_id': "u2", 'course_id': course_id,
+                            'progress': progress()}) + "\n")
+
+    backend = open_journal(journal_path)
+    assert not os.path.exists(f"{journal_path}.journal.old")
+    assert sorted(backend.export_data()['users']) == ["u1", "u2"]
+    crash(backend)
+
+    # The recovered entries were folded into the snapshot itself
+    with open(journal_path) as f:
+        assert "u1" in json.load(f)['users']
+
+
+def shipped_data():
+    with open(SHIPPED_DATA) as f:
+        return json.load(f)
+
+
+def reopen(name, directory):
+    options = {'compact_interval': 0} if name == 'journal' else {}
+    backend = create_backend(name, os.path.join(directory, DEFAULT_DATA_FILES[name]), **options)
+    existed = backend.load()
+    return backend, existed
+
+
+def open_backend(name, directory, data):
+    # A backend of the given engine holding data, seeded the way
+    # LMSManager seeds a fresh store from lms_data.json
+    json_path = os.path.join(directory, "lms_data.json")
+    with open(json_path, 'w') as f:
+        json.dump(data, f)
+    backend, existed = reopen(name, directory)
+    if not existed and name in ('sqlite', 'sharded'):
+        backend.import_file(json_path)
+    return backend
+
+
+def test_new_course_on_shipped_data_gets_a_fresh_id(tmp_path):
+    # The shipped file predates the meta block holding the id counter
+    data = shipped_data()
+    assert 'meta' not in data
+    backend = open_backend('json', tmp_path, data)
+    course_id = backend.add_course({'name': "Python Basics", 'materials': []})
+    assert course_id not in data['courses']
+    assert int(course_id) == max(int(existing) for existing in data['courses']) + 1
+
+
+def concurrent_writer(path, worker, users, start):
+    # One action-server worker: creates its own course, the shared catalog
+    # course and enrolls its users
+    backend = JSONFileBackend(path, multiprocess=True)
+    backend.load()
+    start.wait()
+    own = backend.add_course({'name': f"Worker {worker}", 'materials': []})
+    shared = backend.find_course("web:beginner") or backend.add_course(
+        {'name': "Web Development for Beginners", 'catalog_key': "web:beginner", 'materials': []})
+    for index in range(users):
+        backend.add_enrollment(f"w{worker}-u{index}", own if index % 2 else shared, progress())
+
+
+def test_multiprocess_writers_do_not_lose_updates(tmp_path):
+    path = str(tmp_path / "lms_data.json")
+    JSONFileBackend(path, multiprocess=True).load()
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    workers = [context.Process(target=concurrent_writer, args=(path, worker, 60, start))
+               for worker in range(4)]
+    for process in workers:
+        process.start()
+    start.set()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    backend = JSONFileBackend(path)
+    backend.load()
+    data = backend.export_data()
+    assert len(data['users']) == 240
+    # One course per worker and one shared catalog course, each with its own id
+    assert sorted(course['name'] for course in data['courses'].values()) == sorted(
+        ["Web Development for Beginners"] + [f"Worker {worker}" for worker in range(4)])
+    assert data['meta']['next_course_id'] == max(int(course_id) for course_id in data['courses']) + 1
+    enrolled = {course_id for user in data['users'].values() for course_id in user['enrolled_courses']}
+    assert enrolled == set(data['courses'])
+
+
+def test_sqlite_existing_catalog_key_does_not_use_up_an_id(tmp_path):
+    backend = create_backend('sqlite', str(tmp_path / "lms_data.db"))
+    backend.load()
+    [first] = backend.add_courses([{'name': "Web", 'catalog_key': "web:beginner"}])
+    ids = backend.add_courses([{'name': "Web", 'catalog_key': "web:beginner"},
+                               {'name': "Data", 'catalog_key': "data:beginner"},
+                               {'name': "Data", 'catalog_key': "data:beginner"}])
+    assert ids == [first, str(int(first) + 1), str(int(first) + 1)]
+    backend.close()
+
+
+def garbage_data():
+    # The shipped data has nine duplicate courses; add one more duplicate,
+    # an orphan and an enrollment in a course that does not exist
+    data = shipped_data()
+    first = min(data['courses'], key=int)
+    data['courses']["900"] = copy.deepcopy(data['courses'][first])
+    data['courses']["901"] = {'name': "Unused", 'description': "", 'materials': []}
+    data['users']["gc-user"] = {
+        'enrolled_courses': ["900", first, "999"],
+        'progress': {"900": progress("2024-03-01T00:00:00"), first: progress("2024-02-01T00:00:00"),
+                     "999": progress()},
+    }
+    return data, first
+
+
+@pytest.mark.parametrize('name', sorted(DEFAULT_DATA_FILES))
+def test_collect_garbage(tmp_path, name):
+    data, first = garbage_data()
+    backend = open_backend(name, tmp_path, data)
+    expected = {'courses_before': 18, 'courses_after': 7, 'duplicates_merged': 10,
+                'orphans_removed': 1, 'references_rewritten': 10, 'dangling_references_dropped': 1}
+
+    report = backend.collect_garbage(dry_run=True)
+    assert {key: report[key] for key in expected} == expected
+    assert len(backend.export_data()['courses']) == 18
+
+    report = backend.collect_garbage()
+    assert {key: report[key] for key in expected} == expected
+    assert report['reclaimed_bytes'] > 0
+    assert backend.collect_garbage(dry_run=True)['courses_after'] == 7
+    backend.close()
+
+    backend, _ = reopen(name, tmp_path)
+    collected = backend.export_data()
+    assert len(collected['courses']) == 7
+    # Both copies merged into the oldest one, keeping the earliest enrollment
+    assert collected['users']["gc-user"]['enrolled_courses'] == [first]
+    assert collected['users']["gc-user"]['progress'][first]['enrolled_at'] == "2024-02-01T00:00:00"
+    backend.close()
+
+
+def slow_snapshots(monkeypatch, thread_name, delay=0.3):
+    # Delays snapshot writes made from one thread, so another writer can
+    # overtake it
+    write_text_atomic = storage.write_text_atomic
+
+    def delayed(path, text):
+        if threading.current_thread().name == thread_name:
+            time.sleep(delay)
+        write_text_atomic(path, text)
+    monkeypatch.setattr(storage, 'write_text_atomic', delayed)
+
+
+def add_duplicates(backend):
+    first = backend.add_course({'name': "Python Basics", 'materials': []})
+    second = backend.add_course({'name': "Python Basics", 'materials': []})
+    backend.add_enrollment("u1", first, progress())
+    backend.add_enrollment("u2", second, progress())
+    return first
+
+
+def test_compaction_does_not_undo_collect_garbage(journal_path, monkeypatch):
+    backend = open_journal(journal_path)
+    first = add_duplicates(backend)
+    slow_snapshots(monkeypatch, "compactor")
+    compactor = threading.Thread(target=backend.compact, name="compactor")
+    compactor.start()
+    time.sleep(0.1)
+    backend.add_enrollment("u3", first, progress())
+    backend.collect_garbage()
+    compactor.join()
+    crash(backend)
+
+    backend = open_journal(journal_path)
+    data = backend.export_data()
+    assert list(data['courses']) == [first]
+    assert sorted(data['users']) == ["u1", "u2", "u3"]
+    backend.close()
+
+
+def test_flush_does_not_undo_collect_garbage(tmp_path, monkeypatch):
+    path = str(tmp_path / "lms_data.json")
+    backend = JSONFileBackend(path, write_behind=True, flush_interval=3600)
+    backend.load()
+    first = add_duplicates(backend)
+    slow_snapshots(monkeypatch, "flusher")
+    flusher = threading.Thread(target=backend.flush, name="flusher")
+    flusher.start()
+    time.sleep(0.1)
+    backend.collect_garbage()
+    flusher.join()
+    backend.close()
+
+    with open(path) as f:
+        assert list(json.load(f)['courses']) == [first]
+
+
+def sharded_with_progress(directory):
+    backend, _ = reopen('sharded', directory)
+    course_id = backend.add_course({'name': "Python Basics", 'materials': []})
+    for index in range(20):
+        backend.add_enrollment(f"u{index}", course_id, progress())
+    backend.complete_material("u0", course_id, "https://example.com/intro", 'completed')
+    return backend, course_id
+
+
+def test_sharded_indexes_are_reused_across_a_clean_restart(tmp_path, monkeypatch):
+    backend, course_id = sharded_with_progress(tmp_path)
+    roster = backend.get_roster(course_id)
+    members = backend.get_status_members('enrolled')
+    assert len(roster) == 20 and len(members) == 19
+    backend.close()
+
+    backend, _ = reopen('sharded', tmp_path)
+    # Loaded from index.json, which is removed until the next clean close
+    assert not (tmp_path / "lms_data" / "index.json").exists()
+
+    def no_scan():
+        raise AssertionError("roster query scanned the shards")
+    monkeypatch.setattr(backend, 'iter_shards', no_scan)
+    assert backend.get_roster(course_id) == roster
+    assert backend.get_status_members('enrolled') == members
+    assert backend.get_status_members('completed') == {("u0", course_id)}
+    # Kept current by later mutations
+    backend.add_enrollment("late", course_id, progress())
+    backend.complete_material("u1", course_id, "https://example.com/intro", 'in_progress')
+    assert "late" in backend.get_roster(course_id)
+    assert ("u1", course_id) in backend.get_status_members('in_progress')
+    assert ("u1", course_id) not in backend.get_status_members('enrolled')
+
+
+def test_sharded_indexes_are_rebuilt_after_a_crash(tmp_path):
+    backend, course_id = sharded_with_progress(tmp_path)
+    backend.get_roster(course_id)
+    backend.close()
+    backend, _ = reopen('sharded', tmp_path)
+    backend.add_enrollment("late", course_id, progress())
+    # Not closed: the index written by the earlier close must not be trusted
+    backend, _ = reopen('sharded', tmp_path)
+    assert "late" in backend.get_roster(course_id)
+    assert len(backend.get_status_members('enrolled')) == 20
+
+
+def test_compact_users_round_trip():
+    data = shipped_data()
+    users = copy.deepcopy(data['users'])
+    compact = CompactUsers.from_data(copy.deepcopy(users), data['courses'])
+    assert len(compact) == len(users)
+    assert compact.to_data() == users
+    for user_id, user in users.items():
+        assert compact[user_id] == user
+
+
+def test_compact_memory_backend_matches_plain(tmp_path):
+    exports = []
+    rosters = []
+    for compact_memory in (False, True):
+        directory = tmp_path / str(compact_memory)
+        directory.mkdir()
+        path = str(directory / "lms_data.json")
+        with open(path, 'w') as f:
+            json.dump(shipped_data(), f)
+        backend = JSONFileBackend(path, compact_memory=compact_memory)
+        backend.load()
+        course_id = min(backend.data['courses'], key=int)
+        material = backend.get_course(course_id)['materials'][0]['url']
+        backend.add_enrollment("new-user", course_id, progress())
+        backend.complete_material("new-user", course_id, material, 'in_progress')
+        backend = JSONFileBackend(path, compact_memory=compact_memory)
+        backend.load()
+        exports.append(json.loads(json.dumps(backend.export_data(), default=storage.to_json)))
+        rosters.append((backend.get_roster(course_id), backend.get_status_members('in_progress')))
+    assert exports[0]['users'] == exports[1]['users']
+    assert rosters[0] == rosters[1]
+    assert ("new-user", course_id) in rosters[1][1]
@@ -0,0 +1,112 @@
+import contextvars
+import cProfile
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.tracing import NOOP_SPAN, JSONLExporter, Tracer, summarize
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+
+def by_name(spans):
+    return {record['name']: record for record in spans}
+
+
+def enroll(tracer):
+    with tracer.span("lms.enroll"):
+        pass
+
+
+def test_nested_spans_record_their_parent():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+    with tracer.span("turn", user="u1"):
+        with tracer.span("nlu"):
+            with tracer.span("lms.get"):
+                pass
+        # Spans opened on a pool thread in a copy of the context nest too
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(1) as pool:
+            pool.submit(context.run, enroll, tracer).result()
+    with tracer.span("next turn"):
+        pass
+
+    spans = by_name(exporter.spans)
+    turn = spans["turn"]
+    assert turn['parent_id'] is None and turn['attributes'] == {'user': "u1"}
+    assert spans["nlu"]['parent_id'] == turn['span_id']
+    assert spans["lms.get"]['parent_id'] == spans["nlu"]['span_id']
+    assert spans["lms.enroll"]['parent_id'] == turn['span_id']
+    assert spans["lms.enroll"]['thread'] != turn['thread']
+    assert {record['trace_id'] for name, record in spans.items() if name != "next turn"} == {turn['trace_id']}
+    assert spans["next turn"]['parent_id'] is None
+    assert spans["next turn"]['trace_id'] != turn['trace_id']
+
+
+def test_errors_are_recorded_on_the_span():
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+    with pytest.raises(KeyError):
+        with tracer.span("turn"):
+            raise KeyError("missing")
+    assert exporter.spans[0]['attributes'] == {'error': "KeyError"}
+
+
+def test_summary_subtracts_child_time(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(JSONLExporter(str(path)))
+    with tracer.span("turn"):
+        with tracer.span("lms.get"):
+            pass
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['name'] for record in records] == ["lms.get", "turn"]
+    rows = {row['name']: row for row in summarize(str(path))}
+    turn = rows["turn"]
+    assert turn['count'] == 1
+    assert turn['self_ms'] == pytest.approx(turn['total_ms'] - rows["lms.get"]['total_ms'])
+
+
+def test_sample_rate_zero_never_traces_or_profiles(monkeypatch, tmp_path):
+    def no_profiler():
+        raise AssertionError("profiled an unsampled turn")
+    monkeypatch.setattr(cProfile, 'Profile', no_profiler)
+
+    exporter = ListExporter()
+    unsampled = Tracer(exporter, sample_rate=0.0, profile_rate=1.0, profile_dir=str(tmp_path))
+    # Nothing is traced, so nothing is profiled either
+    for _ in range(50):
+        with unsampled.span("turn"):
+            assert unsampled.span("nested") is NOOP_SPAN
+    unprofiled = Tracer(exporter, profile_rate=0.0, profile_dir=str(tmp_path))
+    for _ in range(50):
+        with unprofiled.span("turn"):
+            pass
+    assert len(exporter.spans) == 50
+    assert not any('profile' in record['attributes'] for record in exporter.spans)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sampled_root_spans_are_profiled(tmp_path):
+    exporter = ListExporter()
+    tracer = Tracer(exporter, profile_rate=1.0, profile_dir=str(tmp_path))
+    with tracer.span("turn"):
+        with tracer.span("nested"):
+            sum(range(1000))
+    spans = by_name(exporter.spans)
+    assert 'profile' not in spans["nested"]['attributes']
+    profile = spans["turn"]['attributes']['profile']
+    assert profile == str(tmp_path / f"turn-{spans['turn']['trace_id']}.prof")
+    assert os.path.exists(profile)
+
+
+def test_tracing_is_off_without_an_exporter_or_profiling():
+    assert Tracer().span("turn") is NOOP_SPAN
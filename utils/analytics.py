@@ -0,0 +1,289 @@
+"""Enrollment analytics kept up to date as the LMS changes.
+
+    python -m utils.analytics rebuild lms_data.json
+    python -m utils.analytics show lms_data.json
+
+LMSManager updates the counters on every course creation, enrollment and
+status change, so questions such as users per topic, enrollments per day or
+a course's completion rate are dictionary lookups instead of scans over
+every user. Counters are persisted next to the data file
+(<data file>.analytics.json) by a background thread every few seconds and
+when the manager is flushed or closed. Use `rebuild` once for data written before
+analytics existed, or after editing the data by hand.
+"""
+import argparse
+import copy
+import json
+import os
+import threading
+
+from utils.lms_utils import DEFAULT_DATA_FILES, STATUS_COMPLETED
+from utils.matcher import match_keywords
+from utils.metrics import get_logger
+from utils.storage import FileLock, create_backend, write_json_atomic
+
+logger = get_logger("analytics")
+
+ANALYTICS_VERSION = 1
+OTHER_TOPIC = 'other'
+
+
+def analytics_path(data_file):
+    return f"{data_file}.analytics.json"
+
+
+def course_topic(course):
+    # Topic label of an LMS course, from the same keywords the chat uses;
+    # the name decides, the description only when the name matches nothing
+    for text in (course.get('name'), course.get('description')):
+        topic = match_keywords(text or '').first('topic')
+        if topic:
+            return topic
+    return OTHER_TOPIC
+
+
+def empty_aggregates():
+    return {
+        'version': ANALYTICS_VERSION,
+        'totals': {'courses': 0, 'users': 0, 'enrollments': 0, 'completed': 0},
+        'users_per_topic': {},
+        'enrollments_per_day': {},
+        # course_id -> {'enrollments': n, 'completed': n}
+        'courses': {},
+        # course_id -> topic label; labels, not counters
+        'course_topics': {},
+    }
+
+
+def _add(target, delta):
+    # Adds nested counters of delta into target
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            _add(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def aggregate_data(data):
+    # Aggregates of a whole dataset in the lms_data.json layout
+    aggregates = empty_aggregates()
+    totals = aggregates['totals']
+    topics = aggregates['course_topics']
+    for course_id, course in data['courses'].items():
+        topics[course_id] = course_topic(course)
+    totals['courses'] = len(data['courses'])
+    totals['users'] = len(data['users'])
+    for user in data['users'].values():
+        user_topics = set()
+        for course_id in user.get('enrolled_courses', []):
+            progress = user.get('progress', {}).get(course_id, {})
+            course_counts = aggregates['courses'].setdefault(course_id, {'enrollments': 0, 'completed': 0})
+            course_counts['enrollments'] += 1
+            totals['enrollments'] += 1
+            if progress.get('status') == STATUS_COMPLETED:
+                course_counts['completed'] += 1
+                totals['completed'] += 1
+            day = (progress.get('enrolled_at') or '')[:10]
+            if day:
+                _add(aggregates['enrollments_per_day'], {day: 1})
+            user_topics.add(topics.get(course_id, OTHER_TOPIC))
+        _add(aggregates['users_per_topic'], {topic: 1 for topic in user_topics})
+    return aggregates
+
+
+# Counters are kept twice: the view answering queries, and the delta not
+# yet written. Saving merges the delta into the file under a lock, so
+# several worker processes can share one analytics file without losing
+# each other's updates.
+class Analytics:
+    def __init__(self, path, course_lookup=None, save_interval=5.0):
+        self.path = path
+        self.course_lookup = course_lookup
+        self.save_interval = save_interval
+        self.aggregates = empty_aggregates()
+        self._delta = {}
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{path}.lock")
+        self._saver = None
+        self._stopped = threading.Event()
+
+    def load(self):
+        # False when there is no usable analytics file yet
+        stored = self._read()
+        if stored is None:
+            return False
+        with self._lock:
+            self.aggregates = stored
+            _add(self.aggregates, self._delta)
+            self.aggregates['course_topics'].update(self._topics)
+        return True
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return stored if stored.get('version') == ANALYTICS_VERSION else None
+
+    # Updates, called by LMSManager after each successful mutation
+    def _bump(self, keys, amount=1):
+        for target in (self.aggregates, self._delta):
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = target.get(keys[-1], 0) + amount
+
+    def _topic(self, course_id):
+        topic = self.aggregates['course_topics'].get(course_id)
+        if topic is None:
+            # Created by another worker since our last save
+            course = self.course_lookup(course_id) if self.course_lookup else None
+            topic = course_topic(course) if course else OTHER_TOPIC
+            self.aggregates['course_topics'][course_id] = self._topics[course_id] = topic
+        return topic
+
+    def record_course(self, course_id, course):
+        with self._lock:
+            if course_id in self.aggregates['course_topics']:
+                return
+            topic = course_topic(course)
+            self.aggregates['course_topics'][course_id] = self._topics[course_id] = topic
+            self._bump(('totals', 'courses'))
+
+    def record_enrollment(self, course_id, enrolled_at, previous_course_ids, new_user):
+        with self._lock:
+            topic = self._topic(course_id)
+            self._bump(('totals', 'enrollments'))
+            self._bump(('courses', course_id, 'enrollments'))
+            self._bump(('courses', course_id, 'completed'), 0)
+            if enrolled_at:
+                self._bump(('enrollments_per_day', enrolled_at[:10]))
+            if new_user:
+                self._bump(('totals', 'users'))
+            if all(self._topic(previous) != topic for previous in previous_course_ids):
+                self._bump(('users_per_topic', topic))
+
+    def record_status(self, course_id, old_status, new_status):
+        if new_status == old_status or STATUS_COMPLETED not in (old_status, new_status):
+            return
+        amount = 1 if new_status == STATUS_COMPLETED else -1
+        with self._lock:
+            self._bump(('totals', 'completed'), amount)
+            self._bump(('courses', course_id, 'completed'), amount)
+
+    # Queries: constant-time lookups on the in-memory view
+    def totals(self):
+        return dict(self.aggregates['totals'])
+
+    def users_in_topic(self, topic):
+        return self.aggregates['users_per_topic'].get(topic, 0)
+
+    def enrollments_on(self, day):
+        return self.aggregates['enrollments_per_day'].get(day, 0)
+
+    def completion_rate(self, course_id):
+        counts = self.aggregates['courses'].get(course_id)
+        if not counts or not counts.get('enrollments'):
+            return 0.0
+        return counts.get('completed', 0) / counts['enrollments']
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self.aggregates)
+
+    # Persistence. Updates only touch memory; a background thread saves the
+    # pending counts every save_interval seconds, so the file lock and write
+    # stay off the request path
+    def start(self):
+        if self._saver is not None or not self.save_interval:
+            return
+        self._stopped.clear()
+        self._saver = threading.Thread(target=self._save_loop, name="lms-analytics", daemon=True)
+        self._saver.start()
+
+    def _save_loop(self):
+        while not self._stopped.wait(self.save_interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.error("Error saving analytics: %s", e)
+
+    def close(self):
+        self._stopped.set()
+        if self._saver is not None:
+            self._saver.join()
+            self._saver = None
+        self.save()
+
+    def save(self):
+        with self._lock:
+            delta, topics = self._delta, self._topics
+            self._delta, self._topics = {}, {}
+        if not delta and not topics and os.path.exists(self.path):
+            return
+        try:
+            with self._file_lock:
+                stored = self._read() or empty_aggregates()
+                _add(stored, delta)
+                stored['course_topics'].update(topics)
+                write_json_atomic(self.path, stored, indent=2)
+        except Exception:
+            # Keep the counts for the next attempt
+            with self._lock:
+                _add(self._delta, delta)
+                self._topics.update(topics)
+            raise
+        with self._lock:
+            # Picks up other workers' counts along with any updates made
+            # while the file was being written
+            _add(stored, self._delta)
+            stored['course_topics'].update(self._topics)
+            self.aggregates = stored
+
+    def rebuild(self, data):
+        # Recomputes every aggregate from the full dataset and replaces the
+        # file; counts still pending in this process are superseded
+        aggregates = aggregate_data(data)
+        with self._file_lock:
+            write_json_atomic(self.path, aggregates, indent=2)
+        with self._lock:
+            self._delta, self._topics = {}, {}
+            self.aggregates = copy.deepcopy(aggregates)
+        return aggregates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('rebuild', 'show'))
+    parser.add_argument('path', nargs='?', help="data file (default: the backend's default file)")
+    parser.add_argument('--backend', default=os.environ.get("LMS_STORAGE_BACKEND", "json").lower(),
+                        choices=sorted(DEFAULT_DATA_FILES))
+    args = parser.parse_args(argv)
+    path = args.path or os.environ.get("LMS_DATA_FILE") or DEFAULT_DATA_FILES[args.backend]
+
+    analytics = Analytics(analytics_path(path))
+    if args.command == 'rebuild':
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+        options = {'compact_interval': 0} if args.backend == 'journal' else {}
+        backend = create_backend(args.backend, path, **options)
+        backend.load()
+        try:
+            aggregates = analytics.rebuild(backend.export_data())
+        finally:
+            backend.close()
+        print(f"Rebuilt {analytics.path}")
+    else:
+        if not analytics.load():
+            parser.error(f"No analytics at {analytics.path}; run 'rebuild' first")
+        aggregates = analytics.aggregates
+
+    for key, value in aggregates['totals'].items():
+        print(f"{key:<12} {value}")
+    print("users per topic: " + ", ".join(f"{topic} {count}" for topic, count
+                                          in sorted(aggregates['users_per_topic'].items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.lms_utils import LMSManager
+
+# Threads doing LMS disk I/O on behalf of the action server's event loop
+DEFAULT_IO_THREADS = int(os.environ.get("LMS_IO_THREADS", "4"))
+
+
+# Awaitable facade over the LMSManager singleton for async Rasa actions.
+# Blocking storage calls run on a bounded thread pool so a slow save never
+# stalls other conversations on the event loop; writers are serialized with
+# an asyncio lock so they queue on the loop instead of occupying pool threads.
+class AsyncLMSManager:
+    def __init__(self, lms=None, max_workers=DEFAULT_IO_THREADS):
+        self.lms = lms or LMSManager()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="lms-io")
+        self._write_lock = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so LMS spans nest under the
+        # action's trace span
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args))
+
+    async def _write(self, func, *args):
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            return await self._run(func, *args)
+
+    # Reads
+    async def get_course(self, course_id):
+        return await self._run(self.lms.get_course, course_id)
+
+    async def get_user_courses(self, user_id):
+        return await self._run(self.lms.get_user_courses, user_id)
+
+    async def get_course_roster(self, course_id):
+        return await self._run(self.lms.get_course_roster, course_id)
+
+    async def get_completion_percentage(self, user_id, course_id):
+        return await self._run(self.lms.get_completion_percentage, user_id, course_id)
+
+    async def get_users_by_status(self, status, course_id=None):
+        return await self._run(self.lms.get_users_by_status, status, course_id)
+
+    # Writes
+    async def create_course(self, course_name, description, materials):
+        return await self._write(self.lms.create_course, course_name, description, materials)
+
+    async def get_or_create_course(self, key, course_name, description, materials):
+        return await self._write(self.lms.get_or_create_course, key, course_name, description, materials)
+
+    async def enroll_user(self, user_id, course_id):
+        return await self._write(self.lms.enroll_user, user_id, course_id)
+
+    async def complete_material(self, user_id, course_id, material_url):
+        return await self._write(self.lms.complete_material, user_id, course_id, material_url)
+
+    async def create_courses(self, courses):
+        return await self._write(self.lms.create_courses, courses)
+
+    async def enroll_many(self, enrollments):
+        return await self._write(self.lms.enroll_many, enrollments)
+
+    async def flush(self):
+        return await self._write(self.lms.flush)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_async_lms = None
+
+
+def get_async_lms():
+    # One facade, and so one thread pool, shared by every action in the process
+    global _async_lms
+    if _async_lms is None:
+        _async_lms = AsyncLMSManager()
+    return _async_lms
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from utils.metrics import get_logger
+
+logger = get_logger("catalog")
+
+# The catalog ships next to the code rather than in the working directory
+DEFAULT_CATALOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "course_catalog.json")
+
+
+def _freeze(value):
+    # Read-only views so cached catalog entries cannot be mutated by callers
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    # Plain dict/list copy of a catalog value, e.g. for storing in lms_data.json
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+# Immutable, indexed snapshot of course_catalog.json. `version` changes
+# whenever the file is reloaded, so caches derived from a catalog can key on it.
+class Catalog:
+    def __init__(self, courses, version=None):
+        self.version = version
+        self.courses = tuple(_freeze(course) for course in courses)
+        by_id = {}
+        by_topic = {}
+        by_level = {}
+        by_topic_level = {}
+        by_url = {}
+        for course in self.courses:
+            by_id[course['id']] = course
+            by_topic.setdefault(course['topic'], []).append(course)
+            by_level.setdefault(course['level'], []).append(course)
+            by_topic_level.setdefault((course['topic'], course['level']), course)
+            for material in course['materials']:
+                by_url.setdefault(material['url'], []).append(course)
+        self.by_id = MappingProxyType(by_id)
+        self.by_topic = MappingProxyType({key: tuple(value) for key, value in by_topic.items()})
+        self.by_level = MappingProxyType({key: tuple(value) for key, value in by_level.items()})
+        self.by_topic_level = MappingProxyType(by_topic_level)
+        self.by_url = MappingProxyType({key: tuple(value) for key, value in by_url.items()})
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        stat = os.stat(path)
+        return cls(data['courses'], version=(stat.st_mtime_ns, stat.st_size))
+
+    def get(self, course_id):
+        return self.by_id.get(course_id)
+
+    def find(self, topic, level=None):
+        # Course for a topic at the requested level, falling back to the
+        # first course listed for the topic
+        course = self.by_topic_level.get((topic, level))
+        if course is None:
+            courses = self.by_topic.get(topic)
+            course = courses[0] if courses else None
+        return course
+
+    def courses_with_material(self, url):
+        return self.by_url.get(url, ())
+
+
+# Process-wide cache of the parsed catalog. The file's mtime is checked at
+# most once per check_interval seconds and the catalog is re-parsed only when
+# it changed; a broken edit keeps the previous catalog in service.
+class CatalogLoader:
+    def __init__(self, path=None, check_interval=1.0):
+        self.path = path or os.environ.get("COURSE_CATALOG_FILE", DEFAULT_CATALOG_FILE)
+        self.check_interval = check_interval
+        self._catalog = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._catalog is not None and now - self._checked_at < self.check_interval:
+            return self._catalog
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                if self._catalog is None:
+                    raise
+                logger.error("Cannot stat course catalog %s: %s", self.path, e)
+                return self._catalog
+            if mtime != self._mtime:
+                try:
+                    self._catalog = Catalog.from_file(self.path)
+                    self._mtime = mtime
+                    logger.info("Loaded %d catalog courses from %s",
+                                len(self._catalog.courses), self.path)
+                except (OSError, ValueError, KeyError) as e:
+                    if self._catalog is None:
+                        raise
+                    logger.error("Keeping previous course catalog, reload failed: %s", e)
+            return self._catalog
+
+
+_default_loader = CatalogLoader()
+
+
+def get_catalog():
+    # Module-level cache used by the action server
+    return _default_loader.get()
@@ -0,0 +1,121 @@
+import random
+from collections import namedtuple
+
+from utils.lms_utils import catalog_key
+from utils.matcher import KEYWORDS, match_keywords
+from utils.response_cache import normalize_query
+
+# Conversation logic shared by the Streamlit app and the HTTP chat server:
+# canned replies, input validation and topic resolution. Rendering stays with
+# each front end.
+
+# Add feedback responses
+FEEDBACK_RESPONSES = {
+    "thanks": [
+        "You're always welcome! 😊 Feel free to reach out anytime if you need help!",
+        "Glad I could assist! 🌟 Keep exploring and learning more courses!",
+        "You're welcome! 🎉 Don't hesitate to ask if you need anything else!"
+    ],
+    "good": [
+        "Thank you for the kind words! 🌟 Anything else you'd like to explore?",
+        "I'm glad to hear that! 🎉 Let me know if there's more you'd like to learn!",
+        "It's great to hear that! 😊 Feel free to ask about more topics anytime!"
+    ],
+    "bye": [
+        "Goodbye for now! 👋 Come back anytime to continue your learning journey!",
+        "See you soon! 🌟 Your enrolled courses will be waiting when you return!",
+        "Have a fantastic day! 😊 Keep up with your newfound knowledge!"
+    ],
+    "hello": [
+        "Hello! 👋 Ready to dive into new learning adventures?",
+        "Welcome! 🌟 What would you like to learn today? I'm here to help!",
+        "Hi there! 😊 Let me know how I can help you find the perfect course!"
+    ]
+}
+
+NO_COURSES_MESSAGE = "You're not enrolled in any courses yet. Would you like some recommendations?"
+SHOW_COURSES_HINT = "Type 'show my courses' anytime to see your enrolled courses!"
+
+
+# Everything a reply depends on apart from the learner: the feedback,
+# command and experience labels detected in a message and its resolved
+# topic; `inferred` is set when the topic came from the recommendation
+# engine rather than a topic keyword
+QuerySignature = namedtuple('QuerySignature', 'feedback command experience topic inferred')
+
+
+def query_signature(prompt, recommender, matched=None):
+    if matched is None:
+        matched = match_keywords(prompt)
+    topic = resolve_topic(matched, prompt, recommender)
+    return QuerySignature(
+        feedback=matched.first("feedback"),
+        command=matched.first("command"),
+        experience=matched.first("experience"),
+        topic=topic,
+        inferred=topic is not None and not matched.has("topic"),
+    )
+
+
+def cached_query_signature(cache, prompt, recommender):
+    # Signature of a message, computed once per phrasing. Keyed by the
+    # keyword labels found and the bag of words, so "Web beginner" and
+    # "beginner web" share an entry while "show my courses" and "courses my
+    # show" (no command phrase) do not; topic inference only sees the bag
+    # of words. The keyword scan is cheap, inference is what is saved.
+    matched = match_keywords(prompt)
+    labels = tuple((category, tuple(matched.labels(category))) for category in KEYWORDS)
+    return cache.get_or_compute(('query', labels, normalize_query(prompt)),
+                                lambda: query_signature(prompt, recommender, matched))
+
+
+def get_feedback_response(feedback):
+    if feedback:
+        return random.choice(FEEDBACK_RESPONSES[feedback])
+    return None
+
+
+def resolve_topic(matched, prompt, recommender):
+    # Highest-priority topic match; interests without a topic keyword
+    # (e.g. "python" or "android") are resolved by the recommendation engine
+    topic = matched.first("topic")
+    if topic is None and matched.has("experience"):
+        topic = recommender.infer_topic(prompt)
+    return topic
+
+
+def check_input_requirements(experience, topic):
+    has_experience = experience is not None
+    has_topic = topic is not None
+
+    if not has_experience and not has_topic:
+        return "Could you please mention both your experience level (beginner, intermediate, or advanced) and your area of interest? For example: 'I'm a beginner interested in web development.'"
+    elif not has_experience:
+        return "Please let me know your experience level (beginner, intermediate, or advanced). For example: 'I'm a beginner.'"
+    elif not has_topic:
+        return "Can you specify what you'd like to learn (web development, data science, mobile apps, or artificial intelligence)?"
+    return None
+
+
+def lms_course_fields(course, experience):
+    # Catalog key, name and description of the LMS record for a catalog
+    # course, named the way the Rasa action names it so both front ends
+    # enroll learners in the same canonical course. Levels the catalog does
+    # not offer fall back to the catalog course's own level.
+    level = experience if experience in ('beginner', 'intermediate') else course['level']
+    interest = course['interest']
+    return (
+        catalog_key(interest, level),
+        f"{interest.title()} for {level.title()}s",
+        f"A curated learning path for {level}s in {interest}",
+    )
+
+
+def format_enrollments(courses):
+    # Plain-text list of LMSManager.get_user_courses() results
+    if not courses:
+        return NO_COURSES_MESSAGE
+    response = "Here are your enrolled courses:\n\n"
+    for course in courses:
+        response += f"📚 {course['name']}\nStatus: {course['status']}\nEnrolled: {(course['enrolled_at'] or '')[:10]}\n\n"
+    return response.rstrip()
@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import IntEnum
+
+# Compact in-memory model of the 'users' section of lms_data.json, used by
+# the JSON backends with LMS_COMPACT_MEMORY=1. A learner's enrollments are a
+# tuple of slotted Progress records instead of nested dicts: statuses are
+# enum singletons, numeric course ids are ints, timestamps are integer
+# microseconds and completed materials are a bitset over the course's
+# material list. Records are converted back to the JSON layout at the
+# boundary (reads, saves and exports), so the file format is unchanged;
+# only the order of completed_materials is normalized to the course's
+# material order.
+
+
+class Status(IntEnum):
+    ENROLLED = 0
+    IN_PROGRESS = 1
+    COMPLETED = 2
+
+
+STATUS_BY_NAME = {'enrolled': Status.ENROLLED, 'in_progress': Status.IN_PROGRESS,
+                  'completed': Status.COMPLETED}
+STATUS_NAMES = {status: name for name, status in STATUS_BY_NAME.items()}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Progress keys held in dedicated slots; anything else goes to `extra`
+_MODELED_KEYS = frozenset(('status', 'enrolled_at', 'completed_materials'))
+# Key in `extra` for completed URLs that are not (or no longer) course materials
+_UNMAPPED = 'completed_materials'
+
+
+def pack_course_id(course_id):
+    # "42" -> 42; non-canonical or non-numeric ids stay strings
+    if course_id.isdigit() and str(int(course_id)) == course_id:
+        return int(course_id)
+    return course_id
+
+
+def pack_timestamp(value):
+    # Naive ISO timestamps as microseconds since 1970-01-01; anything that
+    # would not format back to the identical string is kept as is
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is not None:
+        return value
+    packed = (parsed - _EPOCH) // _MICROSECOND
+    return packed if unpack_timestamp(packed) == value else value
+
+
+def unpack_timestamp(value):
+    if isinstance(value, int):
+        return (_EPOCH + value * _MICROSECOND).isoformat()
+    return value
+
+
+@dataclass
+class Progress:
+    __slots__ = ('course_id', 'status', 'enrolled_at', 'completed', 'extra')
+    course_id: object
+    status: object
+    enrolled_at: object
+    completed: int
+    extra: object
+
+
+class CompactUsers:
+    # Dict-like stand-in for data['users']. Lookups return freshly built
+    # dicts in the JSON layout, so callers must not expect to mutate the
+    # store through them; mutations go through apply().
+    def __init__(self, courses):
+        self.courses = courses
+        self._users = {}
+        # course id -> {material url: bit}, built on first use per course
+        self._material_bits = {}
+
+    @classmethod
+    def from_data(cls, users, courses):
+        # Converts a JSON users section, emptying it as it goes so the dict
+        # and compact copies of a user do not coexist for the whole dataset
+        compact = cls(courses)
+        while users:
+            user_id, user = users.popitem()
+            compact.set_user(user_id, user)
+        return compact
+
+    def _bits(self, course_id):
+        bits = self._material_bits.get(course_id)
+        if bits is None:
+            course = self.courses.get(course_id)
+            materials = course.get('materials', ()) if course else ()
+            bits = {}
+            for material in materials:
+                bits.setdefault(material['url'], len(bits))
+            self._material_bits[course_id] = bits
+        return bits
+
+    def _pack_progress(self, course_id, progress):
+        bits = self._bits(course_id)
+        completed = 0
+        unmapped = []
+        for url in progress.get('completed_materials', ()):
+            bit = bits.get(url)
+            if bit is None:
+                unmapped.append(url)
+            else:
+                completed |= 1 << bit
+        extra = {key: value for key, value in progress.items() if key not in _MODELED_KEYS}
+        if unmapped:
+            extra[_UNMAPPED] = unmapped
+        status = progress.get('status')
+        return Progress(
+            course_id=pack_course_id(course_id),
+            status=STATUS_BY_NAME.get(status, status),
+            enrolled_at=pack_timestamp(progress.get('enrolled_at')),
+            completed=completed,
+            extra=extra or None,
+        )
+
+    def _unpack_progress(self, record):
+        course_id = str(record.course_id)
+        completed = []
+        if record.completed:
+            for url, bit in self._bits(course_id).items():
+                if record.completed >> bit & 1:
+                    completed.append(url)
+        progress = {
+            'status': STATUS_NAMES.get(record.status, record.status),
+            'completed_materials': completed,
+            'enrolled_at': unpack_timestamp(record.enrolled_at),
+        }
+        if record.extra:
+            for key, value in record.extra.items():
+                if key == _UNMAPPED:
+                    completed.extend(value)
+                else:
+                    progress[key] = value
+        return progress
+
+    def set_user(self, user_id, user):
+        progress = user.get('progress', {})
+        # enrolled_courses and progress are kept in step by apply_entry, so
+        # the enrollment order is all that needs storing
+        self._users[user_id] = tuple(
+            self._pack_progress(course_id, progress.get(course_id, {}))
+            for course_id in user.get('enrolled_courses', ())
+        )
+
+    def _unpack_user(self, records):
+        return {
+            'enrolled_courses': [str(record.course_id) for record in records],
+            'progress': {str(record.course_id): self._unpack_progress(record) for record in records},
+        }
+
+    def get(self, user_id, default=None):
+        records = self._users.get(user_id)
+        return default if records is None else self._unpack_user(records)
+
+    def __getitem__(self, user_id):
+        return self._unpack_user(self._users[user_id])
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def items(self):
+        for user_id, records in self._users.items():
+            yield user_id, self._unpack_user(records)
+
+    def iter_enrollments(self):
+        # (user_id, course_id, status name) for every enrollment, without
+        # building per-user dicts
+        for user_id, records in self._users.items():
+            for record in records:
+                yield user_id, str(record.course_id), STATUS_NAMES.get(record.status, record.status)
+
+    def to_data(self):
+        return {user_id: self._unpack_user(records) for user_id, records in self._users.items()}
+
+    def apply(self, entry):
+        # The user-level operations of storage.apply_entry, with the same
+        # idempotence
+        op = entry['op']
+        records = self._users.get(entry['user_id'], ())
+        course_id = pack_course_id(entry['course_id'])
+        if op == 'enroll':
+            if all(record.course_id != course_id for record in records):
+                self._users[entry['user_id']] = records + (
+                    self._pack_progress(entry['course_id'], entry['progress']),)
+        elif op == 'complete_material':
+            for record in records:
+                if record.course_id == course_id:
+                    break
+            else:
+                raise KeyError(entry['user_id'] if not records else entry['course_id'])
+            bit = self._bits(entry['course_id']).get(entry['material'])
+            if bit is not None:
+                record.completed |= 1 << bit
+            else:
+                extra = record.extra if record.extra is not None else {}
+                unmapped = extra.setdefault(_UNMAPPED, [])
+                if entry['material'] not in unmapped:
+                    unmapped.append(entry['material'])
+                record.extra = extra
+            record.status = STATUS_BY_NAME.get(entry['status'], entry['status'])
+        else:
+            raise ValueError(f"Unknown user operation: {op!r}")
@@ -0,0 +1,70 @@
+import threading
+
+# Pre-rendered response fragments for every catalog course. Course replies
+# are the same for every learner apart from the suggestions, so they are
+# rendered once per catalog version instead of being re-assembled (and sent
+# as several Streamlit elements) on every turn.
+
+
+class CourseFragments:
+    __slots__ = ('name', 'header', 'materials_markdown', 'body_markdown', 'learning_path_markdown',
+                 'materials_text', 'body_text')
+
+    def __init__(self, course, name=None):
+        # name: the LMS course the learner is enrolled in, when it differs
+        # from the catalog course's own name (see utils.chat.lms_course_fields)
+        self.name = name or course['name']
+        header = f"🎉 Welcome to {self.name}!"
+        # For AI-related topics, add a robotic emoji 🤖 to the response
+        if course['topic'] == "ai":
+            header = "🤖 " + header
+        self.header = header
+
+        # Markdown for the Streamlit app; hard line breaks keep each block in
+        # one element
+        bullets = "  \n".join(f"• [{material['name']}]({material['url']})" for material in course['materials'])
+        self.materials_markdown = f"📚 **Learning Materials:**\n\n{bullets}"
+        self.body_markdown = (f"{header}\n\n{self.materials_markdown}\n\n"
+                              f"📝 **Course Description:**\n\n{course['description']}")
+        steps = "\n".join(f"{i+1}. {step}" for i, step in enumerate(course['learning_path']))
+        self.learning_path_markdown = (f"💡 **Learning Path:**\n{steps}\n\n"
+                                       "Type 'show my courses' anytime to see your enrolled courses!")
+
+        # Plain text for the Rasa action and the HTTP chat server
+        self.materials_text = "".join(f"📚 {material['name']}\n{material['url']}\n\n"
+                                      for material in course['materials'])
+        text_bullets = "\n".join(f"• {material['name']}: {material['url']}" for material in course['materials'])
+        self.body_text = (f"{header}\n\n📚 Learning Materials:\n{text_bullets}\n\n"
+                          f"📝 Course Description:\n{course['description']}\n\n"
+                          f"💡 Learning Path:\n{steps}")
+
+
+class FragmentCache:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.by_id = {course['id']: CourseFragments(course) for course in catalog.courses}
+        self._courses = {course['id']: course for course in catalog.courses}
+        # (course_id, name) -> fragments headed with another course name
+        self._named = {}
+
+    def get(self, course_id, name=None):
+        fragments = self.by_id.get(course_id)
+        if fragments is None or name is None or name == fragments.name:
+            return fragments
+        named = self._named.get((course_id, name))
+        if named is None:
+            named = self._named.setdefault((course_id, name), CourseFragments(self._courses[course_id], name))
+        return named
+
+
+_fragments = None
+_fragments_lock = threading.Lock()
+
+
+def get_fragments(catalog):
+    # Re-rendered only when the catalog has been reloaded
+    global _fragments
+    with _fragments_lock:
+        if _fragments is None or _fragments.catalog is not catalog:
+            _fragments = FragmentCache(catalog)
+        return _fragments
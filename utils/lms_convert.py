@@ -0,0 +1,215 @@
+"""Streaming conversion between the monolithic lms_data.json and the sharded layout.
+
+    python -m utils.lms_convert import lms_data.json lms_data/
+    python -m utils.lms_convert export lms_data/ lms_data.json
+
+Both directions hold at most one user record (import) or one shard (export)
+in memory, so they work on files far larger than RAM.
+"""
+import argparse
+import json
+import os
+import sys
+
+from utils.storage import ShardedJSONBackend
+
+# Top-level objects of lms_data.json that are streamed member by member;
+# anything else (enrollments, meta) is small and decoded whole
+STREAMED_SECTIONS = ('users', 'courses')
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = ' \t\n\r'
+
+
+class _StreamReader:
+    # Minimal incremental JSON reader over a text file: only the structural
+    # tokens of the top two object levels are parsed by hand, every member
+    # value is decoded with json.JSONDecoder.raw_decode once fully buffered
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, found {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number or literal that stops at the buffer edge may continue
+            # in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        # Yields (key, value) pairs of an object, decoding values whole
+        for key in self.keys():
+            yield key, self.value()
+
+    def keys(self):
+        # Yields the keys of an object; the caller consumes each value
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+
+def iter_lms_json(path, chunk_size=CHUNK_SIZE):
+    # Yields (section, key, value) for every user and course in a monolithic
+    # lms_data.json, and (section, None, value) for the small sections
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f, chunk_size)
+        for section in reader.keys():
+            if section in STREAMED_SECTIONS:
+                for key, value in reader.members():
+                    yield section, key, value
+            else:
+                yield section, None, reader.value()
+
+
+def import_monolithic(source, backend, progress=None, chunk_size=CHUNK_SIZE):
+    # Streams lms_data.json into a sharded backend. Users are first spooled
+    # to one JSON-lines file per shard so each shard file is written once.
+    spool_dir = os.path.join(backend.data_dir, ".import")
+    os.makedirs(spool_dir, exist_ok=True)
+    spools = {}
+    courses = {}
+    meta = None
+    users = 0
+    try:
+        for section, key, value in iter_lms_json(source, chunk_size):
+            if section == 'users':
+                shard_key = backend.shard_key(key)
+                spool = spools.get(shard_key)
+                if spool is None:
+                    spool = spools[shard_key] = open(
+                        os.path.join(spool_dir, f"{shard_key}.jsonl"), 'w', encoding='utf-8')
+                spool.write(json.dumps([key, value], separators=(',', ':')) + "\n")
+                users += 1
+                if progress and users % 10000 == 0:
+                    progress(users)
+            elif section == 'courses':
+                courses[key] = value
+            elif section == 'meta':
+                meta = value
+        for spool in spools.values():
+            spool.close()
+        for shard_key in spools:
+            spool_path = os.path.join(spool_dir, f"{shard_key}.jsonl")
+            shard = backend.read_shard(shard_key)
+            with open(spool_path, 'r', encoding='utf-8') as spool:
+                for line in spool:
+                    user_id, user = json.loads(line)
+                    shard[user_id] = user
+            backend.write_shard(shard_key, shard)
+            os.remove(spool_path)
+        backend.import_courses(courses, meta)
+    finally:
+        for spool in spools.values():
+            spool.close()
+        for name in os.listdir(spool_dir):
+            os.remove(os.path.join(spool_dir, name))
+        os.rmdir(spool_dir)
+    if progress:
+        progress(users)
+    return users
+
+
+def export_monolithic(backend, target, progress=None):
+    # Writes the sharded data back out as one lms_data.json, one shard in
+    # memory at a time; the result is swapped in with an atomic rename
+    tmp_path = f"{target}.tmp"
+    users = 0
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write('{\n  "users": {')
+        first = True
+        for _, shard in backend.iter_shards():
+            for user_id, user in shard.items():
+                out.write(',' if not first else '')
+                out.write(f"\n    {json.dumps(user_id)}: ")
+                out.write(json.dumps(user, indent=2).replace("\n", "\n    "))
+                first = False
+                users += 1
+                if progress and users % 10000 == 0:
+                    progress(users)
+        out.write('\n  },\n  "courses": ')
+        out.write(json.dumps(backend.courses, indent=2).replace("\n", "\n  "))
+        out.write(',\n  "enrollments": {},\n  "meta": ')
+        out.write(json.dumps(backend.meta, indent=2).replace("\n", "\n  "))
+        out.write('\n}')
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, target)
+    if progress:
+        progress(users)
+    return users
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="lms_data.json -> sharded directory")
+    import_parser.add_argument('source')
+    import_parser.add_argument('target_dir')
+    export_parser = subparsers.add_parser('export', help="sharded directory -> lms_data.json")
+    export_parser.add_argument('source_dir')
+    export_parser.add_argument('target')
+    args = parser.parse_args(argv)
+
+    def report(count):
+        print(f"\r{count} users", end='', file=sys.stderr, flush=True)
+
+    if args.command == 'import':
+        backend = ShardedJSONBackend(args.target_dir)
+        backend.load()
+        count = import_monolithic(args.source, backend, progress=report)
+    else:
+        backend = ShardedJSONBackend(args.source_dir)
+        if not backend.load():
+            parser.error(f"{args.source_dir} is not a sharded LMS store")
+        count = export_monolithic(backend, args.target, progress=report)
+    print(f"\n{args.command}ed {count} users", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Garbage collection for the LMS store: orphaned and duplicate courses.
+
+    python -m utils.lms_gc lms_data.json --dry-run
+    python -m utils.lms_gc lms_data.db --backend sqlite
+    python -m utils.lms_gc lms_data --backend sharded
+
+Courses nobody is enrolled in are removed, courses with identical name and
+materials are merged into one canonical course (enrollments are rewritten
+to point at it), and enrollments that reference missing courses are
+dropped. Run the CLI only while no chatbot process is using the store;
+LMSManager.collect_garbage() does the same online.
+"""
+import argparse
+import json
+import os
+import sys
+
+from utils.lms_utils import STATUS_COMPLETED, STATUS_ENROLLED, STATUS_IN_PROGRESS
+
+_STATUS_RANK = {STATUS_ENROLLED: 0, STATUS_IN_PROGRESS: 1, STATUS_COMPLETED: 2}
+
+
+def _id_order(course_id):
+    # Oldest first: numeric ids by value, then any non-numeric ids
+    return (0, int(course_id), "") if course_id.isdigit() else (1, 0, course_id)
+
+
+class CollectionPlan:
+    def __init__(self, courses, references):
+        # courses: course_id -> course; references: iterable of course ids,
+        # one per enrollment
+        groups = {}
+        for course_id in sorted(courses, key=_id_order):
+            course = courses[course_id]
+            content = (course.get('name'), json.dumps(course.get('materials', []), sort_keys=True))
+            groups.setdefault(content, []).append(course_id)
+
+        # Within a group of identical courses the oldest course carrying a
+        # catalog key survives (the oldest overall if none does). Courses
+        # with a different catalog key stay separate so get_or_create_course
+        # keeps finding them.
+        self.remap = {}
+        for course_ids in groups.values():
+            survivors = {}
+            for course_id in course_ids:
+                key = courses[course_id].get('catalog_key')
+                if key is not None:
+                    survivors.setdefault(key, course_id)
+            default = min(survivors.values(), key=_id_order) if survivors else course_ids[0]
+            for course_id in course_ids:
+                key = courses[course_id].get('catalog_key')
+                canonical = survivors[key] if key is not None else default
+                if canonical != course_id:
+                    self.remap[course_id] = canonical
+
+        referenced = set()
+        self.dangling = set()
+        self.references = 0
+        for course_id in references:
+            self.references += 1
+            if course_id in courses:
+                referenced.add(self.remap.get(course_id, course_id))
+            else:
+                self.dangling.add(course_id)
+        self.orphans = {course_id for course_id in courses
+                        if course_id not in self.remap and course_id not in referenced}
+        self.removed = set(self.remap) | self.orphans
+
+    def canonical(self, course_id):
+        return self.remap.get(course_id, course_id)
+
+
+def merge_progress(kept, merged, course):
+    # Progress of one learner on two copies of the same course: completions
+    # are combined, the earliest enrollment date wins and the status is
+    # recomputed from the combined completions
+    completed = list(kept.get('completed_materials', []))
+    completed.extend(url for url in merged.get('completed_materials', []) if url not in completed)
+    enrolled = [value for value in (kept.get('enrolled_at'), merged.get('enrolled_at')) if value]
+    status = max((kept.get('status'), merged.get('status')), key=lambda value: _STATUS_RANK.get(value, -1))
+    urls = {material['url'] for material in (course or {}).get('materials', [])}
+    if urls and urls <= set(completed):
+        status = STATUS_COMPLETED
+    elif completed and _STATUS_RANK.get(status, -1) < _STATUS_RANK[STATUS_IN_PROGRESS]:
+        status = STATUS_IN_PROGRESS
+    return dict(kept, status=status, completed_materials=completed,
+                enrolled_at=min(enrolled) if enrolled else kept.get('enrolled_at'))
+
+
+def rewrite_user(user, plan, courses):
+    # New user record with enrollments pointing at canonical courses;
+    # returns (user, rewritten references, dropped references)
+    enrolled = []
+    progress = {}
+    rewritten = dropped = 0
+    for course_id in user.get('enrolled_courses', []):
+        if course_id in plan.dangling:
+            dropped += 1
+            continue
+        canonical = plan.canonical(course_id)
+        course_progress = user.get('progress', {}).get(course_id, {})
+        if canonical != course_id:
+            rewritten += 1
+        if canonical in progress:
+            progress[canonical] = merge_progress(progress[canonical], course_progress, courses.get(canonical))
+        else:
+            enrolled.append(canonical)
+            progress[canonical] = course_progress
+    return {'enrolled_courses': enrolled, 'progress': progress}, rewritten, dropped
+
+
+def collect_data(data):
+    # Garbage-collects a dataset in the lms_data.json layout without
+    # modifying it; returns (new data, report)
+    courses = data['courses']
+    plan = CollectionPlan(courses, (course_id for user in data['users'].values()
+                                    for course_id in user.get('enrolled_courses', [])))
+    new_data = dict(data)
+    new_data['courses'] = {course_id: course for course_id, course in courses.items()
+                           if course_id not in plan.removed}
+    new_data['users'] = {}
+    rewritten = dropped = 0
+    for user_id, user in data['users'].items():
+        new_user, user_rewritten, user_dropped = rewrite_user(user, plan, courses)
+        new_data['users'][user_id] = new_user
+        rewritten += user_rewritten
+        dropped += user_dropped
+    return new_data, plan_report(plan, len(courses), rewritten, dropped)
+
+
+def plan_report(plan, courses_before, rewritten, dropped):
+    return {
+        'courses_before': courses_before,
+        'courses_after': courses_before - len(plan.removed),
+        'duplicates_merged': len(plan.remap),
+        'orphans_removed': len(plan.orphans),
+        'references_rewritten': rewritten,
+        'dangling_references_dropped': dropped,
+    }
+
+
+def main(argv=None):
+    from utils.storage import create_backend
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="data file (json, journal, sqlite) or directory (sharded)")
+    parser.add_argument('--backend', default=os.environ.get("LMS_STORAGE_BACKEND", "json").lower(),
+                        choices=('json', 'journal', 'sqlite', 'sharded'))
+    parser.add_argument('--dry-run', action='store_true', help="report without changing the store")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist")
+    options = {'compact_interval': 0} if args.backend == 'journal' else {}
+    backend = create_backend(args.backend, args.path, **options)
+    backend.load()
+    try:
+        report = backend.collect_garbage(dry_run=args.dry_run)
+    finally:
+        backend.close()
+    for key, value in report.items():
+        print(f"{key:<30} {value}")
+    if args.dry_run:
+        print("Dry run: nothing was changed", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,121 +1,435 @@
-import json
-import os
-from datetime import datetime
-
-# Singleton class to manage Learning Management System data
-class LMSManager:
-    _instance = None
-    _data = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(LMSManager, cls).__new__(cls)
-            cls._instance._initialize()
-        return cls._instance
-
-    def _initialize(self):
-        self.data_file = os.path.join(os.getcwd(), "lms_data.json")
-        print(f"LMS data file path: {self.data_file}")  # Debug print
-        self.load_data()
-
-    def load_data(self):
-        # Loads LMS data from JSON file or creates new structure if not exists
-        try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    LMSManager._data = json.load(f)
-                    print(f"Loaded existing data: {LMSManager._data}")  # Debug print
-            else:
-                LMSManager._data = {
-                    'users': {},
-                    'courses': {},
-                    'enrollments': {}
-                }
-                self.save_data()
-                print("Created new data file")  # Debug print
-        except Exception as e:
-            print(f"Error loading data: {e}")  # Debug print
-            LMSManager._data = {
-                'users': {},
-                'courses': {},
-                'enrollments': {}
-            }
-
-    def save_data(self):
-        try:
-            with open(self.data_file, 'w') as f:
-                json.dump(LMSManager._data, f, indent=2)
-            print(f"Saved data: {LMSManager._data}")  # Debug print
-        except Exception as e:
-            print(f"Error saving data: {e}")  # Debug print
-
-    def create_course(self, course_name, description, materials):
-        # Creates a new course with unique ID and metadata
-        try:
-            course_id = str(len(LMSManager._data['courses']) + 1)
-            LMSManager._data['courses'][course_id] = {
-                'name': course_name,
-                'description': description,
-                'materials': materials,
-                'created_at': datetime.now().isoformat()
-            }
-            print(f"Created course {course_id}: {course_name}")  # Debug print
-            self.save_data()
-            return course_id
-        except Exception as e:
-            print(f"Error creating course: {e}")  # Debug print
-            return None
-
-    def enroll_user(self, user_id, course_id):
-        # Enrolls a user in a specific course and initializes progress tracking
-        try:
-            if course_id not in LMSManager._data['courses']:
-                print(f"Course {course_id} not found")  # Debug print
-                return False
-            
-            if user_id not in LMSManager._data['users']:
-                LMSManager._data['users'][user_id] = {
-                    'enrolled_courses': [],
-                    'progress': {}
-                }
-
-            if course_id not in LMSManager._data['users'][user_id]['enrolled_courses']:
-                LMSManager._data['users'][user_id]['enrolled_courses'].append(course_id)
-                LMSManager._data['users'][user_id]['progress'][course_id] = {
-                    'status': 'enrolled',
-                    'completed_materials': [],
-                    'enrolled_at': datetime.now().isoformat()
-                }
-                print(f"Enrolled user {user_id} in course {course_id}")  # Debug print
-                self.save_data()
-            return True
-        except Exception as e:
-            print(f"Error enrolling user: {e}")  # Debug print
-            return False
-
-    def get_user_courses(self, user_id):
-        # Retrieves all courses enrolled by a specific user with their progress
-        try:
-            print(f"Getting courses for user {user_id}")  # Debug print
-            print(f"Current data: {LMSManager._data}")  # Debug print
-            
-            if user_id not in LMSManager._data['users']:
-                print(f"User {user_id} not found in {LMSManager._data['users'].keys()}")  # Debug print
-                return []
-            
-            courses = []
-            for course_id in LMSManager._data['users'][user_id]['enrolled_courses']:
-                course = LMSManager._data['courses'].get(course_id, {})
-                progress = LMSManager._data['users'][user_id]['progress'].get(course_id, {})
-                courses.append({
-                    'course_id': course_id,
-                    'name': course.get('name'),
-                    'description': course.get('description'),
-                    'status': progress.get('status'),
-                    'enrolled_at': progress.get('enrolled_at')
-                })
-            print(f"Found courses: {courses}")  # Debug print
-            return courses
-        except Exception as e:
-            print(f"Error getting user courses: {e}")  # Debug print
-            return [] 
\ No newline at end of file
+import atexit
+import hashlib
+import os
+import signal
+from datetime import datetime
+
+from utils.metrics import get_logger, metrics, timed
+from utils.storage import create_backend, empty_data
+from utils.tracing import traced
+
+logger = get_logger("manager")
+
+# Default data file for each storage backend, relative to the working directory
+DEFAULT_DATA_FILES = {
+    'json': "lms_data.json",
+    'journal': "lms_data.json",
+    'sharded': "lms_data",
+    'sqlite': "lms_data.db",
+}
+
+def catalog_key(interest, experience):
+    # Content address of a canonical course: every request for the same
+    # interest and experience level resolves to the same course record
+    normalized = f"{interest.strip().lower()}|{experience.strip().lower()}"
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+def instrumented(operation):
+    # Latency metrics plus a trace span (lms.<operation>) for a manager method
+    def decorator(func):
+        return timed(operation)(traced(f"lms.{operation}")(func))
+    return decorator
+
+# Enrollment statuses, in the order an enrollment moves through them
+STATUS_ENROLLED = 'enrolled'
+STATUS_IN_PROGRESS = 'in_progress'
+STATUS_COMPLETED = 'completed'
+
+# Singleton class to manage Learning Management System data
+class LMSManager:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            # Cached only once initialized, so a store that fails to load is
+            # retried by the next call instead of leaving a manager without
+            # a backend behind
+            instance = super(LMSManager, cls).__new__(cls)
+            instance._initialize()
+            cls._instance = instance
+        return cls._instance
+
+    def _initialize(self):
+        # Storage engine is chosen through the environment so the Rasa action
+        # server and the Streamlit app can share one configuration
+        self.backend_name = os.environ.get("LMS_STORAGE_BACKEND", "json").lower()
+        self.data_file = os.environ.get(
+            "LMS_DATA_FILE",
+            os.path.join(os.getcwd(), DEFAULT_DATA_FILES.get(self.backend_name, "lms_data.json"))
+        )
+        # Set LMS_MULTIPROCESS=1 when several action-server workers share the data file
+        self.multiprocess = os.environ.get("LMS_MULTIPROCESS", "").lower() in ("1", "true", "yes")
+        logger.info("LMS data file path: %s (%s)", self.data_file, self.backend_name)
+        # Set LMS_WRITE_BEHIND=1 to take saves off the request path; pending
+        # changes are flushed every LMS_FLUSH_INTERVAL_MS or LMS_FLUSH_MAX_PENDING mutations
+        self.write_behind = os.environ.get("LMS_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+        options = {'multiprocess': self.multiprocess}
+        # Set LMS_COMPACT_MEMORY=1 to hold users in the slotted compact model
+        # (json and journal backends), for datasets with very many learners
+        if os.environ.get("LMS_COMPACT_MEMORY", "").lower() in ("1", "true", "yes"):
+            if self.backend_name in ('json', 'journal'):
+                options['compact_memory'] = True
+            else:
+                logger.warning("LMS_COMPACT_MEMORY only applies to the json and journal backends")
+        if self.write_behind:
+            # Backends without write-behind reject the flag with a ValueError
+            # naming the supported one; only json takes the flush settings
+            options['write_behind'] = True
+            if self.backend_name == 'json':
+                options.update(
+                    flush_interval=int(os.environ.get("LMS_FLUSH_INTERVAL_MS", "500")) / 1000,
+                    flush_max_pending=int(os.environ.get("LMS_FLUSH_MAX_PENDING", "100"))
+                )
+        self.backend = create_backend(self.backend_name, self.data_file, **options)
+        self.load_data()
+        self._load_analytics()
+        self._closed = False
+        self._register_shutdown_hooks()
+
+    def _load_analytics(self):
+        # Enrollment aggregates kept next to the data file; built once from
+        # the full dataset when the file does not exist yet
+        from utils.analytics import Analytics, analytics_path
+
+        self.analytics = Analytics(analytics_path(self.data_file), course_lookup=self.backend.get_course)
+        try:
+            if not self.analytics.load():
+                self.analytics.rebuild(self.backend.export_data())
+                logger.info("Built analytics at %s", self.analytics.path)
+        except Exception as e:
+            metrics.record_error('analytics')
+            logger.error("Error loading analytics: %s", e)
+        self.analytics.start()
+
+    def _register_shutdown_hooks(self):
+        # Buffered writes and journals are flushed on interpreter exit and on SIGTERM
+        atexit.register(self.close)
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+            if previous in (signal.SIG_DFL, None):
+                signal.signal(signal.SIGTERM, self._handle_sigterm)
+        except ValueError:
+            # signal handlers can only be installed from the main thread
+            pass
+
+    def _handle_sigterm(self, signum, frame):
+        # The handler is installed once, by the first manager; close whichever
+        # manager is current when the signal arrives
+        self.close()
+        if LMSManager._instance is not None:
+            LMSManager._instance.close()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    @instrumented('flush')
+    def flush(self):
+        # Writes any mutations still buffered by the storage backend
+        try:
+            self.backend.flush()
+            self.analytics.save()
+        except Exception as e:
+            metrics.record_error('flush')
+            logger.error("Error flushing data: %s", e)
+
+    def get_metrics(self):
+        # Per-operation counters and latency percentiles for this process
+        return metrics.snapshot()
+
+    def close(self):
+        # Idempotent; a closed manager also drops its exit hook, so managers
+        # discarded by tests and benchmarks are not closed again at exit.
+        # The next LMSManager() call opens the store again.
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if LMSManager._instance is self:
+            LMSManager._instance = None
+        try:
+            self.backend.close()
+        except Exception as e:
+            logger.error("Error closing storage: %s", e)
+        try:
+            self.analytics.close()
+        except Exception as e:
+            logger.error("Error saving analytics: %s", e)
+
+    def get_analytics(self):
+        # Enrollment aggregates (totals, users per topic, enrollments per day,
+        # per-course completion counts), without scanning the data
+        return self.analytics.snapshot()
+
+    @instrumented('load')
+    def load_data(self):
+        # Loads LMS data from the storage backend or creates new storage if not exists
+        try:
+            existed = self.backend.load()
+            if not existed:
+                self._migrate_legacy_json()
+                logger.info("Created new data file")
+        except Exception as e:
+            metrics.record_error('load')
+            logger.error("Error loading data: %s", e)
+            if self.backend_name != 'json':
+                raise
+            # Keep serving from an empty dataset rather than failing every action
+            self.backend.data = empty_data()
+
+    def _migrate_legacy_json(self):
+        # A fresh non-JSON store is seeded from an existing lms_data.json
+        legacy_file = os.path.join(os.path.dirname(self.data_file), DEFAULT_DATA_FILES['json'])
+        if legacy_file == self.data_file or not os.path.exists(legacy_file):
+            return
+        self.backend.import_file(legacy_file)
+        logger.info("Imported existing data from %s", legacy_file)
+
+    @instrumented('save')
+    def save_data(self):
+        try:
+            self.backend.save()
+            self.analytics.save()
+        except Exception as e:
+            metrics.record_error('save')
+            logger.error("Error saving data: %s", e)
+
+    @instrumented('create')
+    def create_course(self, course_name, description, materials):
+        # Creates a new course with unique ID and metadata
+        try:
+            course = {
+                'name': course_name,
+                'description': description,
+                'materials': materials,
+                'created_at': datetime.now().isoformat()
+            }
+            course_id = self.backend.add_course(course)
+            self.analytics.record_course(course_id, course)
+            logger.debug("Created course %s: %s", course_id, course_name)
+            return course_id
+        except Exception as e:
+            metrics.record_error('create')
+            logger.error("Error creating course: %s", e)
+            return None
+
+    @instrumented('get_or_create')
+    def get_or_create_course(self, key, course_name, description, materials):
+        # Reuses the canonical course stored under a catalog key, creating it only on a miss
+        try:
+            course_id = self.backend.find_course(key)
+            if course_id is not None:
+                return course_id
+            course = {
+                'name': course_name,
+                'description': description,
+                'materials': materials,
+                'created_at': datetime.now().isoformat(),
+                'catalog_key': key
+            }
+            course_id = self.backend.add_course(course)
+            self.analytics.record_course(course_id, course)
+            logger.debug("Created catalog course %s: %s", course_id, course_name)
+            return course_id
+        except Exception as e:
+            metrics.record_error('get_or_create')
+            logger.error("Error creating course: %s", e)
+            return None
+
+    @instrumented('enroll')
+    def enroll_user(self, user_id, course_id):
+        # Enrolls a user in a specific course and initializes progress tracking
+        try:
+            if self.backend.get_course(course_id) is None:
+                logger.warning("Course %s not found", course_id)
+                return False
+
+            # Copied before enrolling: the JSON backends return the live record
+            user = self.backend.get_user(user_id)
+            previous_courses = list(user['enrolled_courses']) if user else []
+            progress = {
+                'status': STATUS_ENROLLED,
+                'completed_materials': [],
+                'enrolled_at': datetime.now().isoformat()
+            }
+            enrolled = self.backend.add_enrollment(user_id, course_id, progress)
+            if enrolled:
+                self.analytics.record_enrollment(
+                    course_id, progress['enrolled_at'], previous_courses, new_user=user is None)
+                logger.debug("Enrolled user %s in course %s", user_id, course_id)
+            return True
+        except Exception as e:
+            metrics.record_error('enroll')
+            logger.error("Error enrolling user: %s", e)
+            return False
+
+    @instrumented('create_many')
+    def create_courses(self, courses):
+        # Creates several courses with one persistence step. Each course is a
+        # dict with name, description, materials and optionally catalog_key;
+        # returns the ids in order, reusing the stored course for a catalog
+        # key that already exists. Returns None if the batch failed.
+        try:
+            created_at = datetime.now().isoformat()
+            records = []
+            for course in courses:
+                record = {
+                    'name': course['name'],
+                    'description': course.get('description'),
+                    'materials': course.get('materials', []),
+                    'created_at': created_at
+                }
+                if course.get('catalog_key'):
+                    record['catalog_key'] = course['catalog_key']
+                records.append(record)
+            course_ids = self.backend.add_courses(records)
+            for course_id, record in zip(course_ids, records):
+                self.analytics.record_course(course_id, record)
+            logger.debug("Created %d courses in one batch", len(records))
+            return course_ids
+        except Exception as e:
+            metrics.record_error('create_many')
+            logger.error("Error creating courses: %s", e)
+            return None
+
+    @instrumented('enroll_many')
+    def enroll_many(self, enrollments):
+        # Enrolls a batch of (user_id, course_id) pairs with one persistence
+        # step instead of one save per enrollment. Pairs naming an unknown
+        # course are skipped. Returns counts of new, already existing and
+        # skipped enrollments, or None if the batch failed.
+        try:
+            enrollments = list(enrollments)
+            known_courses = {course_id for course_id in {course_id for _, course_id in enrollments}
+                             if self.backend.get_course(course_id) is not None}
+            # Each learner's courses before the batch, for the topic analytics
+            previous_courses = {}
+            for user_id, course_id in enrollments:
+                if course_id in known_courses and user_id not in previous_courses:
+                    user = self.backend.get_user(user_id)
+                    previous_courses[user_id] = list(user['enrolled_courses']) if user else None
+
+            enrolled_at = datetime.now().isoformat()
+            batch = [(user_id, course_id, {
+                'status': STATUS_ENROLLED,
+                'completed_materials': [],
+                'enrolled_at': enrolled_at
+            }) for user_id, course_id in enrollments if course_id in known_courses]
+            created = self.backend.add_enrollments(batch)
+
+            for (user_id, course_id, _), new in zip(batch, created):
+                if new:
+                    previous = previous_courses[user_id]
+                    self.analytics.record_enrollment(course_id, enrolled_at, previous or (),
+                                                     new_user=previous is None)
+                    if previous is None:
+                        previous = previous_courses[user_id] = []
+                    previous.append(course_id)
+            report = {
+                'enrolled': sum(created),
+                'existing': len(created) - sum(created),
+                'skipped': len(enrollments) - len(batch),
+            }
+            logger.debug("Batch enrollment: %s", report)
+            return report
+        except Exception as e:
+            metrics.record_error('enroll_many')
+            logger.error("Error enrolling users: %s", e)
+            return None
+
+    @instrumented('get_course')
+    def get_course(self, course_id):
+        # Course record (name, description, materials, ...) or None; callers
+        # must treat it as read-only
+        return self.backend.get_course(course_id)
+
+    @instrumented('get')
+    def get_user_courses(self, user_id):
+        # Retrieves all courses enrolled by a specific user with their progress
+        try:
+            enrollments = self.backend.get_user_enrollments(user_id)
+            if enrollments is None:
+                logger.debug("User %s not found", user_id)
+                return []
+
+            courses = []
+            for course_id, course, progress in enrollments:
+                courses.append({
+                    'course_id': course_id,
+                    'name': course.get('name'),
+                    'description': course.get('description'),
+                    'status': progress.get('status'),
+                    'enrolled_at': progress.get('enrolled_at')
+                })
+            logger.debug("Found %d courses for user %s", len(courses), user_id)
+            return courses
+        except Exception as e:
+            metrics.record_error('get')
+            logger.error("Error getting user courses: %s", e)
+            return []
+
+    @instrumented('complete_material')
+    def complete_material(self, user_id, course_id, material_url):
+        # Marks one course material (identified by URL) as completed and moves
+        # the enrollment to in_progress, or to completed once all are done
+        try:
+            course = self.backend.get_course(course_id)
+            progress = self.backend.get_progress(user_id, course_id)
+            if course is None or progress is None:
+                logger.warning("User %s is not enrolled in course %s", user_id, course_id)
+                return False
+            course_urls = {material['url'] for material in course['materials']}
+            if material_url not in course_urls:
+                logger.warning("Material %s is not part of course %s", material_url, course_id)
+                return False
+            previous_status = progress.get('status')
+            completed = set(progress.get('completed_materials', ()))
+            completed.add(material_url)
+            status = STATUS_COMPLETED if course_urls <= completed else STATUS_IN_PROGRESS
+            if not self.backend.complete_material(user_id, course_id, material_url, status):
+                return False
+            self.analytics.record_status(course_id, previous_status, status)
+            return True
+        except Exception as e:
+            metrics.record_error('complete_material')
+            logger.error("Error completing material: %s", e)
+            return False
+
+    @instrumented('completion')
+    def get_completion_percentage(self, user_id, course_id):
+        # Share of the course's materials the user has completed, 0-100
+        course = self.backend.get_course(course_id)
+        progress = self.backend.get_progress(user_id, course_id)
+        if not course or progress is None or not course['materials']:
+            return 0.0
+        course_urls = {material['url'] for material in course['materials']}
+        completed = course_urls.intersection(progress.get('completed_materials', ()))
+        return 100.0 * len(completed) / len(course_urls)
+
+    @instrumented('gc')
+    def collect_garbage(self, dry_run=False):
+        # Removes courses nobody is enrolled in and merges duplicate courses
+        # (same name and materials), rewriting enrollments to the survivor.
+        # Runs online; readers are not blocked. Returns the report of
+        # utils.lms_gc, including reclaimed_bytes, or None on failure.
+        try:
+            report = self.backend.collect_garbage(dry_run=dry_run)
+            if not dry_run:
+                # Course ids changed underneath the aggregates
+                self.analytics.rebuild(self.backend.export_data())
+            logger.info("Garbage collection%s: %s", " (dry run)" if dry_run else "", report)
+            return report
+        except Exception as e:
+            metrics.record_error('gc')
+            logger.error("Error collecting garbage: %s", e)
+            return None
+
+    @instrumented('roster')
+    def get_course_roster(self, course_id):
+        # Ids of the users enrolled in a course, from the course -> users index
+        return sorted(self.backend.get_roster(course_id))
+
+    @instrumented('users_by_status')
+    def get_users_by_status(self, status, course_id=None):
+        # Ids of the users with an enrollment in the given status, optionally
+        # restricted to one course, from the status -> enrollments index
+        return sorted({member_user for member_user, member_course in self.backend.get_status_members(status)
+                       if course_id is None or member_course == course_id})
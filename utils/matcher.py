@@ -0,0 +1,118 @@
+import re
+
+# Declarative keyword table shared by the Streamlit app and the Rasa actions.
+# category -> label -> phrases. Within a category, labels are listed in
+# priority order: when several labels match, the first one listed wins.
+# Plurals need not be listed (see keyword_form); other derived forms do.
+KEYWORDS = {
+    'feedback': {
+        'thanks': ["thanks", "thank you", "thx"],
+        'good': ["good", "great", "awesome", "amazing", "helpful"],
+        'bye': ["bye", "goodbye", "see you"],
+        'hello': ["hi", "hello", "hey"],
+    },
+    'command': {
+        'show_courses': ["show my courses"],
+    },
+    'experience': {
+        'beginner': ["beginner"],
+        'intermediate': ["intermediate"],
+        'advanced': ["advanced"],
+    },
+    'topic': {
+        'web': ["web", "website", "webpage", "webdev"],
+        'data': ["data", "dataset", "science", "scientist"],
+        'mobile': ["mobile", "app", "apps"],
+        'ai': ["ai", "artificial"],
+    },
+}
+
+# Interest names used in course titles for each topic label
+TOPIC_INTERESTS = {
+    'web': 'web development',
+    'data': 'data science',
+    'mobile': 'mobile apps',
+    'ai': 'artificial intelligence',
+}
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Trie key under which a node stores the (category, label) pairs ending there;
+# tokens are always strings so it cannot collide with a child
+_HITS = None
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def keyword_form(token):
+    # Plurals match their singular keyword ("beginners", "websites"); tokens
+    # of three letters or fewer are kept, so "his" does not become "hi"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+# Result of one scan: the labels hit in each category
+class KeywordMatch:
+    def __init__(self, hits, priorities):
+        self._hits = hits
+        self._priorities = priorities
+
+    def has(self, category, label=None):
+        labels = self._hits.get(category)
+        if not labels:
+            return False
+        return label is None or label in labels
+
+    def labels(self, category):
+        # Labels hit in a category, highest priority first
+        return sorted(self._hits.get(category, ()),
+                      key=lambda label: self._priorities[(category, label)])
+
+    def first(self, category):
+        labels = self.labels(category)
+        return labels[0] if labels else None
+
+    def __repr__(self):
+        return f"KeywordMatch({self._hits!r})"
+
+
+# Token trie built once from a keyword table. A scan tokenizes the text and
+# walks the trie from each token; matching whole tokens means "ai" no longer
+# fires on "said" and "hi" no longer fires on "this". Phrase and text tokens
+# both go through keyword_form, so plurals still match. Work per token is
+# bounded by the longest phrase, so a scan is linear in the prompt length.
+class KeywordMatcher:
+    def __init__(self, table):
+        self._root = {}
+        self._priorities = {}
+        for category, labels in table.items():
+            for priority, (label, phrases) in enumerate(labels.items()):
+                self._priorities[(category, label)] = priority
+                for phrase in phrases:
+                    node = self._root
+                    for token in tokenize(phrase):
+                        node = node.setdefault(keyword_form(token), {})
+                    node.setdefault(_HITS, []).append((category, label))
+
+    def match(self, text):
+        tokens = [keyword_form(token) for token in tokenize(text)]
+        hits = {}
+        for start in range(len(tokens)):
+            node = self._root
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                for category, label in node.get(_HITS, ()):
+                    hits.setdefault(category, set()).add(label)
+        return KeywordMatch(hits, self._priorities)
+
+
+default_matcher = KeywordMatcher(KEYWORDS)
+
+
+def match_keywords(text):
+    return default_matcher.match(text)
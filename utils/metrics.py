@@ -0,0 +1,119 @@
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+
+# All LMS loggers hang off this one so operators can tune them together,
+# e.g. LMS_LOG_LEVEL=DEBUG while investigating an issue
+ROOT_LOGGER_NAME = "lms"
+
+logging.getLogger(ROOT_LOGGER_NAME).setLevel(os.environ.get("LMS_LOG_LEVEL", "WARNING").upper())
+
+
+def get_logger(name):
+    # Messages are passed as %-style args, so they are only formatted when
+    # the level is enabled; guard anything expensive with isEnabledFor
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+# Upper bounds (seconds) of the latency histogram buckets: 50us doubling up to ~26s
+LATENCY_BUCKETS = tuple(0.00005 * 2 ** i for i in range(20))
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One extra slot for observations above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the requested rank, capped at the
+        # largest sample so a percentile never exceeds the maximum
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ms': (self.total / self.count * 1000) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+# Per-operation call counters, error counters and latency histograms
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = {}
+
+    def observe(self, operation, seconds, error=False):
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = LatencyHistogram()
+            histogram.observe(seconds)
+            if error:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def record_error(self, operation):
+        # For call sites that handle their own exceptions
+        with self._lock:
+            self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                operation: dict(histogram.snapshot(), errors=self._errors.get(operation, 0))
+                for operation, histogram in self._histograms.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+
+
+# Process-wide registry read by dashboards and benchmarks
+metrics = Metrics()
+
+
+def timed(operation, registry=None):
+    # Decorator recording the latency of every call under `operation`;
+    # exceptions are counted as errors and re-raised
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                (registry or metrics).observe(operation, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
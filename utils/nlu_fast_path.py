@@ -0,0 +1,98 @@
+from utils.matcher import KEYWORDS, TOKEN_RE, TOPIC_INTERESTS, keyword_form, match_keywords, tokenize
+
+# Deterministic parse for messages the keyword table explains completely,
+# such as "hi", "show my courses" or "I'm a beginner in web development".
+# The Rasa fast-path component (components/keyword_fast_path.py) uses it to
+# answer those without the featurizers and DIET; anything with an unknown
+# word, conflicting keywords, a word the matched keywords do not account for,
+# or a course request without a topic (a bare "beginner") returns None and
+# goes through the model. Tokens are compared in their keyword_form, so
+# plurals are recognised as they are by the matcher.
+
+# Feedback labels that map onto a domain intent
+FEEDBACK_INTENTS = {'hello': 'greet', 'bye': 'goodbye'}
+COMMAND_INTENTS = {'show_courses': 'show_enrollments'}
+COURSE_REQUEST_INTENT = 'request_coding_courses'
+
+# Entity names match the slots the actions fill
+ENTITY_NAMES = {'experience': 'experience_level', 'topic': 'coding_interest'}
+
+# Words that carry no intent of their own
+FILLER_WORDS = frozenset((
+    "i", "m", "am", "a", "an", "the", "in", "into", "with", "and", "about", "for", "to",
+    "me", "my", "im", "want", "would", "like", "learn", "learning", "interested", "start",
+    "please", "there", "level", "course", "courses", "programming", "coding",
+))
+
+# Longer messages are left to the model even when every word is known
+MAX_TOKENS = 12
+
+_FILLER_FORMS = frozenset(keyword_form(word) for word in FILLER_WORDS)
+
+# (category, label) -> tokens of its phrases, plus the spelled-out interest
+# name for topics ("development" in "web development")
+_LABEL_TOKENS = {
+    (category, label): frozenset(
+        keyword_form(token)
+        for text in [*phrases, TOPIC_INTERESTS.get(label, '') if category == 'topic' else '']
+        for token in tokenize(text))
+    for category, labels in KEYWORDS.items() for label, phrases in labels.items()
+}
+
+_KNOWN_TOKENS = _FILLER_FORMS.union(*_LABEL_TOKENS.values())
+
+# token -> (category, label) for the categories extracted as entities
+_ENTITY_TOKENS = {
+    keyword_form(token): (category, label)
+    for category in ENTITY_NAMES for label, phrases in KEYWORDS[category].items()
+    for phrase in phrases for token in tokenize(phrase)
+}
+
+
+def _entities(text, matched):
+    entities = []
+    for category, entity in ENTITY_NAMES.items():
+        label = matched.first(category)
+        if label is None:
+            continue
+        value = TOPIC_INTERESTS.get(label, label) if category == 'topic' else label
+        for token in TOKEN_RE.finditer(text):
+            if _ENTITY_TOKENS.get(keyword_form(token.group().lower())) == (category, label):
+                end = token.end()
+                # The span covers the whole interest name when it is spelled out
+                if (token.start() + len(value) > end
+                        and text[token.start():token.start() + len(value)].lower() == value):
+                    end = token.start() + len(value)
+                entities.append({'entity': entity, 'value': value, 'start': token.start(), 'end': end})
+                break
+    return entities
+
+
+def fast_parse(text):
+    # {'intent': name, 'entities': [...]} for an unambiguous message, else None
+    tokens = [keyword_form(token) for token in tokenize(text)]
+    if not tokens or len(tokens) > MAX_TOKENS or not _KNOWN_TOKENS.issuperset(tokens):
+        return None
+    matched = match_keywords(text)
+    categories = {category for category in KEYWORDS if matched.has(category)}
+    # Two labels in one category ("web app", "hi thanks") are ambiguous
+    if any(len(matched.labels(category)) > 1 for category in categories):
+        return None
+    # Every word must be filler or part of what matched: in "hi development"
+    # the keywords explain only half of the message
+    covered = _FILLER_FORMS.union(*(_LABEL_TOKENS[(category, matched.first(category))]
+                                    for category in categories))
+    if not covered.issuperset(tokens):
+        return None
+
+    if categories == {'command'}:
+        intent = COMMAND_INTENTS.get(matched.first('command'))
+    elif categories == {'feedback'}:
+        intent = FEEDBACK_INTENTS.get(matched.first('feedback'))
+    elif 'topic' in categories and categories <= set(ENTITY_NAMES):
+        # A level on its own ("beginner") is left to the model, which has
+        # seen how such replies are used in context
+        return {'intent': COURSE_REQUEST_INTENT, 'entities': _entities(text, matched)}
+    else:
+        intent = None
+    return {'intent': intent, 'entities': []} if intent else None
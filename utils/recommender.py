@@ -0,0 +1,120 @@
+import threading
+
+import numpy as np
+
+from utils.matcher import KEYWORDS, tokenize
+
+# Filler words that say nothing about what a learner wants
+STOPWORDS = frozenset("""
+    a about an and are as at be for from i im in interested into is it learn
+    like m me my of on or so some start the to want with would you
+""".split())
+
+# Experience words and their plurals ("beginners" also names courses);
+# ignored when inferring a topic from a free-form prompt
+LEVEL_WORDS = frozenset(
+    form for phrases in KEYWORDS['experience'].values() for phrase in phrases
+    for word in tokenize(phrase) for form in (word, f"{word}s")
+)
+
+
+def course_text(course):
+    # Everything that describes a catalog course, as one document
+    parts = [course['name'], course['description'], course['topic'],
+             course.get('interest', ''), course['level']]
+    parts.extend(material['name'] for material in course['materials'])
+    parts.extend(course.get('learning_path', ()))
+    return " ".join(parts)
+
+
+# Content-based ranking over the course catalog. Each course is a row of an
+# L2-normalized TF-IDF matrix built once per catalog version; a query (plus
+# the learner's enrollment history) is scored against every course with a
+# single matrix-vector product.
+class Recommender:
+    def __init__(self, catalog, history_weight=0.5):
+        self.catalog = catalog
+        self.courses = catalog.courses
+        self.history_weight = history_weight
+        self.row_by_id = {course['id']: row for row, course in enumerate(self.courses)}
+
+        documents = [self._terms(course_text(course)) for course in self.courses]
+        self.vocabulary = {}
+        for terms in documents:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        rows = np.repeat(np.arange(len(documents)), [len(terms) for terms in documents])
+        columns = np.fromiter((self.vocabulary[term] for terms in documents for term in terms),
+                              dtype=np.int64)
+        counts = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        np.add.at(counts, (rows, columns), 1.0)
+
+        # Smoothed inverse document frequency
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.matrix = self._normalize(counts * self.idf)
+
+    @staticmethod
+    def _terms(text, ignore=()):
+        return [term for term in tokenize(text) if term not in STOPWORDS and term not in ignore]
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def vectorize(self, text, ignore=()):
+        columns = [self.vocabulary[term] for term in self._terms(text, ignore)
+                   if term in self.vocabulary]
+        vector = np.bincount(columns, minlength=len(self.vocabulary)).astype(np.float32)
+        return self._normalize(vector * self.idf)
+
+    def score(self, query, history=(), ignore=()):
+        vector = self.vectorize(query, ignore)
+        if history:
+            history_vector = self._normalize(
+                np.sum([self.vectorize(text) for text in history], axis=0))
+            vector = vector + self.history_weight * history_vector
+        return self.matrix @ vector
+
+    def recommend(self, query, history=(), k=3, exclude_ids=(), ignore=()):
+        # Top-k (course, score) pairs with a positive score, best first
+        if not self.courses:
+            return []
+        scores = self.score(query, history, ignore)
+        for course_id in exclude_ids:
+            row = self.row_by_id.get(course_id)
+            if row is not None:
+                scores[row] = -np.inf
+        k = min(k, len(self.courses))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.courses[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def infer_topic(self, query):
+        # Topic of the best match for a prompt without a recognised topic
+        # keyword, e.g. "python" or "android". Scored on the prompt alone so
+        # past enrollments cannot outweigh what was just asked for, and
+        # experience words are ignored since every course is tagged with a level
+        ranked = self.recommend(query, k=1, ignore=LEVEL_WORDS)
+        return ranked[0][0]['topic'] if ranked else None
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+
+
+def get_recommender(catalog):
+    # Rebuilt only when the catalog has been reloaded
+    global _recommender
+    with _recommender_lock:
+        if _recommender is None or _recommender.catalog is not catalog:
+            _recommender = Recommender(catalog)
+        return _recommender
+
+
+def enrollment_history(courses):
+    # Texts of a learner's enrolled courses (as returned by
+    # LMSManager.get_user_courses), used to personalize scoring
+    return [f"{course['name']} {course['description'] or ''}" for course in courses]
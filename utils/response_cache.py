@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.matcher import tokenize
+
+# Bounded LRU of reply parts that are the same for every learner: what a
+# phrasing resolves to (feedback, command, experience, topic) and the
+# catalog course and rendered text for it. Most traffic is a handful of
+# near-identical phrasings, so the keyword scan, topic inference and
+# rendering run once per phrasing instead of once per message. Learner-
+# specific parts (suggestions, enrollment) are never cached.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+# Seconds an entry is served before it is computed again
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "600"))
+
+_MISSING = object()
+
+
+def normalize_query(text):
+    # Bag of words of a message: case, punctuation, spacing and word order
+    # do not change a reply once the keyword phrases found in it are known
+    # (see utils.chat.cached_query_signature)
+    return " ".join(sorted(tokenize(text)))
+
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._catalog = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def bind(self, catalog):
+        # Entries are rendered from one catalog version; a reloaded catalog
+        # empties the cache
+        with self._lock:
+            if catalog is not self._catalog:
+                if self._catalog is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._catalog = catalog
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        # compute() runs outside the lock; concurrent misses on one key may
+        # both compute, and the last result is kept
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(name):
+    # One cache per front end, since each renders its own reply format
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = ResponseCache()
+        return cache
@@ -0,0 +1,239 @@
+"""Bulk enrollment of a class roster.
+
+    python -m utils.roster_import roster.csv --course-id 3
+    python -m utils.roster_import roster.csv --interest "data science" --experience beginner
+    python -m utils.roster_import roster.xls --sheet Students --chunk-size 5000
+
+The roster is streamed in fixed-size chunks and each chunk is one
+LMSManager.enroll_many call, so the store is written once per chunk instead
+of once per student. The roster needs a user column (user_id, student_id,
+email, student or user). The course is given on the command line, or per
+row by a course_id column or by interest/topic and experience/level
+columns naming a catalog course. Rows above the header row (titles,
+notes) are skipped. CSV and TSV files are read with the csv module; .xls
+exports need the optional xlrd package. Progress goes to stderr after
+every chunk. The store is the one LMSManager is configured for
+(LMS_STORAGE_BACKEND, LMS_DATA_FILE).
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from itertools import islice
+
+from utils.catalog import get_catalog, thaw
+from utils.chat import lms_course_fields
+from utils.lms_utils import DEFAULT_DATA_FILES, LMSManager
+from utils.matcher import match_keywords
+
+USER_COLUMNS = ('user_id', 'student_id', 'email', 'student', 'user')
+COURSE_ID_COLUMNS = ('course_id',)
+INTEREST_COLUMNS = ('interest', 'topic')
+EXPERIENCE_COLUMNS = ('experience', 'level')
+# Rows searched for the header before giving up
+HEADER_SEARCH_ROWS = 20
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class RosterError(ValueError):
+    pass
+
+
+def normalize_header(value):
+    # "Student ID" -> "student_id"
+    return re.sub(r"\W+", "_", str(value).strip().lower()).strip("_")
+
+
+def read_csv_rows(path):
+    dialect = csv.excel_tab if path.lower().endswith('.tsv') else csv.excel
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        yield from csv.reader(f, dialect)
+
+
+def _cell_text(cell, xlrd):
+    # Spreadsheets store ids typed as numbers as floats: 1042 -> 1042.0
+    if cell.ctype == xlrd.XL_CELL_NUMBER and float(cell.value).is_integer():
+        return str(int(cell.value))
+    return str(cell.value).strip()
+
+
+def read_xls_rows(path, sheet=None):
+    try:
+        import xlrd
+    except ImportError:
+        raise RosterError("Reading .xls files needs the optional xlrd package "
+                          "(pip install xlrd), or export the sheet as CSV")
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        worksheet = book.sheet_by_name(sheet) if sheet else book.sheet_by_index(0)
+        for index in range(worksheet.nrows):
+            yield [_cell_text(cell, xlrd) for cell in worksheet.row(index)]
+    finally:
+        book.release_resources()
+
+
+def read_rows(path, sheet=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.csv', '.tsv', '.txt'):
+        return read_csv_rows(path)
+    if extension == '.xls':
+        return read_xls_rows(path, sheet)
+    raise RosterError(f"Unsupported roster format {extension!r}; use CSV, TSV or .xls")
+
+
+def _find_column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def roster_records(rows):
+    # (user_id, course_id, interest, experience) per data row; columns that
+    # are absent come back as None
+    rows = iter(rows)
+    for row in islice(rows, HEADER_SEARCH_ROWS):
+        header = [normalize_header(value) for value in row]
+        user_column = _find_column(header, USER_COLUMNS)
+        if user_column is not None:
+            break
+    else:
+        raise RosterError(f"No header row with a user column ({', '.join(USER_COLUMNS)}) found")
+    columns = (user_column, _find_column(header, COURSE_ID_COLUMNS),
+               _find_column(header, INTEREST_COLUMNS), _find_column(header, EXPERIENCE_COLUMNS))
+
+    for row in rows:
+        values = []
+        for column in columns:
+            value = row[column].strip() if column is not None and column < len(row) else ""
+            values.append(value or None)
+        if any(values):
+            yield tuple(values)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CatalogCourses:
+    # LMS ids of the canonical catalog courses named in a roster, created
+    # the way the chat front ends create them, in one batch per chunk
+    def __init__(self, lms, catalog):
+        self.lms = lms
+        self.catalog = catalog
+        self.ids = {}
+
+    @staticmethod
+    def level_of(experience):
+        return match_keywords(experience).first('experience') or experience.strip().lower()
+
+    def resolve(self, requests):
+        # requests: (interest, experience) pairs; returns {pair: course id or None}
+        pending = {}
+        for interest, experience in set(requests) - set(self.ids):
+            topic = match_keywords(interest).first('topic')
+            level = self.level_of(experience)
+            course = self.catalog.find(topic, level) if topic else None
+            if course is None:
+                self.ids[(interest, experience)] = None
+                continue
+            key, name, description = lms_course_fields(course, level)
+            pending[(interest, experience)] = {'catalog_key': key, 'name': name, 'description': description,
+                                              'materials': thaw(course['materials'])}
+        if pending:
+            course_ids = self.lms.create_courses(list(pending.values()))
+            if course_ids is None:
+                raise RosterError("Creating the roster's catalog courses failed")
+            self.ids.update(zip(pending, course_ids))
+        return {request: self.ids[request] for request in requests}
+
+
+def import_roster(lms, records, chunk_size=DEFAULT_CHUNK_SIZE, course_id=None,
+                  interest=None, experience=None, progress=None):
+    # Enrolls every roster record; returns the totals printed by the CLI
+    catalog_courses = CatalogCourses(lms, get_catalog())
+    if interest and experience:
+        course_id = catalog_courses.resolve([(interest, experience)])[(interest, experience)]
+        if course_id is None:
+            raise RosterError(f"No catalog course for {interest!r} at level {experience!r}")
+
+    totals = {'rows': 0, 'enrolled': 0, 'existing': 0, 'skipped': 0}
+    started = time.perf_counter()
+    for chunk in chunked(records, chunk_size):
+        if course_id is None:
+            resolved = catalog_courses.resolve([(row_interest, row_experience)
+                                                for _, row_course, row_interest, row_experience in chunk
+                                                if row_course is None and row_interest and row_experience])
+        pairs = []
+        for user_id, row_course, row_interest, row_experience in chunk:
+            if course_id is not None:
+                target = course_id
+            else:
+                target = row_course or resolved.get((row_interest, row_experience))
+            if user_id and target:
+                pairs.append((user_id, target))
+        report = lms.enroll_many(pairs)
+        if report is None:
+            raise RosterError(f"Enrollment failed after {totals['rows']} rows; see the log")
+        totals['rows'] += len(chunk)
+        totals['enrolled'] += report['enrolled']
+        totals['existing'] += report['existing']
+        totals['skipped'] += report['skipped'] + len(chunk) - len(pairs)
+        if progress is not None:
+            elapsed = time.perf_counter() - started
+            print(f"{totals['rows']:>9} rows  {totals['enrolled']:>9} enrolled  "
+                  f"{totals['existing']:>7} already enrolled  {totals['skipped']:>7} skipped  "
+                  f"{totals['rows'] / elapsed if elapsed else 0:>9.0f} rows/s", file=progress)
+    lms.flush()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('roster', help="CSV, TSV or .xls roster")
+    parser.add_argument('--course-id', help="enroll every student in this LMS course")
+    parser.add_argument('--interest', help="catalog interest for every student, e.g. 'web development'")
+    parser.add_argument('--experience', help="catalog level for every student, e.g. beginner")
+    parser.add_argument('--sheet', help="worksheet name (.xls; default: the first sheet)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows per enrollment batch")
+    parser.add_argument('--backend', choices=sorted(DEFAULT_DATA_FILES),
+                        help="storage backend (default: LMS_STORAGE_BACKEND or json)")
+    parser.add_argument('--data-file', help="data file (default: LMS_DATA_FILE or the backend's default)")
+    args = parser.parse_args(argv)
+
+    if bool(args.interest) != bool(args.experience):
+        parser.error("--interest and --experience go together")
+    if args.course_id and args.interest:
+        parser.error("Use either --course-id or --interest/--experience")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+    if not os.path.exists(args.roster):
+        parser.error(f"{args.roster} does not exist")
+    # LMSManager reads its configuration from the environment
+    if args.backend:
+        os.environ["LMS_STORAGE_BACKEND"] = args.backend
+    if args.data_file:
+        os.environ["LMS_DATA_FILE"] = args.data_file
+
+    lms = LMSManager()
+    if args.course_id and lms.get_course(args.course_id) is None:
+        parser.error(f"Course {args.course_id} does not exist")
+    try:
+        totals = import_roster(lms, roster_records(read_rows(args.roster, args.sheet)), args.chunk_size,
+                               args.course_id, args.interest, args.experience, progress=sys.stderr)
+    except RosterError as e:
+        parser.error(str(e))
+    for key, value in totals.items():
+        print(f"{key:<10} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1468 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from utils.compact_model import CompactUsers
+from utils.metrics import get_logger
+from utils.tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = get_logger("storage")
+
+
+def empty_data():
+    # Fresh structure matching the layout of lms_data.json
+    return {
+        'users': {},
+        'courses': {},
+        'enrollments': {},
+        'meta': {'generation': 0, 'next_course_id': 1}
+    }
+
+
+def ensure_meta(data):
+    # Files written before the meta block existed get a counter that starts
+    # after the highest numeric course id already in use
+    meta = data.setdefault('meta', {})
+    meta.setdefault('generation', 0)
+    if 'next_course_id' not in meta:
+        numeric_ids = [int(course_id) for course_id in data['courses'] if course_id.isdigit()]
+        meta['next_course_id'] = max(numeric_ids, default=0) + 1
+    return meta
+
+
+def apply_entry(data, entry):
+    # Applies one mutation record to an in-memory dataset. Replaying the same
+    # record twice leaves the data unchanged, which makes journal replay safe.
+    op = entry['op']
+    if op != 'add_course' and isinstance(data['users'], CompactUsers):
+        data['users'].apply(entry)
+    elif op == 'add_course':
+        data['courses'][entry['course_id']] = entry['course']
+        if entry['course_id'].isdigit():
+            meta = ensure_meta(data)
+            meta['next_course_id'] = max(meta['next_course_id'], int(entry['course_id']) + 1)
+    elif op == 'enroll':
+        user = data['users'].setdefault(entry['user_id'], {
+            'enrolled_courses': [],
+            'progress': {}
+        })
+        if entry['course_id'] not in user['progress']:
+            user['enrolled_courses'].append(entry['course_id'])
+            user['progress'][entry['course_id']] = entry['progress']
+    elif op == 'complete_material':
+        progress = data['users'][entry['user_id']]['progress'][entry['course_id']]
+        completed = progress.setdefault('completed_materials', [])
+        if entry['material'] not in completed:
+            completed.append(entry['material'])
+        progress['status'] = entry['status']
+    else:
+        raise ValueError(f"Unknown journal operation: {op!r}")
+
+
+def write_text_atomic(path, text):
+    # Writes to a sibling temp file and renames it over the target, so a crash
+    # mid-write leaves the previous file intact instead of a truncated one
+    tmp_path = f"{path}.tmp"
+    with span("storage.write", bytes=len(text)):
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def to_json(value):
+    # json.dumps default hook for the compact in-memory users model
+    if isinstance(value, CompactUsers):
+        return value.to_data()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_json_atomic(path, data, **dump_kwargs):
+    write_text_atomic(path, json.dumps(data, default=to_json, **dump_kwargs))
+
+
+# Cross-process advisory lock on a sidecar file. Re-entrant within a process;
+# threads of one process are serialized by the internal RLock.
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._handle = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            self._handle = open(self.path, 'a+')
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+            self._handle.close()
+            self._handle = None
+        self._thread_lock.release()
+
+
+# Interface every LMS storage engine implements. LMSManager only talks to
+# these methods, so engines are free to pick their own on-disk layout.
+class StorageBackend:
+    def load(self):
+        raise NotImplementedError
+
+    def save(self):
+        # Persist any pending state; engines that write per row may no-op
+        pass
+
+    def flush(self):
+        # Forces buffered mutations to disk
+        self.save()
+
+    def close(self):
+        pass
+
+    def get_course(self, course_id):
+        raise NotImplementedError
+
+    def add_course(self, course):
+        # Stores a course record and returns its newly allocated id
+        raise NotImplementedError
+
+    def find_course(self, catalog_key):
+        # Returns the id of the course stored under a catalog key, or None
+        raise NotImplementedError
+
+    def get_user(self, user_id):
+        # Returns {'enrolled_courses': [...], 'progress': {...}} or None
+        raise NotImplementedError
+
+    def add_enrollment(self, user_id, course_id, progress):
+        # Returns False if the user was already enrolled in the course
+        raise NotImplementedError
+
+    def add_courses(self, courses):
+        # Stores several courses and returns their ids in order; courses whose
+        # catalog key is already stored resolve to the existing id. Engines
+        # override this to persist the whole batch in one step.
+        return [self.add_course(course) for course in courses]
+
+    def add_enrollments(self, enrollments):
+        # (user_id, course_id, progress) triples; returns, per triple, whether
+        # it was a new enrollment. Engines override this to persist the whole
+        # batch in one step.
+        return [self.add_enrollment(user_id, course_id, progress)
+                for user_id, course_id, progress in enrollments]
+
+    def complete_material(self, user_id, course_id, material, status):
+        # Records a completed material and the resulting enrollment status
+        raise NotImplementedError
+
+    def get_roster(self, course_id):
+        # Ids of the users enrolled in a course
+        raise NotImplementedError
+
+    def get_status_members(self, status):
+        # (user_id, course_id) pairs of the enrollments currently in a status
+        raise NotImplementedError
+
+    def get_progress(self, user_id, course_id):
+        user = self.get_user(user_id)
+        return user['progress'].get(course_id) if user else None
+
+    def get_user_enrollments(self, user_id):
+        # Returns a list of (course_id, course, progress) tuples in enrollment order
+        user = self.get_user(user_id)
+        if user is None:
+            return None
+        return [
+            (course_id,
+             self.get_course(course_id) or {},
+             user['progress'].get(course_id, {}))
+            for course_id in user['enrolled_courses']
+        ]
+
+    def export_data(self):
+        # Full dataset in the lms_data.json layout
+        raise NotImplementedError
+
+    def import_file(self, path):
+        # Seeds a fresh store from a monolithic lms_data.json
+        with open(path, 'r') as f:
+            self.import_data(json.load(f))
+
+    def collect_garbage(self, dry_run=False):
+        # Removes orphaned courses and merges duplicates (see utils.lms_gc);
+        # returns a report including the bytes reclaimed
+        raise NotImplementedError(f"{type(self).__name__} does not support garbage collection")
+
+
+# The original engine: the whole dataset lives in memory and is rewritten
+# to a single JSON file on every mutation.
+#
+# With multiprocess=True several action-server workers can share one file:
+# every write takes a cross-process lock on a sidecar .lock file, reloads
+# the data if another worker replaced the file since we last saw it, and
+# only then allocates ids and applies the mutation on top of the fresh state.
+#
+# With write_behind=True mutations only update memory and mark the data
+# dirty; a background thread saves once per flush_interval seconds, or
+# sooner after flush_max_pending mutations, coalescing a burst into one save.
+#
+# With compact_memory=True users are held in the slotted model of
+# utils.compact_model rather than as nested dicts (see CompactUsers).
+class JSONFileBackend(StorageBackend):
+    def __init__(self, data_file, multiprocess=False, write_behind=False,
+                 flush_interval=0.5, flush_max_pending=100, compact_memory=False):
+        if write_behind and multiprocess:
+            # Reloading another worker's file would drop our unsaved mutations
+            raise ValueError("Write-behind cannot be combined with multiprocess mode")
+        self.data_file = data_file
+        self.data = None
+        self.multiprocess = multiprocess
+        self.compact_memory = compact_memory
+        # catalog_key -> course_id hash index over canonical courses
+        self.catalog_index = {}
+        # Reverse indexes: course_id -> user ids, status -> (user_id, course_id)
+        self.course_users = {}
+        self.status_members = {}
+        self._mutex = threading.RLock()
+        self._file_lock = FileLock(f"{data_file}.lock") if multiprocess else None
+        # Identity of the file version held in memory, see _file_token
+        self._disk_token = None
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_max_pending = flush_max_pending
+        self._dirty = 0
+        # Serializes everything that writes a full snapshot (flush, garbage
+        # collection, journal compaction), so an older snapshot can never be
+        # written over a newer one. Always taken before _mutex.
+        self._flush_lock = threading.RLock()
+        self._flush_wakeup = threading.Event()
+        self._flush_stopped = threading.Event()
+        self._flusher = None
+
+    def load(self):
+        with self._writing(refresh=False):
+            if os.path.exists(self.data_file):
+                self._read_file()
+                existed = True
+            else:
+                self._set_data(empty_data())
+                self.save()
+                existed = False
+        if self.write_behind:
+            self._start_flusher()
+        return existed
+
+    def _read_file(self):
+        token = self._file_token()
+        with open(self.data_file, 'r') as f:
+            data = json.load(f)
+        for key, value in empty_data().items():
+            if key != 'meta':
+                data.setdefault(key, value)
+        ensure_meta(data)
+        self._set_data(data)
+        self._disk_token = token
+
+    def _set_data(self, data):
+        if self.compact_memory and not isinstance(data['users'], CompactUsers):
+            data['users'] = CompactUsers.from_data(data['users'], data['courses'])
+        self.data = data
+        self._build_indexes()
+
+    def _file_token(self):
+        # Saves go through an atomic rename, so a new inode or mtime means
+        # another process has written a newer generation
+        try:
+            stat = os.stat(self.data_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _reload(self):
+        # In-memory state back to what is on disk
+        if os.path.exists(self.data_file):
+            self._read_file()
+        else:
+            self._set_data(empty_data())
+
+    def _refresh_if_stale(self):
+        if self._file_token() != self._disk_token:
+            self._read_file()
+
+    def _sync(self):
+        # Called before reads so workers see each other's enrollments
+        if self.multiprocess:
+            with self._mutex:
+                self._refresh_if_stale()
+
+    @contextmanager
+    def _writing(self, refresh=True):
+        with self._mutex:
+            if self._file_lock is None:
+                yield
+                return
+            with self._file_lock:
+                if refresh:
+                    self._refresh_if_stale()
+                yield
+
+    def _build_indexes(self):
+        # Built aside and swapped in, so lock-free readers never see a
+        # half-built index when the data is replaced (e.g. by collect_garbage)
+        catalog_index = {}
+        course_users = {}
+        status_members = {}
+        for course_id, course in self.data['courses'].items():
+            self._index_course(course_id, course, catalog_index)
+        users = self.data['users']
+        if isinstance(users, CompactUsers):
+            enrollments = users.iter_enrollments()
+        else:
+            enrollments = ((user_id, course_id, progress.get('status'))
+                           for user_id, user in users.items()
+                           for course_id, progress in user['progress'].items())
+        for user_id, course_id, status in enrollments:
+            self._index_enrollment(user_id, course_id, status, course_users, status_members)
+        self.catalog_index = catalog_index
+        self.course_users = course_users
+        self.status_members = status_members
+
+    def _index_course(self, course_id, course, catalog_index=None):
+        key = course.get('catalog_key')
+        if key is not None:
+            (self.catalog_index if catalog_index is None else catalog_index).setdefault(key, course_id)
+
+    def _index_enrollment(self, user_id, course_id, status, course_users=None, status_members=None):
+        (self.course_users if course_users is None else course_users).setdefault(course_id, set()).add(user_id)
+        (self.status_members if status_members is None else status_members).setdefault(
+            status, set()).add((user_id, course_id))
+
+    def _apply(self, entry):
+        op = entry['op']
+        if op == 'enroll':
+            user = self.data['users'].get(entry['user_id'])
+            is_new = user is None or entry['course_id'] not in user['progress']
+        elif op == 'complete_material':
+            old_status = self.data['users'][entry['user_id']]['progress'][entry['course_id']].get('status')
+        apply_entry(self.data, entry)
+        if op == 'add_course':
+            self._index_course(entry['course_id'], entry['course'])
+        elif op == 'enroll' and is_new:
+            self._index_enrollment(entry['user_id'], entry['course_id'],
+                                   entry['progress'].get('status'))
+        elif op == 'complete_material' and old_status != entry['status']:
+            key = (entry['user_id'], entry['course_id'])
+            self.status_members.get(old_status, set()).discard(key)
+            self.status_members.setdefault(entry['status'], set()).add(key)
+
+    def save(self):
+        with self._mutex:
+            self.data['meta']['generation'] += 1
+            write_json_atomic(self.data_file, self.data, indent=2)
+            self._disk_token = self._file_token()
+
+    def _record(self, entry):
+        # Every mutation funnels through here: apply in memory, then persist
+        self._apply(entry)
+        self._persist_many([entry])
+
+    def _persist_many(self, entries):
+        # One save (or one write-behind tick) however many entries were applied
+        if not self.write_behind:
+            try:
+                self.save()
+            except Exception:
+                # The entries only reached memory; drop them so memory matches
+                # the disk and a retry applies them again
+                self._reload()
+                raise
+            return
+        self._dirty += len(entries)
+        if self._dirty >= self.flush_max_pending:
+            self._flush_wakeup.set()
+
+    def flush(self):
+        # Serialize under the data lock, write outside it so mutations are not
+        # held up by disk I/O
+        with self._flush_lock:
+            with self._mutex:
+                if not self._dirty:
+                    return
+                self._dirty = 0
+                self.data['meta']['generation'] += 1
+                snapshot = json.dumps(self.data, indent=2, default=to_json)
+            write_text_atomic(self.data_file, snapshot)
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="lms-write-behind", daemon=True
+        )
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._flush_stopped.is_set():
+            self._flush_wakeup.wait(self.flush_interval)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing data: %s", e)
+
+    def close(self):
+        if self._flusher is not None:
+            self._flush_stopped.set()
+            self._flush_wakeup.set()
+            self._flusher.join()
+            self._flusher = None
+        if self.write_behind:
+            self.flush()
+
+    def get_course(self, course_id):
+        self._sync()
+        return self.data['courses'].get(course_id)
+
+    def find_course(self, catalog_key):
+        self._sync()
+        return self.catalog_index.get(catalog_key)
+
+    def add_course(self, course):
+        with self._writing():
+            # A catalog course may have been created by another worker
+            # between our lookup and taking the lock
+            existing_id = self.catalog_index.get(course.get('catalog_key'))
+            if existing_id is not None:
+                return existing_id
+            course_id = str(self.data['meta']['next_course_id'])
+            self._record({'op': 'add_course', 'course_id': course_id, 'course': course})
+            return course_id
+
+    def get_user(self, user_id):
+        self._sync()
+        return self.data['users'].get(user_id)
+
+    def add_enrollment(self, user_id, course_id, progress):
+        with self._writing():
+            user = self.data['users'].get(user_id)
+            if user is not None and course_id in user['progress']:
+                return False
+            self._record({'op': 'enroll', 'user_id': user_id, 'course_id': course_id,
+                          'progress': progress})
+            return True
+
+    def add_courses(self, courses):
+        with self._writing():
+            course_ids = []
+            entries = []
+            for course in courses:
+                course_id = self.catalog_index.get(course.get('catalog_key'))
+                if course_id is None:
+                    course_id = str(self.data['meta']['next_course_id'])
+                    entry = {'op': 'add_course', 'course_id': course_id, 'course': course}
+                    self._apply(entry)
+                    entries.append(entry)
+                course_ids.append(course_id)
+            if entries:
+                self._persist_many(entries)
+            return course_ids
+
+    def add_enrollments(self, enrollments):
+        with self._writing():
+            created = []
+            entries = []
+            for user_id, course_id, progress in enrollments:
+                user = self.data['users'].get(user_id)
+                if user is not None and course_id in user['progress']:
+                    created.append(False)
+                    continue
+                entry = {'op': 'enroll', 'user_id': user_id, 'course_id': course_id,
+                         'progress': progress}
+                self._apply(entry)
+                entries.append(entry)
+                created.append(True)
+            if entries:
+                self._persist_many(entries)
+            return created
+
+    def complete_material(self, user_id, course_id, material, status):
+        with self._writing():
+            user = self.data['users'].get(user_id)
+            if user is None or course_id not in user['progress']:
+                return False
+            self._record({'op': 'complete_material', 'user_id': user_id,
+                          'course_id': course_id, 'material': material, 'status': status})
+            return True
+
+    def get_roster(self, course_id):
+        self._sync()
+        return set(self.course_users.get(course_id, ()))
+
+    def get_status_members(self, status):
+        self._sync()
+        return set(self.status_members.get(status, ()))
+
+    def export_data(self):
+        self._sync()
+        if isinstance(self.data['users'], CompactUsers):
+            return dict(self.data, users=self.data['users'].to_data())
+        return self.data
+
+    def collect_garbage(self, dry_run=False):
+        # The collected dataset is built next to the live one and swapped in
+        # with one assignment: readers keep using the old data until then,
+        # only writers wait
+        from utils.lms_gc import collect_data
+        with self._flush_lock, self._writing():
+            data = self.export_data()
+            new_data, report = collect_data(data)
+            report['bytes_before'] = len(json.dumps(data, indent=2).encode('utf-8'))
+            report['bytes_after'] = len(json.dumps(new_data, indent=2).encode('utf-8'))
+            report['reclaimed_bytes'] = report['bytes_before'] - report['bytes_after']
+            changed = (report['courses_after'] != report['courses_before'] or
+                       report['references_rewritten'] or report['dangling_references_dropped'])
+            if changed and not dry_run:
+                self._set_data(new_data)
+                self._save_collected()
+        return report
+
+    def _save_collected(self):
+        self.save()
+
+
+# JSON engine for deployments that must keep the single-file format. Each
+# mutation appends one compact, fsynced line to a journal next to the data
+# file; a background thread periodically folds the journal into a fresh
+# lms_data.json snapshot. Startup replays snapshot plus journal.
+class JournaledJSONBackend(JSONFileBackend):
+    def __init__(self, data_file, multiprocess=False, write_behind=False,
+                 compact_interval=30.0, compact_threshold=1000, compact_memory=False):
+        if multiprocess:
+            # Other workers' journal appends would never be replayed here
+            raise ValueError("The journal backend supports a single writer process; "
+                             "use the json or sqlite backend with LMS_MULTIPROCESS")
+        if write_behind:
+            raise ValueError("The journal backend already writes O(1) bytes per mutation; "
+                             "write-behind is only available for the json backend")
+        super().__init__(data_file, compact_memory=compact_memory)
+        self.journal_file = f"{data_file}.journal"
+        # Journal being folded into a snapshot; only present mid-compaction
+        # or after a crash during one
+        self.rotated_journal_file = f"{data_file}.journal.old"
+        self.compact_interval = compact_interval
+        self.compact_threshold = compact_threshold
+        self._journal = None
+        self._pending = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._compactor = None
+
+    def load(self):
+        if os.path.exists(self.data_file):
+            self._read_file()
+            existed = True
+        else:
+            self._set_data(empty_data())
+            existed = False
+        recovered = self._replay(self.rotated_journal_file)
+        self._pending = self._replay(self.journal_file)
+        existed = existed or recovered > 0 or self._pending > 0
+        if os.path.exists(self.rotated_journal_file):
+            # A previous compaction was interrupted; finish it before the
+            # rotated journal can be overwritten by the next one
+            write_json_atomic(self.data_file, self.data, indent=2)
+            os.remove(self.rotated_journal_file)
+        self._journal = open(self.journal_file, 'a')
+        if not existed:
+            self.compact()
+        self._start_compactor()
+        return existed
+
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        valid_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = None
+                if entry is None or not line.endswith(b"\n"):
+                    # A torn final line from a crash mid-append; everything
+                    # before it was fsynced and is intact. Cut it off so new
+                    # entries are not appended onto the fragment.
+                    with open(path, 'r+b') as journal:
+                        journal.truncate(valid_bytes)
+                    break
+                self._apply(entry)
+                valid_bytes += len(line)
+                count += 1
+        return count
+
+    def _persist_many(self, entries):
+        # One append and one fsync per batch. A batch that fails part-way is
+        # cut off the journal again and dropped from memory, so the journal
+        # only ever holds whole batches
+        journal_size = os.fstat(self._journal.fileno()).st_size
+        try:
+            self._journal.write("".join(json.dumps(entry, separators=(',', ':')) + "\n" for entry in entries))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except Exception:
+            try:
+                self._journal.close()
+            except OSError:
+                pass
+            with open(self.journal_file, 'r+b') as journal:
+                journal.truncate(journal_size)
+            self._journal = open(self.journal_file, 'a')
+            self._reload()
+            raise
+        self._pending += len(entries)
+        if self._pending >= self.compact_threshold:
+            self._wakeup.set()
+
+    def _reload(self):
+        # The snapshot, plus the journal being compacted if any, plus the journal
+        super()._reload()
+        self._replay(self.rotated_journal_file)
+        self._pending = self._replay(self.journal_file)
+
+    def save(self):
+        # Mutations are already durable in the journal
+        pass
+
+    def _save_collected(self):
+        # Replaying the old journal over the collected data would bring the
+        # removed courses back, so fold everything into a new snapshot
+        self.compact()
+
+    def flush(self):
+        pass
+
+    def compact(self):
+        # Swap in an empty journal and serialize the dataset under the lock,
+        # then write the snapshot outside it so writers are only briefly held.
+        # Compactions (the background thread, garbage collection, close) run
+        # one at a time from rotation to removal of the rotated journal.
+        with self._flush_lock:
+            with self._mutex:
+                if self._journal is not None:
+                    self._journal.close()
+                if os.path.exists(self.journal_file):
+                    os.replace(self.journal_file, self.rotated_journal_file)
+                self._journal = open(self.journal_file, 'a')
+                self._pending = 0
+                self.data['meta']['generation'] += 1
+                snapshot = json.dumps(self.data, indent=2, default=to_json)
+            write_text_atomic(self.data_file, snapshot)
+            if os.path.exists(self.rotated_journal_file):
+                os.remove(self.rotated_journal_file)
+
+    def _start_compactor(self):
+        if self._compactor is not None or not self.compact_interval:
+            return
+        self._compactor = threading.Thread(
+            target=self._compact_loop, name="lms-journal-compactor", daemon=True
+        )
+        self._compactor.start()
+
+    def _compact_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.compact_interval)
+            self._wakeup.clear()
+            if self._pending:
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error("Error compacting journal: %s", e)
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        if self._journal is not None:
+            if self._pending:
+                self.compact()
+            self._journal.close()
+            self._journal = None
+
+
+# JSON engine whose startup cost does not grow with the number of users.
+# Courses and the meta block live in courses.json and are loaded eagerly
+# (they scale with the catalog, not with traffic); users are spread over
+# users/<prefix>.json shards by a hash of the user id. Shards are read on
+# first access, kept in an LRU of cache_size shards, and each mutation
+# rewrites only the shard it touched.
+#
+# Roster and status queries go through in-memory course -> users and
+# status -> (user_id, course_id) indexes. They are saved to index.json on
+# close and the file is removed again when it is loaded, so after a crash
+# the indexes are rebuilt with one pass over the shards on the first query
+# instead of being trusted stale.
+class ShardedJSONBackend(StorageBackend):
+    def __init__(self, data_dir, multiprocess=False, write_behind=False,
+                 prefix_length=2, cache_size=64):
+        if multiprocess or write_behind:
+            raise ValueError("The sharded backend supports neither multiprocess nor write-behind mode")
+        self.data_dir = data_dir
+        self.users_dir = os.path.join(data_dir, "users")
+        self.courses_file = os.path.join(data_dir, "courses.json")
+        self.index_file = os.path.join(data_dir, "index.json")
+        self.prefix_length = prefix_length
+        self.cache_size = cache_size
+        self.courses = {}
+        self.meta = None
+        self.catalog_index = {}
+        # None until loaded from index.json or built from the shards
+        self.course_users = None
+        self.status_members = None
+        self._shards = OrderedDict()
+        self._mutex = threading.RLock()
+
+    def load(self):
+        os.makedirs(self.users_dir, exist_ok=True)
+        existed = self._read_courses()
+        self._load_indexes()
+        if not existed:
+            self.save()
+        return existed
+
+    def _read_courses(self):
+        courses, meta = {}, None
+        existed = os.path.exists(self.courses_file)
+        if existed:
+            with open(self.courses_file, 'r') as f:
+                stored = json.load(f)
+            courses, meta = stored['courses'], stored.get('meta')
+        self.courses = courses
+        self.meta = ensure_meta({'courses': courses, 'meta': meta or {}})
+        self.catalog_index = {}
+        for course_id, course in courses.items():
+            if course.get('catalog_key') is not None:
+                self.catalog_index.setdefault(course['catalog_key'], course_id)
+        return existed
+
+    def _save_courses(self):
+        # Saves courses added in memory; on failure they are dropped again
+        try:
+            self.save()
+        except Exception:
+            self._read_courses()
+            raise
+
+    def _load_indexes(self):
+        self.course_users = self.status_members = None
+        try:
+            with open(self.index_file, 'r') as f:
+                enrollments = json.load(f)['enrollments']
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable %s: %s", self.index_file, e)
+        else:
+            self._set_indexes(enrollments)
+        os.remove(self.index_file)
+
+    def _set_indexes(self, enrollments):
+        course_users = {}
+        status_members = {}
+        for user_id, course_id, status in enrollments:
+            course_users.setdefault(course_id, set()).add(user_id)
+            status_members.setdefault(status, set()).add((user_id, course_id))
+        self.course_users = course_users
+        self.status_members = status_members
+
+    def _indexes(self):
+        # Built with one pass over the shards the first time they are needed
+        with self._mutex:
+            if self.course_users is None:
+                self._set_indexes((user_id, course_id, progress.get('status'))
+                                  for _, shard in self.iter_shards()
+                                  for user_id, user in shard.items()
+                                  for course_id, progress in user['progress'].items())
+            return self.course_users, self.status_members
+
+    def _invalidate_indexes(self):
+        self.course_users = self.status_members = None
+
+    def _index_entry(self, shard, entry):
+        # Applies a user mutation to a shard and to the indexes, if built
+        user = shard.get(entry['user_id'])
+        course_id = entry['course_id']
+        if entry['op'] == 'enroll':
+            old_status = None
+            is_new = user is None or course_id not in user['progress']
+        else:
+            old_status = user['progress'][course_id].get('status')
+            is_new = False
+        apply_entry({'users': shard, 'courses': self.courses}, entry)
+        if self.course_users is None:
+            return
+        key = (entry['user_id'], course_id)
+        if is_new:
+            self.course_users.setdefault(course_id, set()).add(entry['user_id'])
+            self.status_members.setdefault(entry['progress'].get('status'), set()).add(key)
+        elif entry['op'] == 'complete_material' and old_status != entry['status']:
+            self.status_members.get(old_status, set()).discard(key)
+            self.status_members.setdefault(entry['status'], set()).add(key)
+
+    def save(self):
+        with self._mutex:
+            self.meta['generation'] += 1
+            write_json_atomic(self.courses_file, {'courses': self.courses, 'meta': self.meta})
+
+    def shard_key(self, user_id):
+        return hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:self.prefix_length]
+
+    def _shard_path(self, shard_key):
+        return os.path.join(self.users_dir, f"{shard_key}.json")
+
+    def read_shard(self, shard_key):
+        # Reads a shard from disk without caching it
+        try:
+            with open(self._shard_path(shard_key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def write_shard(self, shard_key, shard):
+        write_json_atomic(self._shard_path(shard_key), shard, separators=(',', ':'))
+
+    def _shard(self, shard_key):
+        shard = self._shards.get(shard_key)
+        if shard is None:
+            shard = self.read_shard(shard_key)
+            self._shards[shard_key] = shard
+            if len(self._shards) > self.cache_size:
+                # Shards are written through on every mutation, so eviction never loses data
+                self._shards.popitem(last=False)
+        else:
+            self._shards.move_to_end(shard_key)
+        return shard
+
+    def iter_shards(self):
+        # (shard_key, users) for every shard on disk, cached copies preferred
+        for name in sorted(os.listdir(self.users_dir)):
+            if name.endswith(".json"):
+                shard_key = name[:-len(".json")]
+                with self._mutex:
+                    shard = self._shards.get(shard_key)
+                yield shard_key, shard if shard is not None else self.read_shard(shard_key)
+
+    def _record_user(self, user_id, entry):
+        shard_key = self.shard_key(user_id)
+        shard = self._shard(shard_key)
+        self._index_entry(shard, entry)
+        try:
+            self.write_shard(shard_key, shard)
+        except Exception:
+            # Re-read from disk, without the entry, when next needed
+            self._shards.pop(shard_key, None)
+            self._invalidate_indexes()
+            raise
+
+    def get_course(self, course_id):
+        return self.courses.get(course_id)
+
+    def find_course(self, catalog_key):
+        return self.catalog_index.get(catalog_key)
+
+    def add_course(self, course):
+        with self._mutex:
+            existing_id = self.catalog_index.get(course.get('catalog_key'))
+            if existing_id is not None:
+                return existing_id
+            course_id = str(self.meta['next_course_id'])
+            apply_entry({'courses': self.courses, 'meta': self.meta},
+                        {'op': 'add_course', 'course_id': course_id, 'course': course})
+            if course.get('catalog_key') is not None:
+                self.catalog_index[course['catalog_key']] = course_id
+            self._save_courses()
+            return course_id
+
+    def get_user(self, user_id):
+        with self._mutex:
+            return self._shard(self.shard_key(user_id)).get(user_id)
+
+    def add_enrollment(self, user_id, course_id, progress):
+        with self._mutex:
+            user = self.get_user(user_id)
+            if user is not None and course_id in user['progress']:
+                return False
+            self._record_user(user_id, {'op': 'enroll', 'user_id': user_id,
+                                        'course_id': course_id, 'progress': progress})
+            return True
+
+    def add_courses(self, courses):
+        with self._mutex:
+            course_ids = []
+            added = False
+            for course in courses:
+                course_id = self.catalog_index.get(course.get('catalog_key'))
+                if course_id is None:
+                    course_id = str(self.meta['next_course_id'])
+                    apply_entry({'courses': self.courses, 'meta': self.meta},
+                                {'op': 'add_course', 'course_id': course_id, 'course': course})
+                    if course.get('catalog_key') is not None:
+                        self.catalog_index[course['catalog_key']] = course_id
+                    added = True
+                course_ids.append(course_id)
+            if added:
+                self._save_courses()
+            return course_ids
+
+    def add_enrollments(self, enrollments):
+        # Each touched shard is written once per batch
+        with self._mutex:
+            created = []
+            # Held here as well as in the LRU, so eviction mid-batch cannot
+            # drop a modified shard
+            shards = {}
+            # (shard_key, user_id, course_id, new_user) per enrollment made
+            applied = []
+            for user_id, course_id, progress in enrollments:
+                shard_key = self.shard_key(user_id)
+                shard = shards.get(shard_key)
+                if shard is None:
+                    shard = shards[shard_key] = self._shard(shard_key)
+                user = shard.get(user_id)
+                if user is not None and course_id in user['progress']:
+                    created.append(False)
+                    continue
+                self._index_entry(shard, {'op': 'enroll', 'user_id': user_id, 'course_id': course_id,
+                                          'progress': progress})
+                applied.append((shard_key, user_id, course_id, user is None))
+                created.append(True)
+            written = []
+            try:
+                for shard_key in dict.fromkeys(key for key, _, _, _ in applied):
+                    self.write_shard(shard_key, shards[shard_key])
+                    written.append(shard_key)
+            except Exception:
+                self._undo_enrollments(shards, applied, written)
+                raise
+            return created
+
+    def _undo_enrollments(self, shards, applied, written):
+        # Takes a batch that could not be written in full back out of the
+        # shards in memory and of those already written, so nothing of it
+        # remains and a retry applies it again. A shard that cannot be
+        # restored either is dropped from the cache and re-read from disk.
+        for shard_key, user_id, course_id, new_user in reversed(applied):
+            shard = shards[shard_key]
+            if new_user:
+                del shard[user_id]
+            else:
+                shard[user_id]['enrolled_courses'].remove(course_id)
+                del shard[user_id]['progress'][course_id]
+        self._invalidate_indexes()
+        for shard_key in written:
+            try:
+                self.write_shard(shard_key, shards[shard_key])
+            except Exception as e:
+                logger.error("Could not restore shard %s after a failed batch: %s", shard_key, e)
+                self._shards.pop(shard_key, None)
+
+    def complete_material(self, user_id, course_id, material, status):
+        with self._mutex:
+            user = self.get_user(user_id)
+            if user is None or course_id not in user['progress']:
+                return False
+            self._record_user(user_id, {'op': 'complete_material', 'user_id': user_id,
+                                        'course_id': course_id, 'material': material,
+                                        'status': status})
+            return True
+
+    def get_roster(self, course_id):
+        course_users, _ = self._indexes()
+        with self._mutex:
+            return set(course_users.get(course_id, ()))
+
+    def get_status_members(self, status):
+        _, status_members = self._indexes()
+        with self._mutex:
+            return set(status_members.get(status, ()))
+
+    def close(self):
+        with self._mutex:
+            if self.course_users is None:
+                return
+            write_json_atomic(self.index_file, {'enrollments': [
+                [user_id, course_id, status]
+                for status, members in self.status_members.items()
+                for user_id, course_id in members
+            ]}, separators=(',', ':'))
+
+    def import_courses(self, courses, meta=None):
+        # Called once the imported users are in their shards
+        with self._mutex:
+            self._invalidate_indexes()
+            self.courses.update(courses)
+            for course_id, course in courses.items():
+                if course.get('catalog_key') is not None:
+                    self.catalog_index.setdefault(course['catalog_key'], course_id)
+            for course_id in courses:
+                if course_id.isdigit():
+                    self.meta['next_course_id'] = max(self.meta['next_course_id'], int(course_id) + 1)
+            if meta and meta.get('next_course_id'):
+                self.meta['next_course_id'] = max(self.meta['next_course_id'], meta['next_course_id'])
+            self.save()
+
+    def import_file(self, path):
+        from utils.lms_convert import import_monolithic
+        import_monolithic(path, self)
+        self._shards.clear()
+
+    def _disk_bytes(self, shard_key=None):
+        path = self.courses_file if shard_key is None else self._shard_path(shard_key)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def collect_garbage(self, dry_run=False):
+        # Streams the shards twice: once to collect the course references,
+        # once to rewrite the shards that change, one at a time. Shards are
+        # rewritten before courses.json drops the removed courses, so an
+        # interrupted run leaves only duplicates behind, never dangling
+        # references. Other operations wait until it finishes.
+        from utils.lms_gc import CollectionPlan, plan_report, rewrite_user
+        with self._mutex:
+            courses = dict(self.courses)
+            plan = CollectionPlan(courses, (course_id for _, shard in self.iter_shards()
+                                            for user in shard.values()
+                                            for course_id in user.get('enrolled_courses', [])))
+            bytes_before = self._disk_bytes()
+            bytes_after = 0
+            rewritten = dropped = 0
+            for shard_key, shard in self.iter_shards():
+                shard_bytes = self._disk_bytes(shard_key)
+                bytes_before += shard_bytes
+                new_shard = {}
+                shard_changed = 0
+                for user_id, user in shard.items():
+                    new_user, user_rewritten, user_dropped = rewrite_user(user, plan, courses)
+                    new_shard[user_id] = new_user
+                    shard_changed += user_rewritten + user_dropped
+                    rewritten += user_rewritten
+                    dropped += user_dropped
+                if not shard_changed:
+                    bytes_after += shard_bytes
+                    continue
+                bytes_after += len(json.dumps(new_shard, separators=(',', ':')).encode('utf-8'))
+                if not dry_run:
+                    self.write_shard(shard_key, new_shard)
+                    if shard_key in self._shards:
+                        self._shards[shard_key] = new_shard
+            if (rewritten or dropped) and not dry_run:
+                # Enrollments moved to the surviving courses
+                self._invalidate_indexes()
+            kept = {course_id: course for course_id, course in courses.items()
+                    if course_id not in plan.removed}
+            if plan.removed and not dry_run:
+                self.courses = kept
+                self.catalog_index = {}
+                for course_id, course in kept.items():
+                    if course.get('catalog_key') is not None:
+                        self.catalog_index.setdefault(course['catalog_key'], course_id)
+                self.save()
+                bytes_after += self._disk_bytes()
+            elif plan.removed:
+                bytes_after += len(json.dumps({'courses': kept, 'meta': self.meta}).encode('utf-8'))
+            else:
+                bytes_after += self._disk_bytes()
+        report = plan_report(plan, len(courses), rewritten, dropped)
+        report['bytes_before'] = bytes_before
+        report['bytes_after'] = bytes_after
+        report['reclaimed_bytes'] = bytes_before - bytes_after
+        return report
+
+    def export_data(self):
+        data = empty_data()
+        data['courses'] = self.courses
+        data['meta'] = self.meta
+        for _, shard in self.iter_shards():
+            data['users'].update(shard)
+        return data
+
+
+# Indexed SQLite engine: each mutation touches only the affected rows and
+# per-user lookups go through an index on user_id.
+class SQLiteBackend(StorageBackend):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS courses (
+            course_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            materials TEXT NOT NULL,
+            created_at TEXT,
+            catalog_key TEXT
+        );
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS enrollments (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL REFERENCES users(user_id),
+            course_id TEXT NOT NULL,
+            status TEXT,
+            completed_materials TEXT NOT NULL DEFAULT '[]',
+            enrolled_at TEXT,
+            UNIQUE (user_id, course_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_enrollments_user ON enrollments(user_id, seq);
+    """
+    INDEXES = """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_courses_catalog_key ON courses(catalog_key);
+        CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments(course_id);
+        CREATE INDEX IF NOT EXISTS idx_enrollments_status ON enrollments(status);
+    """
+
+    def __init__(self, db_file, multiprocess=False, write_behind=False):
+        # SQLite serializes writers across processes itself and AUTOINCREMENT
+        # never reuses ids, so multiprocess needs no extra handling here
+        if write_behind:
+            raise ValueError("Write-behind is only available for the json backend")
+        self.db_file = db_file
+        self.conn = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        existed = os.path.exists(self.db_file)
+        self.conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._upgrade_schema()
+        self.conn.executescript(self.INDEXES)
+        self.conn.commit()
+        return existed
+
+    def _upgrade_schema(self):
+        # Adds columns introduced after a database file was first created
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(courses)")}
+        if 'catalog_key' not in columns:
+            self.conn.execute("ALTER TABLE courses ADD COLUMN catalog_key TEXT")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _course_from_row(self, row):
+        course = {
+            'name': row[0],
+            'description': row[1],
+            'materials': json.loads(row[2]),
+            'created_at': row[3]
+        }
+        if row[4] is not None:
+            course['catalog_key'] = row[4]
+        return course
+
+    def get_course(self, course_id):
+        row = self.conn.execute(
+            "SELECT name, description, materials, created_at, catalog_key "
+            "FROM courses WHERE course_id = ?",
+            (course_id,)
+        ).fetchone()
+        return self._course_from_row(row) if row else None
+
+    def find_course(self, catalog_key):
+        row = self.conn.execute(
+            "SELECT course_id FROM courses WHERE catalog_key = ?", (catalog_key,)
+        ).fetchone()
+        return str(row[0]) if row else None
+
+    def add_course(self, course):
+        try:
+            with self._lock, self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO courses (name, description, materials, created_at, catalog_key) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (course.get('name'), course.get('description'),
+                     json.dumps(course.get('materials', [])), course.get('created_at'),
+                     course.get('catalog_key'))
+                )
+        except sqlite3.IntegrityError:
+            # Another process created the same catalog course first
+            existing_id = self.find_course(course.get('catalog_key'))
+            if existing_id is None:
+                raise
+            return existing_id
+        return str(cursor.lastrowid)
+
+    def _progress_from_row(self, row):
+        return {
+            'status': row[0],
+            'completed_materials': json.loads(row[1]),
+            'enrolled_at': row[2]
+        }
+
+    def get_user(self, user_id):
+        rows = self.conn.execute(
+            "SELECT course_id, status, completed_materials, enrolled_at "
+            "FROM enrollments WHERE user_id = ? ORDER BY seq",
+            (user_id,)
+        ).fetchall()
+        if not rows:
+            known = self.conn.execute(
+                "SELECT 1 FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return {'enrolled_courses': [], 'progress': {}} if known else None
+        return {
+            'enrolled_courses': [row[0] for row in rows],
+            'progress': {row[0]: self._progress_from_row(row[1:]) for row in rows}
+        }
+
+    def add_enrollment(self, user_id, course_id, progress):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO enrollments "
+                "(user_id, course_id, status, completed_materials, enrolled_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, course_id, progress.get('status'),
+                 json.dumps(progress.get('completed_materials', [])),
+                 progress.get('enrolled_at'))
+            )
+        return cursor.rowcount > 0
+
+    def add_courses(self, courses):
+        # One transaction; catalog keys already stored resolve to their course.
+        # They are looked up before inserting, since a conflicting INSERT OR
+        # IGNORE would still use up an AUTOINCREMENT id
+        course_ids = []
+        with self._lock, self.conn:
+            for course in courses:
+                key = course.get('catalog_key')
+                existing_id = self.find_course(key) if key is not None else None
+                if existing_id is not None:
+                    course_ids.append(existing_id)
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO courses (name, description, materials, created_at, catalog_key) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (course.get('name'), course.get('description'),
+                     json.dumps(course.get('materials', [])), course.get('created_at'), key)
+                )
+                # Ignored only if another process stored the key meanwhile
+                course_ids.append(str(cursor.lastrowid) if cursor.rowcount else self.find_course(key))
+        return course_ids
+
+    def add_enrollments(self, enrollments):
+        # One transaction, so one commit (and fsync) per batch
+        created = []
+        with self._lock, self.conn:
+            for user_id, course_id, progress in enrollments:
+                self.conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO enrollments "
+                    "(user_id, course_id, status, completed_materials, enrolled_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (user_id, course_id, progress.get('status'),
+                     json.dumps(progress.get('completed_materials', [])),
+                     progress.get('enrolled_at'))
+                )
+                created.append(cursor.rowcount > 0)
+        return created
+
+    def get_progress(self, user_id, course_id):
+        row = self.conn.execute(
+            "SELECT status, completed_materials, enrolled_at FROM enrollments "
+            "WHERE user_id = ? AND course_id = ?",
+            (user_id, course_id)
+        ).fetchone()
+        return self._progress_from_row(row) if row else None
+
+    def complete_material(self, user_id, course_id, material, status):
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT completed_materials FROM enrollments WHERE user_id = ? AND course_id = ?",
+                (user_id, course_id)
+            ).fetchone()
+            if row is None:
+                return False
+            completed = json.loads(row[0])
+            if material not in completed:
+                completed.append(material)
+            self.conn.execute(
+                "UPDATE enrollments SET completed_materials = ?, status = ? "
+                "WHERE user_id = ? AND course_id = ?",
+                (json.dumps(completed), status, user_id, course_id)
+            )
+        return True
+
+    def get_roster(self, course_id):
+        return {row[0] for row in self.conn.execute(
+            "SELECT user_id FROM enrollments WHERE course_id = ?", (course_id,))}
+
+    def get_status_members(self, status):
+        return {(row[0], row[1]) for row in self.conn.execute(
+            "SELECT user_id, course_id FROM enrollments WHERE status = ?", (status,))}
+
+    def get_user_enrollments(self, user_id):
+        # Single indexed join instead of one course lookup per enrollment
+        rows = self.conn.execute(
+            "SELECT e.course_id, c.name, c.description, c.materials, c.created_at, c.catalog_key, "
+            "e.status, e.completed_materials, e.enrolled_at "
+            "FROM enrollments e LEFT JOIN courses c ON c.course_id = e.course_id "
+            "WHERE e.user_id = ? ORDER BY e.seq",
+            (user_id,)
+        ).fetchall()
+        if not rows:
+            return None if self.get_user(user_id) is None else []
+        return [
+            (row[0],
+             self._course_from_row(row[1:6]) if row[1] is not None else {},
+             self._progress_from_row(row[6:9]))
+            for row in rows
+        ]
+
+    def export_data(self):
+        data = empty_data()
+        for row in self.conn.execute(
+                "SELECT course_id, name, description, materials, created_at, catalog_key FROM courses"):
+            data['courses'][str(row[0])] = self._course_from_row(row[1:])
+        for (user_id,) in self.conn.execute("SELECT user_id FROM users"):
+            data['users'][user_id] = {'enrolled_courses': [], 'progress': {}}
+        for row in self.conn.execute(
+                "SELECT user_id, course_id, status, completed_materials, enrolled_at "
+                "FROM enrollments ORDER BY seq"):
+            user = data['users'].setdefault(row[0], {'enrolled_courses': [], 'progress': {}})
+            user['enrolled_courses'].append(row[1])
+            user['progress'][row[1]] = self._progress_from_row(row[2:])
+        return data
+
+    def _disk_bytes(self):
+        return sum(os.path.getsize(path) for path in (self.db_file, f"{self.db_file}-wal")
+                   if os.path.exists(path))
+
+    def collect_garbage(self, dry_run=False):
+        # One transaction rewrites the enrollments and deletes the courses;
+        # in WAL mode readers keep their snapshot meanwhile. VACUUM then
+        # returns the freed pages to the file system.
+        from utils.lms_gc import CollectionPlan, merge_progress, plan_report
+        bytes_before = self._disk_bytes()
+        with self._lock, self.conn:
+            courses = {
+                str(row[0]): {'name': row[1], 'materials': json.loads(row[2]), 'catalog_key': row[3]}
+                for row in self.conn.execute("SELECT course_id, name, materials, catalog_key FROM courses")
+            }
+            references = [row[0] for row in self.conn.execute("SELECT course_id FROM enrollments")]
+            plan = CollectionPlan(courses, references)
+            rewritten = sum(1 for course_id in references if course_id in plan.remap)
+            dropped = sum(1 for course_id in references if course_id in plan.dangling)
+            if not dry_run:
+                for old_id, canonical in plan.remap.items():
+                    rows = self.conn.execute(
+                        "SELECT user_id, status, completed_materials, enrolled_at "
+                        "FROM enrollments WHERE course_id = ?", (old_id,)
+                    ).fetchall()
+                    for row in rows:
+                        existing = self.conn.execute(
+                            "SELECT status, completed_materials, enrolled_at FROM enrollments "
+                            "WHERE user_id = ? AND course_id = ?", (row[0], canonical)
+                        ).fetchone()
+                        if existing is None:
+                            self.conn.execute(
+                                "UPDATE enrollments SET course_id = ? WHERE user_id = ? AND course_id = ?",
+                                (canonical, row[0], old_id))
+                            continue
+                        merged = merge_progress(self._progress_from_row(existing),
+                                                self._progress_from_row(row[1:]), courses[canonical])
+                        self.conn.execute(
+                            "UPDATE enrollments SET status = ?, completed_materials = ?, enrolled_at = ? "
+                            "WHERE user_id = ? AND course_id = ?",
+                            (merged['status'], json.dumps(merged['completed_materials']),
+                             merged['enrolled_at'], row[0], canonical))
+                        self.conn.execute("DELETE FROM enrollments WHERE user_id = ? AND course_id = ?",
+                                          (row[0], old_id))
+                self.conn.executemany("DELETE FROM enrollments WHERE course_id = ?",
+                                      [(course_id,) for course_id in plan.dangling])
+                self.conn.executemany("DELETE FROM courses WHERE course_id = ?",
+                                      [(int(course_id),) for course_id in plan.removed])
+        report = plan_report(plan, len(courses), rewritten, dropped)
+        report['bytes_before'] = bytes_before
+        if dry_run:
+            # Freed pages are only known once VACUUM has run
+            report['bytes_after'] = report['reclaimed_bytes'] = None
+            return report
+        if plan.removed or plan.dangling:
+            with self._lock:
+                self.conn.execute("VACUUM")
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        report['bytes_after'] = self._disk_bytes()
+        report['reclaimed_bytes'] = bytes_before - report['bytes_after']
+        return report
+
+    def import_data(self, data):
+        # One-off migration from the JSON layout, preserving course ids. Runs
+        # as a single transaction and ignores rows that already exist, so
+        # workers racing to seed the same new database are harmless.
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO courses "
+                "(course_id, name, description, materials, created_at, catalog_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(course_id), course.get('name'), course.get('description'),
+                  json.dumps(course.get('materials', [])), course.get('created_at'),
+                  course.get('catalog_key'))
+                 for course_id, course in data.get('courses', {}).items()]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO users (user_id) VALUES (?)",
+                [(user_id,) for user_id in data.get('users', {})]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO enrollments "
+                "(user_id, course_id, status, completed_materials, enrolled_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(user_id, course_id, progress.get('status'),
+                  json.dumps(progress.get('completed_materials', [])),
+                  progress.get('enrolled_at'))
+                 for user_id, user in data.get('users', {}).items()
+                 for course_id in user.get('enrolled_courses', [])
+                 for progress in [user['progress'].get(course_id, {})]]
+            )
+
+BACKENDS = {
+    'json': JSONFileBackend,
+    'journal': JournaledJSONBackend,
+    'sharded': ShardedJSONBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def create_backend(name, path, **options):
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LMS storage backend: {name!r}")
+    return backend_class(path, **options)
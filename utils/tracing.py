@@ -0,0 +1,311 @@
+"""Per-turn latency tracing for the chat pipeline.
+
+    LMS_TRACE_FILE=traces.jsonl streamlit run app.py
+    python -m utils.tracing summary traces.jsonl
+
+Spans are context managers timed with the monotonic clock; nested spans
+(including LMS calls made from the async actions' thread pool) share the
+trace of the turn that started them. Finished spans are appended to a JSONL
+file. With neither LMS_TRACE_FILE nor LMS_PROFILE_SAMPLE_RATE set, span()
+returns a shared no-op object, so instrumented code pays one function call.
+"""
+import argparse
+import atexit
+import contextvars
+import cProfile
+import functools
+import inspect
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+from utils.metrics import get_logger
+
+logger = get_logger("tracing")
+
+# Innermost open span of the current task or thread
+_current_span = contextvars.ContextVar("lms_current_span", default=None)
+# Marks the context of a root span that lost the sampling draw
+_UNSAMPLED = object()
+
+_span_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledSpan(_NoopSpan):
+    # Suppresses every span nested under a root that was not sampled
+    def __enter__(self):
+        self._token = _current_span.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'attributes', 'trace_id', 'span_id', 'parent_id',
+                 'start', 'start_ns', 'duration_ns', '_token', '_profiler')
+
+    def __init__(self, tracer, name, attributes, parent):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_span_ids)
+        if parent is None:
+            self.trace_id = os.urandom(8).hex()
+            self.parent_id = None
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self._profiler = None
+
+    def set(self, **attributes):
+        # Attributes only known once the work is under way, e.g. result sizes
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        if self.parent_id is None:
+            self._profiler = self.tracer._start_profile()
+        self.start = time.time()
+        self.start_ns = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.monotonic_ns() - self.start_ns
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        if self._profiler is not None:
+            self.tracer._stop_profile(self._profiler, self)
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': self.duration_ns / 1e6,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+        }
+
+
+# Appends finished spans to a local JSON-lines file. Spans are buffered and
+# written when a trace completes (or the buffer fills), so a turn costs one
+# small append rather than one write per span.
+class JSONLExporter:
+    def __init__(self, path, max_buffer=256):
+        self.path = path
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def export(self, span):
+        with self._lock:
+            self._buffer.append(span.to_dict())
+            if span.parent_id is not None and len(self._buffer) < self.max_buffer:
+                return
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        self._write(lines)
+
+    def _write(self, records):
+        if not records:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(record, separators=(',', ':'), default=str) + "\n"
+                                for record in records))
+        except OSError as e:
+            logger.error("Error writing spans to %s: %s", self.path, e)
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=1.0, profile_rate=0.0, profile_dir=None):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.profile_rate = profile_rate
+        self.profile_dir = profile_dir or os.getcwd()
+        self.enabled = exporter is not None or profile_rate > 0
+        # cProfile allows one active profiler per process
+        self._profile_lock = threading.Lock()
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is _UNSAMPLED:
+            return NOOP_SPAN
+        if parent is None and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return _UnsampledSpan()
+        return Span(self, name, attributes, parent)
+
+    def _finish(self, span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def _start_profile(self):
+        # Sampled root spans are profiled; only the thread running the root
+        # span is covered, so LMS calls on the I/O pool show up as waits
+        if not self.profile_rate or random.random() >= self.profile_rate:
+            return None
+        if not self._profile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. an IDE's) is already active
+            self._profile_lock.release()
+            return None
+        return profiler
+
+    def _stop_profile(self, profiler, span):
+        profiler.disable()
+        self._profile_lock.release()
+        path = os.path.join(self.profile_dir, f"{span.name}-{span.trace_id}.prof")
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(path)
+            span.attributes['profile'] = path
+        except OSError as e:
+            logger.error("Error writing profile %s: %s", path, e)
+
+
+def _env_rate(name, default):
+    try:
+        return min(1.0, max(0.0, float(os.environ.get(name, default))))
+    except ValueError:
+        logger.warning("Ignoring invalid %s", name)
+        return float(default)
+
+
+def configure(trace_file=None, sample_rate=1.0, profile_rate=0.0, profile_dir=None):
+    # Replaces the process-wide tracer; with no trace file and no profiling
+    # every span is the no-op span
+    global tracer
+    exporter = JSONLExporter(trace_file) if trace_file else None
+    tracer = Tracer(exporter, sample_rate, profile_rate, profile_dir)
+    return tracer
+
+
+# Configured from the environment so the Streamlit app and the action server
+# can be traced without code changes. LMS_TRACE_SAMPLE_RATE and
+# LMS_PROFILE_SAMPLE_RATE are the fractions of turns traced and profiled;
+# profiles (.prof, readable with pstats or snakeviz) go to LMS_PROFILE_DIR.
+tracer = None
+configure(
+    trace_file=os.environ.get("LMS_TRACE_FILE") or None,
+    sample_rate=_env_rate("LMS_TRACE_SAMPLE_RATE", "1.0"),
+    profile_rate=_env_rate("LMS_PROFILE_SAMPLE_RATE", "0"),
+    profile_dir=os.environ.get("LMS_PROFILE_DIR") or None,
+)
+
+
+def span(name, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def traced(name):
+    # Decorator running every call of a function (or coroutine function)
+    # inside a span
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(path):
+    # Per-span-name call counts and latencies from a JSONL trace file, with
+    # self time (duration minus direct children) to point at the hot path
+    spans = {}
+    child_time = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            key = (record['pid'], record['trace_id'], record['span_id'])
+            spans[key] = record
+            if record['parent_id'] is not None:
+                parent_key = (record['pid'], record['trace_id'], record['parent_id'])
+                child_time[parent_key] = child_time.get(parent_key, 0.0) + record['duration_ms']
+    by_name = {}
+    for key, record in spans.items():
+        durations, self_times = by_name.setdefault(record['name'], ([], []))
+        durations.append(record['duration_ms'])
+        self_times.append(max(0.0, record['duration_ms'] - child_time.get(key, 0.0)))
+    summary = []
+    for name, (durations, self_times) in by_name.items():
+        durations.sort()
+        summary.append({
+            'name': name,
+            'count': len(durations),
+            'total_ms': sum(durations),
+            'self_ms': sum(self_times),
+            'p50_ms': _percentile(durations, 0.50),
+            'p95_ms': _percentile(durations, 0.95),
+            'max_ms': durations[-1],
+        })
+    summary.sort(key=lambda row: row['self_ms'], reverse=True)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summary_parser = subparsers.add_parser('summary', help="latency per span name, by self time")
+    summary_parser.add_argument('trace_file')
+    args = parser.parse_args(argv)
+
+    print(f"{'span':<40} {'count':>7} {'self ms':>10} {'total ms':>10} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for row in summarize(args.trace_file):
+        print(f"{row['name']:<40} {row['count']:>7} {row['self_ms']:>10.1f} {row['total_ms']:>10.1f} "
+              f"{row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['max_ms']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()